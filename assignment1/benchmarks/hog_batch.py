@@ -0,0 +1,54 @@
+'''
+Compare hog_feature_batch against extract_features(imgs, [hog_feature]) on
+the 60k CIFAR-10 images (train + test): images/sec and the largest absolute
+difference of the features. The per-image reference is timed on the first
+--num-reference images only and extrapolated.
+
+HOW TO RUN THIS CODE (from the assignment 1 root):
+PYTHONPATH=${PWD} python benchmarks/hog_batch.py
+PYTHONPATH=${PWD} python benchmarks/hog_batch.py --num-reference 60000 --batch-size 128
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from cs231n.data_utils import load_CIFAR10
+from cs231n.features import extract_features, hog_feature, hog_feature_batch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cifar10-dir', default='cs231n/datasets/cifar-10-batches-py')
+    parser.add_argument('--num-reference', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=64)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    X_train, _, X_test, _ = load_CIFAR10(args.cifar10_dir)
+    imgs = np.concatenate([X_train, X_test])
+    num_images = imgs.shape[0]
+
+    start = time.time()
+    feats = hog_feature_batch(imgs, batch_size=args.batch_size)
+    batch_time = time.time() - start
+
+    num_reference = min(args.num_reference, num_images)
+    start = time.time()
+    feats_ref = extract_features(imgs[:num_reference], [hog_feature])
+    reference_time = (time.time() - start) * num_images / num_reference
+
+    print('%-20s %12s %12s' % ('', 'seconds', 'images/s'))
+    print('%-20s %12.2f %12.1f' % ('hog_feature (est.)', reference_time,
+                                   num_images / reference_time))
+    print('%-20s %12.2f %12.1f' % ('hog_feature_batch', batch_time,
+                                   num_images / batch_time))
+    print('speedup %.1fx, max abs difference %.2e' % (
+          reference_time / batch_time, np.max(np.abs(feats[:num_reference] - feats_ref))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Compare the approximate IVF index of KNearestNeighbor against the exact
+compute_distances_no_loops search on CIFAR-10 (accuracy, recall of the exact
+k nearest neighbors and queries/sec).
+
+HOW TO RUN THIS CODE (from the assignment 1 root):
+PYTHONPATH=${PWD} python benchmarks/knn_ann.py
+PYTHONPATH=${PWD} python benchmarks/knn_ann.py --num-train 50000 --num-test 1000 --num-lists 256
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from cs231n.classifiers.k_nearest_neighbor import KNearestNeighbor, IVFIndex
+from cs231n.data_utils import load_CIFAR10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cifar10-dir', default='cs231n/datasets/cifar-10-batches-py')
+    parser.add_argument('--num-train', type=int, default=5000)
+    parser.add_argument('--num-test', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--num-lists', type=int, default=64)
+    parser.add_argument('--probes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    X_train, y_train, X_test, y_test = load_CIFAR10(args.cifar10_dir)
+    X_train = np.reshape(X_train[:args.num_train], (args.num_train, -1))
+    y_train = y_train[:args.num_train]
+    X_test  = np.reshape(X_test[:args.num_test], (args.num_test, -1))
+    y_test  = y_test[:args.num_test]
+
+    knn = KNearestNeighbor()
+    index = IVFIndex(num_lists=args.num_lists, seed=args.seed)
+    start = time.time()
+    knn.train(X_train, y_train, index=index)
+    print('built IVF index (%d lists) over %d points in %.2fs' % (
+          args.num_lists, args.num_train, time.time() - start))
+
+    #exact reference: the full no-loop distance matrix
+    start = time.time()
+    dists = np.asarray(knn.compute_distances_no_loops(X_test))
+    exact_idx = knn.nearest_from_dists(dists, args.k)
+    y_exact = knn.predict_labels(dists, k=args.k)
+    exact_time = time.time() - start
+
+    print('%-12s %10s %10s %12s' % ('search', 'accuracy', 'recall', 'queries/s'))
+    print('%-12s %10.4f %10.4f %12.1f' % ('exact', np.mean(y_exact == y_test), 1.0,
+                                          args.num_test / exact_time))
+    for num_probes in args.probes:
+        index.num_probes = num_probes
+        start = time.time()
+        nearest_dists, nearest_idx = index.query(X_test, k=args.k)
+        y_ann = knn.vote_labels(nearest_dists, nearest_idx)
+        ann_time = time.time() - start
+
+        recall = np.mean([len(np.intersect1d(a, b)) / args.k
+                          for a, b in zip(nearest_idx, exact_idx)])
+        print('%-12s %10.4f %10.4f %12.1f' % ('probes=%d' % num_probes,
+              np.mean(y_ann == y_test), recall, args.num_test / ann_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Wall-clock comparison of full-batch L-BFGS (LinearClassifier.train_lbfgs)
+against minibatch SGD (LinearClassifier.train) on the HOG + color histogram
+features of features.ipynb: SGD keeps running until it reaches the
+validation accuracy of the L-BFGS solution (or --max-sgd-iters).
+
+HOW TO RUN THIS CODE (from the assignment 1 root):
+PYTHONPATH=${PWD} python benchmarks/linear_lbfgs.py
+PYTHONPATH=${PWD} python benchmarks/linear_lbfgs.py --model softmax --reg 1e-3
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from cs231n.classifiers.linear_classifier import LinearSVM, Softmax
+from cs231n.data_utils import load_CIFAR10
+from cs231n.features import extract_features, hog_feature, color_histogram_hsv
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cifar10-dir', default='cs231n/datasets/cifar-10-batches-py')
+    parser.add_argument('--model', choices=['svm', 'softmax'], default='svm')
+    parser.add_argument('--num-train', type=int, default=5000)
+    parser.add_argument('--num-val', type=int, default=1000)
+    parser.add_argument('--reg', type=float, default=1e-2)
+    parser.add_argument('--smoothing', type=float, default=1.0)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--sgd-chunk', type=int, default=100,
+                        help='SGD iterations between validation checks')
+    parser.add_argument('--max-sgd-iters', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def features(args):
+    X_train, y_train, _, _ = load_CIFAR10(args.cifar10_dir)
+    num = args.num_train + args.num_val
+    feature_fns = [hog_feature, lambda img: color_histogram_hsv(img, nbin=10)]
+    X = extract_features(X_train[:num], feature_fns)
+    X -= np.mean(X[:args.num_train], axis=0, keepdims=True)
+    X /= np.std(X[:args.num_train], axis=0, keepdims=True) + 1e-8
+    X = np.hstack([X, np.ones((X.shape[0], 1))])
+    return (X[:args.num_train], y_train[:args.num_train],
+            X[args.num_train:], y_train[args.num_train:num])
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+    X_tr, y_tr, X_val, y_val = features(args)
+    model_class = {'svm': LinearSVM, 'softmax': Softmax}[args.model]
+    print('%d training points with %d features' % X_tr.shape)
+
+    model = model_class()
+    start = time.time()
+    loss_hist = model.train_lbfgs(X_tr, y_tr, reg=args.reg, smoothing=args.smoothing)
+    lbfgs_time = time.time() - start
+    lbfgs_acc = np.mean(model.predict(X_val) == y_val)
+
+    model = model_class()
+    sgd_time, sgd_iters, sgd_acc = 0., 0, 0.
+    while sgd_acc < lbfgs_acc and sgd_iters < args.max_sgd_iters:
+        start = time.time()
+        model.train(X_tr, y_tr, learning_rate=args.learning_rate, reg=args.reg,
+                    num_iters=args.sgd_chunk, batch_size=args.batch_size)
+        sgd_time += time.time() - start
+        sgd_iters += args.sgd_chunk
+        sgd_acc = np.mean(model.predict(X_val) == y_val)
+
+    print('%-8s %10s %12s %10s' % ('solver', 'seconds', 'iterations', 'val acc'))
+    print('%-8s %10.2f %12d %10.4f' % ('L-BFGS', lbfgs_time, len(loss_hist), lbfgs_acc))
+    print('%-8s %10.2f %12d %10.4f' % ('SGD', sgd_time, sgd_iters, sgd_acc))
+
+
+if __name__ == '__main__':
+    main()
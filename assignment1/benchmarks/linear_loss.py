@@ -0,0 +1,86 @@
+'''
+Compare the per-iteration time and the peak memory allocated (tracemalloc)
+by svm_loss_vectorized / softmax_loss_vectorized against the fused kernels
+svm_loss_fused / softmax_loss_fused (float64 and float32) on CIFAR-10
+minibatches, i.e. the work done by every LinearClassifier.train iteration.
+
+HOW TO RUN THIS CODE (from the assignment 1 root):
+PYTHONPATH=${PWD} python benchmarks/linear_loss.py
+PYTHONPATH=${PWD} python benchmarks/linear_loss.py --batch-size 1000 --iters 200
+'''
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from cs231n.classifiers.linear_svm import svm_loss_vectorized, svm_loss_fused
+from cs231n.classifiers.softmax import softmax_loss_vectorized, softmax_loss_fused
+from cs231n.classifiers.loss_workspace import LossWorkspace
+from cs231n.data_utils import load_CIFAR10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cifar10-dir', default='cs231n/datasets/cifar-10-batches-py')
+    parser.add_argument('--num-train', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--iters', type=int, default=100)
+    parser.add_argument('--reg', type=float, default=5e4)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def run(loss_fn, W, X, y, reg, batches):
+    '''
+    Seconds per call and peak traced allocation (bytes) of loss_fn over the
+    given minibatch indices; the first call is a warm up (it fills the
+    workspace of the fused kernels) and is not measured.
+    '''
+    loss_fn(W, X[batches[0]], y[batches[0]], reg)
+    X_batches = [X[idx] for idx in batches[1:]]
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.time()
+    for X_batch, idx in zip(X_batches, batches[1:]):
+        loss_fn(W, X_batch, y[idx], reg)
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed / len(X_batches), peak
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+
+    X_train, y_train, _, _ = load_CIFAR10(args.cifar10_dir)
+    X = np.reshape(X_train[:args.num_train], (args.num_train, -1)).astype(np.float64)
+    X -= np.mean(X, axis=0)
+    X = np.hstack([X, np.ones((X.shape[0], 1))])
+    y = y_train[:args.num_train]
+    W = 0.001 * np.random.randn(X.shape[1], 10)
+    X32, W32 = X.astype(np.float32), W.astype(np.float32)
+
+    batches = [np.random.choice(args.num_train, args.batch_size)
+               for it in range(args.iters + 1)]
+
+    print('%-30s %14s %14s' % ('kernel', 'ms / iter', 'peak KiB'))
+    for name, vectorized, fused in [('svm', svm_loss_vectorized, svm_loss_fused),
+                                    ('softmax', softmax_loss_vectorized, softmax_loss_fused)]:
+        # the minibatch copy X[idx] itself is made outside of the timed loop
+        ws64, ws32 = LossWorkspace(), LossWorkspace()
+        cases = [('%s_vectorized float64' % name, vectorized, W, X),
+                 ('%s_fused float64' % name,
+                  lambda W, X, y, reg: fused(W, X, y, reg, ws64), W, X),
+                 ('%s_fused float32' % name,
+                  lambda W, X, y, reg: fused(W, X, y, reg, ws32), W32, X32)]
+        for label, loss_fn, W_case, X_case in cases:
+            seconds, peak = run(loss_fn, W_case, X_case, y, args.reg, batches)
+            print('%-30s %14.3f %14.1f' % (label, 1e3 * seconds, peak / 1024.))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Time a (learning_rate, reg) grid search of LinearSVM / Softmax models on
+CIFAR-10 trained one after another (as in svm.ipynb) against the same grid
+trained at once by BatchedLinearSVM / BatchedSoftmax, and report the best
+validation accuracy found by both.
+
+HOW TO RUN THIS CODE (from the assignment 1 root):
+PYTHONPATH=${PWD} python benchmarks/linear_sweep.py
+PYTHONPATH=${PWD} python benchmarks/linear_sweep.py --model softmax --num-iters 1500
+'''
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from cs231n.classifiers.linear_classifier import (LinearSVM, Softmax,
+                                                  BatchedLinearSVM, BatchedSoftmax)
+from cs231n.data_utils import load_CIFAR10
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cifar10-dir', default='cs231n/datasets/cifar-10-batches-py')
+    parser.add_argument('--model', choices=['svm', 'softmax'], default='svm')
+    parser.add_argument('--num-train', type=int, default=10000)
+    parser.add_argument('--num-val', type=int, default=1000)
+    parser.add_argument('--num-iters', type=int, default=300)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--learning-rates', type=float, nargs='+',
+                        default=[1e-7, 2e-7, 5e-7, 1e-6])
+    parser.add_argument('--regs', type=float, nargs='+',
+                        default=[1e3, 5e3, 1e4, 2.5e4, 5e4])
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+
+    X_train, y_train, _, _ = load_CIFAR10(args.cifar10_dir)
+    X = np.reshape(X_train, (X_train.shape[0], -1)).astype(np.float64)
+    X_tr, y_tr = X[:args.num_train], y_train[:args.num_train]
+    X_val = X[args.num_train:args.num_train + args.num_val]
+    y_val = y_train[args.num_train:args.num_train + args.num_val]
+    mean_image = np.mean(X_tr, axis=0)
+    X_tr = np.hstack([X_tr - mean_image, np.ones((X_tr.shape[0], 1))])
+    X_val = np.hstack([X_val - mean_image, np.ones((X_val.shape[0], 1))])
+
+    single, batched = {'svm': (LinearSVM, BatchedLinearSVM),
+                       'softmax': (Softmax, BatchedSoftmax)}[args.model]
+    grid = list(itertools.product(args.learning_rates, args.regs))
+    print('%d models, %d iterations of batch size %d' % (len(grid), args.num_iters,
+                                                         args.batch_size))
+
+    start = time.time()
+    best_single = 0.
+    for learning_rate, reg in grid:
+        model = single()
+        model.train(X_tr, y_tr, learning_rate=learning_rate, reg=reg,
+                    num_iters=args.num_iters, batch_size=args.batch_size)
+        best_single = max(best_single, np.mean(model.predict(X_val) == y_val))
+    single_time = time.time() - start
+
+    start = time.time()
+    learning_rates, regs = zip(*grid)
+    models = batched(learning_rates, regs)
+    models.train(X_tr, y_tr, num_iters=args.num_iters, batch_size=args.batch_size)
+    best_batched = np.max(np.mean(models.predict(X_val) == y_val, axis=1))
+    batched_time = time.time() - start
+
+    print('%-12s %10s %14s' % ('trainer', 'seconds', 'best val acc'))
+    print('%-12s %10.2f %14.4f' % ('sequential', single_time, best_single))
+    print('%-12s %10.2f %14.4f' % ('batched', batched_time, best_batched))
+
+
+if __name__ == '__main__':
+    main()
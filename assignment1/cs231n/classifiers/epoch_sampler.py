@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+
+
+class EpochSampler(object):
+  """
+  Serve minibatches by sampling without replacement, one epoch at a time.
+
+  At the start of every epoch the data is permuted once and copied (in
+  dtype, float32 by default) into a preallocated buffer; the minibatches of
+  that epoch are then contiguous slices of the buffer, i.e. views that cost
+  no copy and no random gather. Every batch has exactly batch_size rows: the
+  num_train % batch_size samples left over at the end of an epoch are simply
+  not served in that epoch (they are part of the next permutation).
+
+  With prefetch=True a second buffer is filled with the next epoch on a
+  background thread while the current epoch is being served, which hides
+  the cost of the shuffle at the price of twice the memory.
+
+  Example:
+    sampler = EpochSampler(X, y, batch_size=200)
+    for it in range(num_iters):
+      X_batch, y_batch = sampler.next_batch()
+  """
+
+  def __init__(self, X, y, batch_size, dtype=np.float32, prefetch=False,
+               seed=None, chunk_size=4096):
+    """
+    Inputs:
+    - X: A numpy array of shape (N, D) containing the training data.
+    - y: A numpy array of shape (N,) containing the training labels.
+    - batch_size: Number of rows per minibatch (at most N).
+    - dtype: dtype of the shuffled copy of X.
+    - prefetch: If True shuffle the next epoch on a background thread.
+    - seed: Optional seed of the permutations.
+    - chunk_size: Rows gathered at a time when building an epoch, which
+      bounds the temporary memory used by the dtype conversion.
+    """
+    if X.ndim != 2:
+      raise ValueError("Require X to have X.ndim = 2;")
+    if X.shape[0] != y.shape[0]:
+      raise ValueError("X and y have incompatible shapes.\n" +
+                       "X has %s samples, but y has %s." %
+                       (X.shape[0], y.shape[0]))
+    self.X = X
+    self.y = y
+    self.batch_size = min(int(batch_size), X.shape[0])
+    self.dtype = np.dtype(dtype)
+    self.prefetch = prefetch
+    self.chunk_size = chunk_size
+    self.rng = np.random.RandomState(seed)
+
+    self.batches_per_epoch = X.shape[0] // self.batch_size
+    self.epoch = -1
+    self._buffers = [self._allocate() for i in range(2 if prefetch else 1)]
+    self._thread = None
+    self._pending = None
+    self._cursor = self.batches_per_epoch
+
+  def _allocate(self):
+    return (np.empty(self.X.shape, dtype=self.dtype),
+            np.empty(self.y.shape, dtype=self.y.dtype))
+
+  def _fill(self, buffers, order):
+    """ Copy the rows of X and y in the given order into buffers. """
+    X_buf, y_buf = buffers
+    for i0 in range(0, order.shape[0], self.chunk_size):
+      rows = order[i0:i0 + self.chunk_size]
+      X_buf[i0:i0 + rows.shape[0]] = self.X[rows]
+    np.take(self.y, order, out=y_buf)
+
+  def _start_prefetch(self):
+    # The permutation is drawn here (not on the thread) so that a given seed
+    # produces the same batches with and without prefetching.
+    order = self.rng.permutation(self.X.shape[0])
+    self._pending = self._buffers[(self.epoch + 1) % 2]
+    self._thread = threading.Thread(target=self._fill,
+                                    args=(self._pending, order))
+    self._thread.daemon = True
+    self._thread.start()
+
+  def _next_epoch(self):
+    if self.prefetch:
+      if self._thread is None:
+        self._start_prefetch()
+      self._thread.join()
+      self._current = self._pending
+      self.epoch += 1
+      self._start_prefetch()
+    else:
+      self._current = self._buffers[0]
+      self._fill(self._current, self.rng.permutation(self.X.shape[0]))
+      self.epoch += 1
+    self._cursor = 0
+
+  def next_batch(self):
+    """
+    Returns a tuple of:
+    - X_batch: A view of shape (batch_size, D) of the shuffled buffer.
+    - y_batch: A view of shape (batch_size,) holding the matching labels.
+
+    The views are only valid until the next epoch starts (their buffer is
+    then refilled).
+    """
+    if self._cursor >= self.batches_per_epoch:
+      self._next_epoch()
+    i0 = self._cursor * self.batch_size
+    self._cursor += 1
+    X_buf, y_buf = self._current
+    return X_buf[i0:i0 + self.batch_size], y_buf[i0:i0 + self.batch_size]
+
+  def close(self):
+    """ Wait for a pending prefetch to finish. """
+    if self._thread is not None:
+      self._thread.join()
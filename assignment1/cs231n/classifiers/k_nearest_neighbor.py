@@ -1,21 +1,82 @@
+import multiprocessing
+
 import numpy as np
 
+
+def merge_top_k(best_d, best_i, d2, ids):
+  """
+  Merge a block of squared distances into a running top-k.
+
+  Inputs:
+  - best_d: Array of shape (M, k) holding the current k smallest squared
+    distances of M query points (np.inf for empty slots).
+  - best_i: Array of shape (M, k) of the training indices matching best_d.
+  - d2: Array of shape (M, B) of squared distances to B new training points.
+  - ids: Integer array of shape (B,) giving the training indices of the
+    columns of d2.
+
+  Returns a tuple of:
+  - best_d, best_i: The updated (M, k) arrays; rows are not sorted.
+  """
+  k = best_d.shape[1]
+  # Candidates are the current top-k followed by the new block; columns >= k
+  # map back to ids[column - k].
+  cand = np.concatenate((best_d, d2), axis=1)
+  sel = np.argpartition(cand, k - 1, axis=1)[:, :k]
+  new_i = np.where(sel < k,
+                   np.take_along_axis(best_i, np.minimum(sel, k - 1), axis=1),
+                   ids[np.maximum(sel - k, 0)])
+  return np.take_along_axis(cand, sel, axis=1), new_i
+
+
+def accumulator_dtype(dtype):
+  """
+  The dtype squared distances between points of the given dtype are computed
+  in: integer data (e.g. uint8 pixels) is accumulated exactly in int32 (int64
+  for wider integers) and floating point data keeps its own precision, but
+  never less than float32.
+
+  With uint8 inputs the int32 accumulator is exact as long as
+  D * 255**2 < 2**31, i.e. for D < 33025 (CIFAR-10 has D = 3072).
+  """
+  dtype = np.dtype(dtype)
+  if np.issubdtype(dtype, np.integer):
+    return np.dtype(np.int32 if dtype.itemsize == 1 else np.int64)
+  return np.result_type(dtype, np.float32)
+
+
+def finish_distances(d2, squared):
+  """
+  Clamp squared distances that rounding pushed below zero and return them
+  (squared=True) or their square roots.
+  """
+  np.maximum(d2, 0, out=d2)
+  if squared:
+    return d2
+  if np.issubdtype(d2.dtype, np.integer):
+    return np.sqrt(d2)
+  return np.sqrt(d2, out=d2)
+
+
 class KNearestNeighbor(object):
   """ a kNN classifier with L2 distance """
 
   def __init__(self):
     pass
 
-  def train(self, X, y):
+  def train(self, X, y, index=None):
     """
     Train the classifier. For k-nearest neighbors this is just
-    memorizing the training data.
+    memorizing the training data (and optionally building an approximate
+    nearest neighbor index over it).
 
     Inputs:
     - X: A numpy array of shape (num_train, D) containing the training data
       consisting of num_train samples each of dimension D.
     - y: A numpy array of shape (N,) containing the training labels, where
          y[i] is the label for X[i].
+    - index: Optional approximate nearest neighbor index (e.g. IVFIndex); it
+      is built over X here and queried by predict(..., num_loops='ann').
     """
     if X.ndim > 2:
         raise ValueError("Improperly formatted training input for X.")
@@ -24,8 +85,11 @@ class KNearestNeighbor(object):
     self.X_train = X
     self.y_train = y
     self.num_classes = len(np.unique(self.y_train))
+    self.index = index
+    if index is not None:
+      index.build(X)
     
-  def predict(self, X, k=1, num_loops=0):
+  def predict(self, X, k=1, num_loops=0, memory_budget=2**27, dtype=None):
     """
     Predict labels for test data using this classifier.
 
@@ -34,25 +98,42 @@ class KNearestNeighbor(object):
          of num_test samples each of dimension D.
     - k: The number of nearest neighbors that vote for the predicted labels.
     - num_loops: Determines which implementation to use to compute distances
-      between training points and testing points.
+      between training points and testing points. Pass 'blocked' to use
+      compute_nearest_blocked, which never builds the full distance matrix,
+      or 'ann' to query the approximate index built by train.
+    - memory_budget: Only used when num_loops='blocked'; approximate number of
+      bytes the distance tiles are allowed to use.
+    - dtype: Optional dtype of the data the distances are computed from
+      (e.g. np.float32, or np.uint8 for raw pixels which are accumulated in
+      int32); see accumulator_dtype. The default computes them in float64.
+      Only squared distances are computed since they rank the same.
 
     Returns:
     - y: A numpy array of shape (num_test,) containing predicted labels for the
       test data, where y[i] is the predicted label for the test point X[i].
     """
-    if num_loops == 0:
-      dists = self.compute_distances_no_loops(X)
+    if k < 1:
+      raise ValueError('Invalid value %d for k (it must be > 0)' % k)
+    if num_loops == 'blocked':
+      nearest_dists, nearest_idx = self.compute_nearest_blocked(
+          X, k=k, memory_budget=memory_budget, dtype=dtype, squared=True)
+      return self.vote_labels(nearest_dists, nearest_idx, squared=True)
+    elif num_loops == 'ann':
+      if getattr(self, 'index', None) is None:
+        raise ValueError('num_loops=\'ann\' requires train(..., index=...)')
+      nearest_dists, nearest_idx = self.index.query(X, k=k)
+      return self.vote_labels(nearest_dists, nearest_idx)
+    elif num_loops == 0:
+      dists = self.compute_distances_no_loops(X, dtype=dtype, squared=True)
     elif num_loops == 1:
-      dists = self.compute_distances_one_loop(X)
+      dists = self.compute_distances_one_loop(X, dtype=dtype, squared=True)
     elif num_loops == 2:
-      dists = self.compute_distances_two_loops(X)
+      dists = self.compute_distances_two_loops(X, dtype=dtype, squared=True)
     else:
-      raise ValueError('Invalid value %d for num_loops' % num_loops)
-    if k < 1:
-      raise ValueError('Invalid value %d for k (it must be > 0)' % k)
-    return self.predict_labels(dists, k=k)
+      raise ValueError('Invalid value %r for num_loops' % (num_loops,))
+    return self.predict_labels(dists, k=k, squared=True)
 
-  def compute_distances_two_loops(self, X):
+  def compute_distances_two_loops(self, X, dtype=None, squared=False):
     """
     Compute the distance between each test point in X and each training point
     in self.X_train using a nested loop over both the training data and the
@@ -60,6 +141,9 @@ class KNearestNeighbor(object):
 
     Inputs:
     - X: A numpy array of shape (num_test, D) containing test data.
+    - dtype: Optional dtype of the data; the distances are accumulated in
+      accumulator_dtype(dtype) instead of float64.
+    - squared: If True return squared distances (enough to rank neighbors).
 
     Returns:
     - dists: A numpy array of shape (num_test, num_train) where dists[i, j]
@@ -68,7 +152,10 @@ class KNearestNeighbor(object):
     """
     num_test = X.shape[0]
     num_train = self.X_train.shape[0]
-    dists = np.zeros((num_test, num_train))
+    acc = np.float64 if dtype is None else accumulator_dtype(dtype)
+    X = X.astype(acc, copy=False)
+    X_train = self.X_train.astype(acc, copy=False)
+    dists = np.zeros((num_test, num_train), dtype=acc)
     for i in range(num_test):
       for j in range(num_train):
         #####################################################################
@@ -77,13 +164,14 @@ class KNearestNeighbor(object):
         # training point, and store the result in dists[i, j]. You should   #
         # not use a loop over dimension.                                    #
         #####################################################################
-        dists[ i, j ] = np.linalg.norm(X[i] - self.X_train[j])
+        diff = X[i] - X_train[j]
+        dists[ i, j ] = np.dot(diff, diff)
         #####################################################################
         #                       END OF YOUR CODE                            #
         #####################################################################
-    return dists
+    return finish_distances(dists, squared)
 
-  def compute_distances_one_loop(self, X):
+  def compute_distances_one_loop(self, X, dtype=None, squared=False):
     """
     Compute the distance between each test point in X and each training point
     in self.X_train using a single loop over the test data.
@@ -92,29 +180,33 @@ class KNearestNeighbor(object):
     """
     num_test = X.shape[0]
     num_train = self.X_train.shape[0]
-    dists = np.zeros((num_test, num_train))
+    acc = np.float64 if dtype is None else accumulator_dtype(dtype)
+    X = X.astype(acc, copy=False)
+    X_train = self.X_train.astype(acc, copy=False)
+    dists = np.zeros((num_test, num_train), dtype=acc)
     for i in range(num_test):
       #######################################################################
       # TODO:                                                               #
       # Compute the l2 distance between the ith test point and all training #
       # points, and store the result in dists[i, :].                        #
       #######################################################################
-      dists[i, :] = np.linalg.norm(self.X_train - X[i,:], axis=1)
+      diff = X_train - X[i,:]
+      dists[i, :] = np.einsum('ij,ij->i', diff, diff)
       #######################################################################
       #                         END OF YOUR CODE                            #
       #######################################################################
-    return dists
+    return finish_distances(dists, squared)
 
-  def compute_distances_no_loops(self, X):
+  def compute_distances_no_loops(self, X, dtype=None, squared=False):
     """
     Compute the distance between each test point in X and each training point
     in self.X_train using no explicit loops.
 
     Input / Output: Same as compute_distances_two_loops
     """
-    num_test = X.shape[0]
-    num_train = self.X_train.shape[0]
-    dists = np.zeros((num_test, num_train))
+    acc = np.float64 if dtype is None else accumulator_dtype(dtype)
+    X = X.astype(acc, copy=False)
+    X_train = self.X_train.astype(acc, copy=False)
     #########################################################################
     # TODO:                                                                 #
     # Compute the l2 distance between all test points and all training      #
@@ -127,33 +219,139 @@ class KNearestNeighbor(object):
     # HINT: Try to formulate the l2 distance using matrix multiplication    #
     #       and two broadcast sums.                                         #
     #########################################################################
-    XX = np.square(X).sum(axis=1)
-    YY = np.square(self.X_train).sum(axis=1)
-    XY = np.dot(X, self.X_train.T)
-    dists = np.sqrt(np.matrix(XX).T + YY - 2 * XY)
+    XX = np.square(X).sum(axis=1, dtype=acc)
+    YY = np.square(X_train).sum(axis=1, dtype=acc)
+    XY = np.dot(X, X_train.T)
+    XY *= -2
+    XY += XX[:, np.newaxis]
+    XY += YY
+    dists = finish_distances(XY, squared)
 
     # print(np.matrix(XX).T.shape)
     # print(YY.T.shape)
     # print(YY.shape)
     # print(XY)
     #This does the following:
-    # (1) np.matrix(XX).T converts this into n_test,1 (column vector)
+    # (1) XX[:, np.newaxis] converts this into n_test,1 (column vector)
     # (2) YY is treated as a 'row vector' (note: np.array with dimensions (n_train,),
     #     has the same behaviour when transformed.
     # (3) XY is (n_test,n_train)
     # SO numpy does the following (but vectorized)
-    # dists[i,j] = np.sqrt(np.matrix(XX).T[i] + YY[j] - 2 * XY[i,j])
+    # dists[i,j] = np.sqrt(XX[i] + YY[j] - 2 * XY[i,j])
+    # (the sums are done in place on XY so that no other (n_test,n_train)
+    # temporary is allocated)
     #########################################################################
     # quick check (showing the behaviour)                                   #
     #########################################################################
-    # print(np.sqrt(np.matrix(XX).T[1] + YY[2] - 2 * XY[1,2]))
+    # print(np.sqrt(XX[1] + YY[2] - 2 * XY[1,2]))
     # print(dists[1,2])
     #########################################################################
     #                         END OF YOUR CODE                              #
     #########################################################################
     return dists
 
-  def predict_labels(self, dists, k=1):
+  def compute_nearest_blocked(self, X, k=1, memory_budget=2**27, dtype=None,
+                              squared=False):
+    """
+    Find the k nearest training points of every test point in X without
+    building the full (num_test, num_train) distance matrix.
+
+    The test and training data are walked in tiles sized so that the squared
+    distances of one tile (and the temporaries needed to merge it, counting
+    the int64 argpartition indices) fit in memory_budget bytes. Each test row
+    keeps a running top-k which is merged with every training tile using
+    np.argpartition.
+
+    Inputs:
+    - X: A numpy array of shape (num_test, D) containing test data.
+    - k: The number of nearest neighbors to keep for each test point.
+    - memory_budget: Approximate upper bound (in bytes) on the temporary memory
+      used by a single tile.
+    - dtype: Optional dtype of the data; the tiles are computed in
+      accumulator_dtype(dtype). By default the common floating point type of
+      X and self.X_train (at least float32) is used.
+    - squared: If True return squared distances (enough to rank neighbors).
+
+    Returns a tuple of:
+    - dists: A numpy array of shape (num_test, k) where dists[i, j] is the
+      Euclidean distance between the ith test point and its jth nearest
+      training point; each row is sorted in increasing order.
+    - idx: A numpy array of shape (num_test, k) giving the indices into
+      self.X_train of those training points.
+    """
+    num_test = X.shape[0]
+    num_train = self.X_train.shape[0]
+    k = min(k, num_train)
+
+    if dtype is None:
+      dtype = np.result_type(X.dtype, self.X_train.dtype, np.float32)
+    else:
+      dtype = accumulator_dtype(dtype)
+    itemsize = np.dtype(dtype).itemsize
+    if np.issubdtype(dtype, np.integer):
+      empty = np.iinfo(dtype).max
+    else:
+      empty = np.inf
+    train_block, test_block = self._nearest_blocks(X, k, memory_budget, dtype)
+
+    # The training norms are computed once, a training tile at a time, and
+    # reused by every test tile.
+    YY = np.empty(num_train, dtype=dtype)
+    for j0 in range(0, num_train, train_block):
+      YY[j0:j0 + train_block] = np.square(self.X_train[j0:j0 + train_block],
+                                          dtype=dtype).sum(axis=1, dtype=dtype)
+
+    dists = np.empty((num_test, k), dtype=dtype)
+    idx = np.empty((num_test, k), dtype=np.int64)
+    for i0 in range(0, num_test, test_block):
+      X_block = X[i0:i0 + test_block].astype(dtype, copy=False)
+      XX = np.square(X_block).sum(axis=1, dtype=dtype)
+      best_d = np.full((X_block.shape[0], k), empty, dtype=dtype)
+      best_i = np.zeros((X_block.shape[0], k), dtype=np.int64)
+
+      for j0 in range(0, num_train, train_block):
+        T_block = self.X_train[j0:j0 + train_block]
+        d2 = np.dot(X_block, T_block.T.astype(dtype, copy=False))
+        d2 *= -2
+        d2 += XX[:, np.newaxis]
+        d2 += YY[np.newaxis, j0:j0 + T_block.shape[0]]
+
+        ids = np.arange(j0, j0 + T_block.shape[0])
+        best_d, best_i = merge_top_k(best_d, best_i, d2, ids)
+
+      order = np.argsort(best_d, axis=1, kind='stable')
+      dists[i0:i0 + test_block] = np.take_along_axis(best_d, order, axis=1)
+      idx[i0:i0 + test_block] = np.take_along_axis(best_i, order, axis=1)
+
+    return finish_distances(dists, squared), idx
+
+  def _nearest_blocks(self, X, k, memory_budget, dtype):
+    """
+    The (train_block, test_block) tile shape of compute_nearest_blocked: the
+    widest training tile (up to 2048 columns) that still leaves room in
+    memory_budget for 32 test rows, and then as many test rows as fit.
+    """
+    num_test, D = X.shape
+    num_train = self.X_train.shape[0]
+    itemsize = np.dtype(dtype).itemsize
+    # For every (test row, training column) of a tile: the squared distance,
+    # the merged candidate and its int64 argpartition index. For every test
+    # row: the k current candidates with their indices and the k-wide int64
+    # temporaries of merge_top_k, and the row converted to dtype. For every
+    # training column: the column converted to dtype.
+    pair_bytes = 2 * itemsize + 8
+    row_bytes = k * (itemsize + 4 * 8) + (D * itemsize if X.dtype != dtype else 0)
+    column_bytes = D * itemsize if self.X_train.dtype != dtype else 0
+
+    rows = min(num_test, 32)
+    train_block = (memory_budget - rows * row_bytes) // (rows * pair_bytes + column_bytes)
+    train_block = int(min(num_train, 2048, max(1, train_block)))
+    test_block = ((memory_budget - train_block * column_bytes) //
+                  (row_bytes + train_block * pair_bytes))
+    test_block = int(min(num_test, max(1, test_block)))
+    return train_block, test_block
+
+  def predict_labels(self, dists, k=1, squared=False):
     """
     Given a matrix of distances between test points and training points,
     predict a label for each test point.
@@ -161,90 +359,341 @@ class KNearestNeighbor(object):
     Inputs:
     - dists: A numpy array of shape (num_test, num_train) where dists[i, j]
       gives the distance betwen the ith test point and the jth training point.
+    - squared: True if dists holds squared distances.
 
     Returns:
     - y: A numpy array of shape (num_test,) containing predicted labels for the
       test data, where y[i] is the predicted label for the test point X[i].
     """
-    num_test = dists.shape[0]
-    y_pred = np.zeros(num_test)
-
-    for i in range(num_test):
-      # A list of length k storing the labels of the k nearest neighbors to
-      # the ith test point.
-      closest_y = []
-      #########################################################################
-      # TODO:                                                                 #
-      # Use the distance matrix to find the k nearest neighbors of the ith    #
-      # testing point, and use self.y_train to find the labels of these       #
-      # neighbors. Store these labels in closest_y.                           #
-      # Hint: Look up the function numpy.argsort.                             #
-      #########################################################################
-      k_closest_points = np.array(np.argsort(dists[i,:])).reshape(-1,)[:k]
-      closest_classes = self.y_train[k_closest_points]
-      closest_y       = closest_classes[0]
-      #########################################################################
-      # TODO:                                                                 #
-      # Now that you have found the labels of the k nearest neighbors, you    #
-      # need to find the most common label in the list closest_y of labels.   #
-      # Store this label in y_pred[i]. Break ties by choosing the smaller     #
-      # label.                                                                #
-      #########################################################################
-      occurences = np.bincount(closest_classes)
-      #bincount acts as a counter
-      #If you just want the smallest numerical label:
-      # y_pred[i] = np.sort(np.argmax(occurences), axis=None)
-      max = np.amax(occurences)
-      #amax the maximum value in occurences (i.e. the voting rank, giving all occurences the same weight)
-
-      max_classes = np.argwhere(occurences == max).flatten()
-      if k > 2 and len(max_classes) > 1:
-        #if max is greater than one and there are multiple values of max
-        #   in occurences ==> this implies something like this has occured:
-        #   [2 0 1 0 2] ==> [0 2] ==> want minimal distance (of the max occurences);
-
-        from collections import defaultdict
-        class_to_total_dist   = defaultdict(int)
-        #Can't use Counter: Elements with equal counts are ordered arbitrarily;
-
-        for x in k_closest_points:
-            if self.y_train[x] in max_classes:
-                class_to_total_dist[self.y_train[x]] += dists[i,x]**2
-        closest_min_y = [min(class_to_total_dist, key=class_to_total_dist.get)]
-        closest_y = closest_min_y[0]
-        #take the minimum element and put it into closest_y
-        #NOTE: that closest_y is set earlier to the first element of closest_classes;
-      y_pred[i] =  int(closest_y)
+    dists = np.asarray(dists)
+    #########################################################################
+    # TODO:                                                                 #
+    # Use the distance matrix to find the k nearest neighbors of the ith    #
+    # testing point, and use self.y_train to find the labels of these       #
+    # neighbors. Store these labels in closest_y.                           #
+    # Hint: Look up the function numpy.argsort.                             #
+    #########################################################################
+    k_closest_points = self.nearest_from_dists(dists, k)
+    k_closest_dists  = np.take_along_axis(dists, k_closest_points, axis=1)
     #########################################################################
     #                           END OF YOUR CODE                            #
     #########################################################################
-    return y_pred
+    return self.vote_labels(k_closest_dists, k_closest_points, squared=squared)
+
+  def nearest_from_dists(self, dists, k):
+    """
+    Select the (unordered) indices of the k smallest entries of every row of
+    dists using np.argpartition, which is O(num_train) per row instead of the
+    O(num_train log num_train) of a full argsort.
+
+    Inputs:
+    - dists: A numpy array of shape (num_test, num_train).
+    - k: The number of nearest neighbors to select.
+
+    Returns:
+    - idx: A numpy array of shape (num_test, min(k, num_train)).
+    """
+    num_test, num_train = dists.shape
+    if k >= num_train:
+      return np.tile(np.arange(num_train), (num_test, 1))
+    return np.argpartition(dists, k - 1, axis=1)[:, :k]
+
+  def count_votes(self, nearest_idx, nearest_dists=None, squared=False):
+    """
+    Count the votes of the k nearest neighbors of every test point at once.
+
+    Every test row is offset into its own block of num_classes bins so that a
+    single np.bincount over the flattened (num_test, k) labels produces the
+    whole (num_test, num_classes) table.
+
+    Inputs:
+    - nearest_idx: A numpy array of shape (num_test, k) of indices into
+      self.y_train.
+    - nearest_dists: Optional numpy array of shape (num_test, k) holding the
+      matching distances.
+    - squared: True if nearest_dists holds squared distances.
+
+    Returns a tuple of:
+    - votes: A numpy array of shape (num_test, num_classes) of vote counts.
+    - total_dist: None if nearest_dists is None, otherwise a numpy array of
+      shape (num_test, num_classes) holding, for every class, the summed
+      squared distance of the neighbors that voted for it.
+    """
+    num_test = nearest_idx.shape[0]
+    num_classes = int(np.max(self.y_train)) + 1
+    offsets = num_classes * np.arange(num_test)[:, np.newaxis]
+    flat = (offsets + self.y_train[nearest_idx]).ravel()
+    size = num_test * num_classes
+
+    votes = np.bincount(flat, minlength=size).reshape(num_test, num_classes)
+    if nearest_dists is None:
+      return votes, None
+    if squared:
+      weights = nearest_dists.astype(np.float64).ravel()
+    else:
+      weights = np.square(nearest_dists, dtype=np.float64).ravel()
+    total_dist = np.bincount(flat, weights=weights, minlength=size)
+    return votes, total_dist.reshape(num_test, num_classes)
+
+  def vote_labels(self, nearest_dists, nearest_idx, squared=False):
+    """
+    Given the k nearest training points of every test point, predict a label
+    for each test point.
+
+    The most common label among the neighbors wins; ties are broken by the
+    smallest summed squared distance of the tied classes and then by the
+    smaller label.
+
+    Inputs:
+    - nearest_dists: A numpy array of shape (num_test, k) where
+      nearest_dists[i, j] is the distance between the ith test point and one
+      of its k nearest training points (rows do not need to be sorted).
+    - nearest_idx: A numpy array of shape (num_test, k) giving the indices into
+      self.y_train of those training points.
+    - squared: True if nearest_dists holds squared distances.
+
+    Returns:
+    - y: A numpy array of shape (num_test,) containing predicted labels for the
+      test data, where y[i] is the predicted label for the test point X[i].
+    """
+    votes, total_dist = self.count_votes(nearest_idx, nearest_dists, squared)
+    #[2 0 1 0 2] ==> [0 2] are tied ==> want minimal distance (of the max occurences);
+    tied = votes == np.max(votes, axis=1, keepdims=True)
+    total_dist[~tied] = np.inf
+    return np.argmin(total_dist, axis=1).astype(self.y_train.dtype)
 
   def predict_proba_labels(self, dists, k=1):
-        """
-        Given a matrix of distances between test points and training points,
-        predict a probability of a label for each test point.
-
-        Inputs:
-        - dists: A numpy array of shape (num_test, num_train) where dists[i, j]
-          gives the distance betwen the ith test point and the jth training point.
-
-        Returns:
-        - y: A numpy array of shape (num_test,num_classes) containing predicted
-             labels for the test data, where y[i] is the predicted naive
-             probability label for the test point X[i].
-        """
-        num_test    = dists.shape[0]
-        num_classes = len(np.unique(self.y_train))
-        y_pred      = np.zeros((num_test,num_classes))
-        occurences  = np.zeros(num_classes)
-
-        for i in range(num_test):
-            # A list of length k storing the labels of the k nearest neighbors to
-            # the ith test point.
-            closest_y = []
-            k_closest_points = np.array(np.argsort(dists[i,:])).reshape(-1,)[:k]
-            closest_classes = self.y_train[k_closest_points]
-            occurences = np.bincount(closest_classes, minlength=num_classes)
-            y_pred[i] = occurences / k
-        return y_pred
+    """
+    Given a matrix of distances between test points and training points,
+    predict a probability of a label for each test point.
+
+    Inputs:
+    - dists: A numpy array of shape (num_test, num_train) where dists[i, j]
+      gives the distance betwen the ith test point and the jth training point.
+
+    Returns:
+    - y: A numpy array of shape (num_test,num_classes) containing predicted
+         labels for the test data, where y[i] is the predicted naive
+         probability label for the test point X[i].
+    """
+    dists = np.asarray(dists)
+    k_closest_points = self.nearest_from_dists(dists, k)
+    votes, _ = self.count_votes(k_closest_points)
+    return votes / k
+
+
+# Training data shared with the cross-validation workers. It is set before the
+# pool is forked so that the children read it copy-on-write instead of having
+# it pickled to them.
+_cv_shared = {}
+
+
+def _cross_validate_fold(j):
+  """ Accuracies of every k in _cv_shared['k_choices'] on validation fold j. """
+  X, y = _cv_shared['X'], _cv_shared['y']
+  folds, k_choices = _cv_shared['folds'], _cv_shared['k_choices']
+  train_idx = np.concatenate(folds[:j] + folds[j + 1:])
+  val_idx = folds[j]
+
+  knn = KNearestNeighbor()
+  knn.train(X[train_idx], y[train_idx])
+  # One sorted top-max(k) search per fold; the k nearest neighbors of every
+  # smaller k are a prefix of it.
+  nearest_dists, nearest_idx = knn.compute_nearest_blocked(
+      X[val_idx], k=max(k_choices), memory_budget=_cv_shared['memory_budget'],
+      dtype=_cv_shared['dtype'], squared=True)
+  return [np.mean(knn.vote_labels(nearest_dists[:, :k], nearest_idx[:, :k],
+                                  squared=True) == y[val_idx])
+          for k in k_choices]
+
+
+def cross_validate_k(X, y, k_choices, num_folds=5, num_workers=None,
+                     memory_budget=2**27, dtype=None):
+  """
+  Run num_folds-fold cross-validation of KNearestNeighbor for every k in
+  k_choices.
+
+  The folds are the same as np.array_split(X, num_folds). Every fold finds
+  the max(k_choices) nearest neighbors of its validation points only once
+  (with compute_nearest_blocked) and scores every k from that sorted list,
+  so a whole k sweep costs about as much as a single prediction. Folds are
+  run in parallel on a pool of forked processes.
+
+  Inputs:
+  - X: A numpy array of shape (N, D) containing the data.
+  - y: A numpy array of shape (N,) containing the labels.
+  - k_choices: Iterable of the values of k to evaluate.
+  - num_folds: Number of cross-validation folds.
+  - num_workers: Number of worker processes; defaults to
+    min(num_folds, cpu count). With 1, or where fork is unavailable, the
+    folds are run in this process.
+  - memory_budget, dtype: Passed on to compute_nearest_blocked.
+
+  Returns:
+  - k_to_accuracies: A dictionary mapping every k to a list of length
+    num_folds giving the validation accuracy of each fold.
+  """
+  k_choices = [int(k) for k in k_choices]
+  if len(k_choices) == 0 or min(k_choices) < 1:
+    raise ValueError('Invalid k_choices %r (every k must be > 0)' % (k_choices,))
+  if num_workers is None:
+    num_workers = min(num_folds, multiprocessing.cpu_count())
+
+  folds = np.array_split(np.arange(X.shape[0]), num_folds)
+  _cv_shared.update(X=X, y=y, folds=folds, k_choices=k_choices,
+                    memory_budget=memory_budget, dtype=dtype)
+  try:
+    if num_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+      pool = multiprocessing.get_context('fork').Pool(num_workers)
+      try:
+        accuracies = pool.map(_cross_validate_fold, range(num_folds))
+      finally:
+        pool.close()
+        pool.join()
+    else:
+      accuracies = [_cross_validate_fold(j) for j in range(num_folds)]
+  finally:
+    _cv_shared.clear()
+
+  return {k: [fold[i] for fold in accuracies] for i, k in enumerate(k_choices)}
+
+
+class IVFIndex(object):
+  """
+  An inverted file (IVF) index for approximate L2 nearest neighbor search,
+  written in plain numpy.
+
+  The training points are clustered with k-means into num_lists coarse
+  cells; every query is only compared against the points of the num_probes
+  cells whose centroids are closest to it. num_probes is the recall/speed
+  knob: num_probes=num_lists is an exact (but slower) search.
+  """
+
+  def __init__(self, num_lists=64, num_probes=8, kmeans_iters=10,
+               kmeans_sample=256, seed=None):
+    """
+    Inputs:
+    - num_lists: Number of coarse k-means cells.
+    - num_probes: Number of cells searched per query.
+    - kmeans_iters: Number of Lloyd iterations used to fit the centroids.
+    - kmeans_sample: Centroids are fit on at most kmeans_sample * num_lists
+      randomly chosen training points.
+    - seed: Optional seed for the k-means initialization.
+    """
+    self.num_lists = num_lists
+    self.num_probes = num_probes
+    self.kmeans_iters = kmeans_iters
+    self.kmeans_sample = kmeans_sample
+    self.seed = seed
+
+  def build(self, X):
+    """
+    Cluster X and store its points grouped by cell.
+
+    Inputs:
+    - X: A numpy array of shape (num_train, D).
+    """
+    rng = np.random.RandomState(self.seed)
+    num_train = X.shape[0]
+    self.dtype = np.result_type(X.dtype, np.float32)
+    num_lists = min(self.num_lists, num_train)
+
+    sample = min(num_train, self.kmeans_sample * num_lists)
+    X_fit = X[rng.choice(num_train, sample, replace=False)].astype(self.dtype)
+    centroids = X_fit[rng.choice(sample, num_lists, replace=False)].copy()
+    for it in range(self.kmeans_iters):
+      assign = self._assign(X_fit, centroids)
+      counts = np.bincount(assign, minlength=num_lists)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, assign, X_fit)
+      empty = counts == 0
+      centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+      # re-seed empty cells with random points so that no cell is wasted
+      centroids[empty] = X_fit[rng.choice(sample, np.sum(empty))]
+
+    assign = self._assign(X, centroids)
+    # Store the points sorted by cell so that every cell is a contiguous slice.
+    self.order = np.argsort(assign, kind='stable')
+    self.X_sorted = X[self.order].astype(self.dtype)
+    self.norms_sorted = np.square(self.X_sorted).sum(axis=1)
+    self.offsets = np.searchsorted(assign[self.order], np.arange(num_lists + 1))
+    self.centroids = centroids
+
+  def _assign(self, X, centroids, block=4096):
+    """ Index of the nearest centroid for every row of X. """
+    cc = np.square(centroids).sum(axis=1)
+    assign = np.empty(X.shape[0], dtype=np.int64)
+    for i0 in range(0, X.shape[0], block):
+      X_block = X[i0:i0 + block].astype(self.dtype, copy=False)
+      d2 = cc - 2 * np.dot(X_block, centroids.T)
+      assign[i0:i0 + block] = np.argmin(d2, axis=1)
+    return assign
+
+  def query(self, X, k=1):
+    """
+    Find (approximately) the k nearest indexed points of every row of X.
+
+    Queries are grouped by probed cell, so the work per cell is a single
+    matrix multiply between the queries probing it and the cell's points.
+
+    Inputs:
+    - X: A numpy array of shape (num_test, D).
+    - k: The number of nearest neighbors to return.
+
+    Returns a tuple of:
+    - dists: A numpy array of shape (num_test, k) of Euclidean distances,
+      each row sorted in increasing order.
+    - idx: A numpy array of shape (num_test, k) of indices into the array the
+      index was built from.
+    """
+    num_test = X.shape[0]
+    num_lists = self.centroids.shape[0]
+    k = min(k, self.X_sorted.shape[0])
+    num_probes = min(self.num_probes, num_lists)
+
+    X = X.astype(self.dtype, copy=False)
+    XX = np.square(X).sum(axis=1)
+    coarse = np.square(self.centroids).sum(axis=1) - 2 * np.dot(X, self.centroids.T)
+    if num_probes < num_lists:
+      probes = np.argpartition(coarse, num_probes - 1, axis=1)[:, :num_probes]
+    else:
+      probes = np.tile(np.arange(num_lists), (num_test, 1))
+
+    # (query, cell) pairs sorted by cell: queries probing cell l are
+    # pair_query[pair_start[l]:pair_start[l + 1]].
+    pair_cell = probes.ravel()
+    pair_query = np.repeat(np.arange(num_test), num_probes)
+    by_cell = np.argsort(pair_cell, kind='stable')
+    pair_query = pair_query[by_cell]
+    pair_start = np.searchsorted(pair_cell[by_cell], np.arange(num_lists + 1))
+
+    best_d = np.full((num_test, k), np.inf, dtype=self.dtype)
+    best_i = np.zeros((num_test, k), dtype=np.int64)
+    for l in range(num_lists):
+      lo, hi = self.offsets[l], self.offsets[l + 1]
+      queries = pair_query[pair_start[l]:pair_start[l + 1]]
+      if lo == hi or queries.size == 0:
+        continue
+      d2 = np.dot(X[queries], self.X_sorted[lo:hi].T)
+      d2 *= -2
+      d2 += XX[queries, np.newaxis]
+      d2 += self.norms_sorted[np.newaxis, lo:hi]
+      best_d[queries], best_i[queries] = merge_top_k(
+          best_d[queries], best_i[queries], d2, np.arange(lo, hi))
+
+    # Queries whose probed cells hold fewer than k points fall back to a
+    # search over every cell.
+    short = np.nonzero(~np.all(np.isfinite(best_d), axis=1))[0]
+    if short.size > 0:
+      d2 = np.dot(X[short], self.X_sorted.T)
+      d2 *= -2
+      d2 += XX[short, np.newaxis]
+      d2 += self.norms_sorted[np.newaxis, :]
+      best_i[short] = np.argpartition(d2, k - 1, axis=1)[:, :k]
+      best_d[short] = np.take_along_axis(d2, best_i[short], axis=1)
+
+    order = np.argsort(best_d, axis=1, kind='stable')
+    dists = np.take_along_axis(best_d, order, axis=1)
+    idx = self.order[np.take_along_axis(best_i, order, axis=1)]
+    np.maximum(dists, 0, out=dists)
+    return np.sqrt(dists, out=dists), idx
@@ -1,21 +1,30 @@
 import numpy as np
+from scipy.optimize import minimize
 from cs231n.classifiers.linear_svm import *
 from cs231n.classifiers.softmax import *
+from cs231n.classifiers.loss_workspace import LossWorkspace
+from cs231n.classifiers.epoch_sampler import EpochSampler
 
 class LinearClassifier(object):
 
   def __init__(self):
     self.W = None
     self.v = 0.
+    self.W_min = None
+    self.min_loss = np.inf
+    # buffers reused by the fused loss kernels on every iteration
+    self.workspace = LossWorkspace()
 
   def train(self, X, y, learning_rate=1e-3, reg=1e-5, num_iters=100,
-            batch_size=200, verbose=False):
+            batch_size=200, verbose=False, sampling='replacement',
+            prefetch=False):
     """
     Train this linear classifier using stochastic gradient descent.
 
     Inputs:
     - X: A numpy array of shape (N, D) containing training data; there are N
-      training samples each of dimension D.
+      training samples each of dimension D. If X is float32 the weights and
+      the loss computations are float32 as well.
     - y: A numpy array of shape (N,) containing training labels; y[i] = c
       means that X[i] has label 0 <= c < C for C classes.
     - learning_rate: (float) learning rate for optimization.
@@ -23,15 +32,30 @@ class LinearClassifier(object):
     - num_iters: (integer) number of steps to take when optimizing
     - batch_size: (integer) number of training examples to use at each step.
     - verbose: (boolean) If true, print progress during optimization.
+    - sampling: 'replacement' draws every minibatch with np.random.choice
+      (with replacement); 'epoch' samples without replacement through an
+      EpochSampler, whose minibatches are views of a shuffled float32 copy
+      of X.
+    - prefetch: Only used when sampling='epoch'; shuffle the next epoch on a
+      background thread.
 
     Outputs:
     A list containing the value of the loss function at each training iteration.
     """
     num_train, dim = X.shape
     num_classes = np.max(y) + 1 # assume y takes values 0...K-1 where K is number of classes
+    if sampling == 'epoch':
+      sampler = EpochSampler(X, y, batch_size, prefetch=prefetch)
+      data_dtype = sampler.dtype
+    elif sampling == 'replacement':
+      sampler = None
+      data_dtype = X.dtype
+    else:
+      raise ValueError('Invalid value %r for sampling' % (sampling,))
     if self.W is None:
       # lazily initialize W
-      self.W        = 0.001 * np.random.randn(dim, num_classes)
+      dtype         = np.result_type(data_dtype, np.float32)
+      self.W        = (0.001 * np.random.randn(dim, num_classes)).astype(dtype)
       self.W_min    = self.W
       self.min_loss = np.inf
 
@@ -52,15 +76,19 @@ class LinearClassifier(object):
       # Hint: Use np.random.choice to generate indices. Sampling with         #
       # replacement is faster than sampling without replacement.              #
       #########################################################################
-      idx = np.random.choice(num_train, batch_size, replace=True)
-      X_batch = X[idx,:]
-      y_batch = y[idx]
+      if sampler is not None:
+        X_batch, y_batch = sampler.next_batch()
+      else:
+        idx = np.random.choice(num_train, batch_size, replace=True)
+        X_batch = X[idx,:]
+        y_batch = y[idx]
       #########################################################################
       #                       END OF YOUR CODE                                #
       #########################################################################
 
-      # evaluate loss and gradient
-      loss, grad = self.loss(X_batch, y_batch, reg)
+      # evaluate loss and gradient (grad is a workspace buffer, only valid
+      # until the next iteration)
+      loss, grad = self._train_loss(X_batch, y_batch, reg)
       if loss < self.min_loss:
         self.W_min, self.min_loss = self.W, loss
       loss_history.append(loss)
@@ -82,8 +110,100 @@ class LinearClassifier(object):
       if verbose and it % 100 == 0:
         print(('iteration %d / %d: loss %f' % (it, num_iters, loss)))
 
+    if sampler is not None:
+      sampler.close()
     return loss_history
 
+  def train_closed_form(self, X, y, reg=1e-5):
+    """
+    Fit the weights in closed form as the ridge regression of one-hot
+    targets, i.e. the minimizer of
+      1 / (2 N) * ||X W - Y||^2 + 0.5 * reg * ||W||^2
+    which solves (X^T X / N + reg I) W = X^T Y / N. This is a least-squares
+    (not SVM or softmax) classifier; for a few hundred features it costs one
+    D x D solve and makes a good starting point for train_lbfgs.
+
+    Inputs:
+    - X: A numpy array of shape (N, D) containing training data.
+    - y: A numpy array of shape (N,) containing training labels.
+    - reg: (float) regularization strength.
+    """
+    num_train, dim = X.shape
+    num_classes = np.max(y) + 1
+    Y = np.zeros((num_train, num_classes))
+    Y[np.arange(num_train), y] = 1
+
+    A = np.dot(X.T, X) / num_train
+    A[np.diag_indices(dim)] += reg
+    self.W = np.linalg.solve(A, np.dot(X.T, Y) / num_train)
+    return self.W
+
+  def train_lbfgs(self, X, y, reg=1e-5, max_iter=100, tol=1e-6,
+                  init='random', smoothing=1.0, verbose=False):
+    """
+    Train this linear classifier with full-batch L-BFGS (scipy.optimize).
+
+    On low dimensional inputs (e.g. HOG + color histogram features) this
+    converges in tens of loss evaluations where train needs thousands of SGD
+    steps. Each evaluation uses the whole training set.
+
+    Inputs:
+    - X: A numpy array of shape (N, D) containing training data.
+    - y: A numpy array of shape (N,) containing training labels.
+    - reg: (float) regularization strength.
+    - max_iter: (integer) maximum number of L-BFGS iterations.
+    - tol: (float) stop when the relative decrease of the loss is below tol.
+    - init: 'random' (small random weights, as in train), 'closed_form' (start
+      from train_closed_form) or 'current' (continue from self.W).
+    - smoothing: Only used by LinearSVM; width of the smoothed hinge (see
+      svm_loss_smoothed). The plain hinge (smoothing=0) is not differentiable
+      and L-BFGS may stop early on it.
+    - verbose: (boolean) If true, print the loss after every iteration.
+
+    Outputs:
+    A list containing the value of the loss function after every iteration.
+    """
+    num_train, dim = X.shape
+    num_classes = np.max(y) + 1
+    X = X.astype(np.float64, copy=False)
+    if init == 'closed_form':
+      self.train_closed_form(X, y, reg)
+    elif init == 'random':
+      self.W = 0.001 * np.random.randn(dim, num_classes)
+    elif init != 'current' or self.W is None:
+      raise ValueError('Invalid value %r for init' % (init,))
+
+    last = {}
+    def loss_and_grad(w):
+      loss, grad = self.full_batch_loss(w.reshape(dim, num_classes), X, y,
+                                        reg, smoothing)
+      last['w'], last['loss'] = w.copy(), loss
+      return loss, np.asarray(grad, dtype=np.float64).ravel()
+
+    loss_history = []
+    def record(w):
+      # the accepted point is normally the last one evaluated
+      if not np.array_equal(w, last['w']):
+        loss_and_grad(w)
+      loss_history.append(last['loss'])
+      if verbose:
+        print(('iteration %d / %d: loss %f' % (len(loss_history), max_iter,
+                                               loss_history[-1])))
+
+    result = minimize(loss_and_grad, self.W.astype(np.float64).ravel(),
+                      jac=True, method='L-BFGS-B', callback=record,
+                      options={'maxiter': max_iter, 'ftol': tol})
+    self.W = result.x.reshape(dim, num_classes)
+    self.num_evaluations = result.nfev
+    return loss_history
+
+  def full_batch_loss(self, W, X, y, reg, smoothing):
+    """
+    Loss and gradient at weights W, used by train_lbfgs.
+    Subclasses will override this.
+    """
+    pass
+
   def predict(self, X):
     """
     Use the trained weights of this linear classifier to predict labels for
@@ -125,12 +245,27 @@ class LinearClassifier(object):
     """
     pass
 
+  def _train_loss(self, X_batch, y_batch, reg):
+    """
+    The loss and gradient train() steps with. Subclasses may return a
+    gradient that aliases a buffer of self.workspace, overwritten by the next
+    call; loss() must return arrays of their own.
+    """
+    return self.loss(X_batch, y_batch, reg)
+
 
 class LinearSVM(LinearClassifier):
   """ A subclass that uses the Multiclass SVM loss function """
 
   def loss(self, X_batch, y_batch, reg):
-    return svm_loss_vectorized(self.W, X_batch, y_batch, reg)
+    loss, dW = self._train_loss(X_batch, y_batch, reg)
+    return loss, dW.copy()
+
+  def _train_loss(self, X_batch, y_batch, reg):
+    return svm_loss_fused(self.W, X_batch, y_batch, reg, self.workspace)
+
+  def full_batch_loss(self, W, X, y, reg, smoothing):
+    return svm_loss_smoothed(W, X, y, reg, smoothing)
 
   def score(self, X, y):
     return svm_scores(self.W, X, y)
@@ -140,12 +275,158 @@ class Softmax(LinearClassifier):
   """ A subclass that uses the Softmax + Cross-entropy loss function """
 
   def loss(self, X_batch, y_batch, reg):
-    return softmax_loss_vectorized(self.W, X_batch, y_batch, reg)
+    loss, dW = self._train_loss(X_batch, y_batch, reg)
+    return loss, dW.copy()
+
+  def _train_loss(self, X_batch, y_batch, reg):
+    return softmax_loss_fused(self.W, X_batch, y_batch, reg, self.workspace)
+
+  def full_batch_loss(self, W, X, y, reg, smoothing):
+    return softmax_loss_vectorized(W, X, y, reg)
 
   def score(self, X, y):
     return softmax_score(self.W, X, y)
 
 
+class BatchedLinearClassifier(object):
+  """
+  Train M linear classifiers with different (learning_rate, reg) at once.
+
+  The weights of all models live in one (D, M, C) array (exposed as W with
+  shape (M, D, C)), every minibatch is read once for all of them and the
+  scores/gradients of all models come from one matrix multiply each (see
+  svm_loss_batched). The models share the minibatches; otherwise every model
+  follows the same update as LinearClassifier.train.
+  """
+
+  def __init__(self, learning_rates, regs):
+    """
+    Inputs:
+    - learning_rates: Sequence of M learning rates, one per model.
+    - regs: Sequence of M regularization strengths, one per model.
+
+    For a grid use e.g.
+      lr, reg = zip(*itertools.product(learning_rates, regularization_strengths))
+    """
+    self.learning_rates = np.asarray(learning_rates, dtype=np.float64)
+    self.regs = np.asarray(regs, dtype=np.float64)
+    if self.learning_rates.ndim != 1 or self.learning_rates.shape != self.regs.shape:
+      raise ValueError("learning_rates and regs must be sequences of equal length.")
+    self.num_models = self.learning_rates.shape[0]
+    self.W_dmc = None
+    self.v = 0.
+
+  @property
+  def W(self):
+    """ The weights of all models; an array of shape (M, D, C). """
+    return None if self.W_dmc is None else self.W_dmc.transpose(1, 0, 2)
+
+  def train(self, X, y, num_iters=100, batch_size=200, verbose=False,
+            sampling='replacement', prefetch=False):
+    """
+    Train all models using stochastic gradient descent.
+
+    Inputs: Same as LinearClassifier.train, without learning_rate and reg
+    (which were given to the constructor).
+
+    Outputs:
+    A list of M lists, the loss histories of every model.
+    """
+    num_train, dim = X.shape
+    num_classes = np.max(y) + 1
+    if sampling == 'epoch':
+      sampler = EpochSampler(X, y, batch_size, prefetch=prefetch)
+      data_dtype = sampler.dtype
+    elif sampling == 'replacement':
+      sampler = None
+      data_dtype = X.dtype
+    else:
+      raise ValueError('Invalid value %r for sampling' % (sampling,))
+    if self.W_dmc is None:
+      dtype = np.result_type(data_dtype, np.float32)
+      self.W_dmc = (0.001 * np.random.randn(dim, self.num_models, num_classes)).astype(dtype)
+
+    learning_rates = self.learning_rates.astype(self.W_dmc.dtype)
+    regs = self.regs.astype(self.W_dmc.dtype)
+    loss_history = []
+    for it in range(num_iters):
+      if sampler is not None:
+        X_batch, y_batch = sampler.next_batch()
+      else:
+        idx = np.random.choice(num_train, batch_size, replace=True)
+        X_batch = X[idx,:]
+        y_batch = y[idx]
+
+      loss, grad = self.loss(X_batch, y_batch, regs)
+      loss_history.append(loss)
+
+      if it % max(int(num_train/batch_size), 1) == 0:
+        learning_rates *= 0.97
+
+      # same momentum update as LinearClassifier.train, one step per model
+      self.v = 0.95 * self.v - learning_rates[np.newaxis, :, np.newaxis] * grad.transpose(1, 0, 2)
+      self.W_dmc += self.v
+
+      if verbose and it % 100 == 0:
+        print(('iteration %d / %d: loss min %f max %f' % (it, num_iters,
+                                                          np.min(loss), np.max(loss))))
+
+    if sampler is not None:
+      sampler.close()
+    return [list(h) for h in np.array(loss_history).T]
+
+  def predict(self, X):
+    """
+    Predict labels with every model.
+
+    Inputs:
+    - X: A numpy array of shape (N, D).
+
+    Returns:
+    - y_pred: An integer array of shape (M, N); y_pred[m] are the predictions
+      of model m.
+    """
+    num_features, num_models, num_classes = self.W_dmc.shape
+    scores = np.dot(X, self.W_dmc.reshape(num_features, -1))
+    return np.argmax(scores.reshape(-1, num_models, num_classes), axis=2).T
+
+  def classifiers(self):
+    """ The trained models as a list of M single-model classifiers. """
+    models = []
+    for m in range(self.num_models):
+      model = self.classifier_class()
+      model.W = self.W_dmc[:, m, :].copy()
+      models.append(model)
+    return models
+
+  def loss(self, X_batch, y_batch, reg):
+    """
+    Compute the loss of every model and the derivatives.
+    Subclasses will override this.
+
+    Returns: A tuple containing:
+    - loss as an array of shape (M,)
+    - gradient with respect to self.W; an array of shape (M, D, C)
+    """
+    pass
+
+
+class BatchedLinearSVM(BatchedLinearClassifier):
+  """ M LinearSVM models trained together """
+  classifier_class = LinearSVM
+
+  def loss(self, X_batch, y_batch, reg):
+    return svm_loss_batched(self.W, X_batch, y_batch, reg)
+
+
+class BatchedSoftmax(BatchedLinearClassifier):
+  """ M Softmax models trained together """
+  classifier_class = Softmax
+
+  def loss(self, X_batch, y_batch, reg):
+    return softmax_loss_batched(self.W, X_batch, y_batch, reg)
+
+
 def svm_scores(W, X, y):
   return np.dot(X,W)
 
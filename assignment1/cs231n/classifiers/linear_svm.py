@@ -1,5 +1,6 @@
 import numpy as np
 from random import shuffle
+from cs231n.classifiers.loss_workspace import LossWorkspace
 
 def svm_loss_naive(W, X, y, reg):
   """
@@ -165,3 +166,174 @@ def svm_loss_vectorized(W, X, y, reg):
   #############################################################################
 
   return loss, dW
+
+
+def svm_loss_fused(W, X, y, reg, workspace=None):
+  """
+  Structured SVM loss function, fused and allocation-free implementation.
+
+  Same inputs and outputs as svm_loss_vectorized, but the scores, margins and
+  the gradient coefficients share one (N, C) buffer that is updated in place,
+  and every array is taken from workspace (a LossWorkspace) so that calls
+  with the same shapes allocate no new N x C or D x C arrays. The computation
+  runs in the common dtype of W and X, so float32 inputs stay float32.
+
+  Inputs:
+  - W, X, y, reg: Same as svm_loss_naive.
+  - workspace: Optional LossWorkspace; a new one is used if None.
+
+  Returns a tuple of:
+  - loss as single float
+  - gradient with respect to weights W. NOTE: this is a workspace buffer that
+    is overwritten by the next call using the same workspace.
+  """
+  if W.shape[0] != X.shape[1]:
+    raise ValueError("Shape of the weight array (W) doesn't match shape of training data (X)!")
+  if X.shape[0] != y.shape[0]:
+    raise ValueError("X and y have incompatible shapes.\n" +
+                             "X has %s samples, but y has %s." %
+                             (X.shape[0], y.shape[0]))
+  if X.ndim != 2:
+    raise ValueError("Require X to have X.ndim = 2;")
+  if W.ndim != 2:
+    raise ValueError("Require W to have W.ndim = 2;")
+  if y.ndim != 1:
+    raise ValueError("True class labels (y) should be input as a vector.")
+  if workspace is None:
+    workspace = LossWorkspace()
+
+  num_train = X.shape[0]
+  num_features, num_classes = W.shape
+  dtype = np.result_type(W.dtype, X.dtype, np.float32)
+  X = X.astype(dtype, copy=False)
+  W = W.astype(dtype, copy=False)
+
+  rows    = workspace.arange(num_train)
+  scores  = workspace.get('scores', (num_train, num_classes), dtype)
+  correct = workspace.get('rows', (num_train, 1), dtype)
+  dW      = workspace.get('dW', (num_features, num_classes), dtype)
+  regW    = workspace.get('regW', (num_features, num_classes), dtype)
+
+  np.dot(X, W, out=scores)
+  # margins: scores - correct class score + 1, with the correct class zeroed
+  correct[:, 0] = scores[rows, y]
+  scores -= correct
+  scores += 1
+  scores[rows, y] = 0
+  np.maximum(scores, 0, out=scores)
+  loss = np.sum(scores) / num_train + 0.5 * reg * np.vdot(W, W)
+
+  # gradient coefficients: 1 for every positive margin and minus the number
+  # of positive margins for the correct class, pre-scaled by 1 / num_train
+  np.sign(scores, out=scores)
+  np.sum(scores, axis=1, keepdims=True, out=correct)
+  scores[rows, y] = -correct[:, 0]
+  scores *= 1.0 / num_train
+
+  np.dot(X.T, scores, out=dW)
+  np.multiply(W, reg, out=regW)
+  dW += regW
+  return float(loss), dW
+
+
+def svm_loss_batched(W, X, y, reg):
+  """
+  Structured SVM loss of M models at once, all on the same minibatch.
+
+  The scores of every model come from a single (N, D) x (D, M * C) matrix
+  multiply and the gradients from a single (D, N) x (N, M * C) one. Storing
+  the weights as W = W_dmc.transpose(1, 0, 2) for a C-contiguous (D, M, C)
+  array W_dmc makes both reshapes free.
+
+  Inputs:
+  - W: A numpy array of shape (M, D, C) containing the weights of M models.
+  - X: A numpy array of shape (N, D) containing a minibatch of data.
+  - y: A numpy array of shape (N,) containing training labels.
+  - reg: Regularization strength, a float or an array of shape (M,).
+
+  Returns a tuple of:
+  - loss: A numpy array of shape (M,) holding the loss of every model.
+  - dW: Gradient with respect to W; an array of shape (M, D, C) (a view of a
+    (D, M, C) array).
+  """
+  if W.ndim != 3:
+    raise ValueError("Require W to have W.ndim = 3;")
+  if X.ndim != 2:
+    raise ValueError("Require X to have X.ndim = 2;")
+  if W.shape[1] != X.shape[1]:
+    raise ValueError("Shape of the weight array (W) doesn't match shape of training data (X)!")
+  if X.shape[0] != y.shape[0]:
+    raise ValueError("X and y have incompatible shapes.\n" +
+                             "X has %s samples, but y has %s." %
+                             (X.shape[0], y.shape[0]))
+
+  num_models, num_features, num_classes = W.shape
+  num_train = X.shape[0]
+  rows = np.arange(num_train)
+  W_dmc = W.transpose(1, 0, 2)
+  reg = np.broadcast_to(np.asarray(reg, dtype=W.dtype), (num_models,))
+
+  scores = np.dot(X, W_dmc.reshape(num_features, -1))
+  margin = scores.reshape(num_train, num_models, num_classes)
+  #margin[i, m, c] = score of class c of model m on sample i - correct score + 1
+  margin -= margin[rows, :, y][:, :, np.newaxis]
+  margin += 1
+  margin[rows, :, y] = 0
+  np.maximum(margin, 0, out=margin)
+  loss = np.sum(margin, axis=(0, 2)) / num_train
+  loss += 0.5 * reg * np.einsum('dmc,dmc->m', W_dmc, W_dmc)
+
+  np.sign(margin, out=margin)
+  margin[rows, :, y] = -np.sum(margin, axis=2)
+  margin *= 1.0 / num_train
+  dW = np.dot(X.T, scores).reshape(num_features, num_models, num_classes)
+  dW += reg[np.newaxis, :, np.newaxis] * W_dmc
+  return loss, dW.transpose(1, 0, 2)
+
+
+def svm_loss_smoothed(W, X, y, reg, smoothing=1.0):
+  """
+  Structured SVM loss with a smoothed (quadratically rounded) hinge,
+  vectorized implementation.
+
+  Every margin m = s_j - s_y + 1 contributes
+    0                          if m <= 0
+    m**2 / (2 * smoothing)     if 0 < m < smoothing
+    m - smoothing / 2          if m >= smoothing
+  which is continuously differentiable, so full-batch quasi-Newton methods
+  (LinearClassifier.train_lbfgs) converge on it. smoothing=0 is the usual
+  hinge of svm_loss_vectorized.
+
+  Inputs and outputs are the same as svm_loss_naive, plus:
+  - smoothing: (float) width of the quadratic part of the hinge.
+  """
+  if W.shape[0] != X.shape[1]:
+    raise ValueError("Shape of the weight array (W) doesn't match shape of training data (X)!")
+  if X.shape[0] != y.shape[0]:
+    raise ValueError("X and y have incompatible shapes.\n" +
+                             "X has %s samples, but y has %s." %
+                             (X.shape[0], y.shape[0]))
+  if smoothing < 0:
+    raise ValueError("smoothing must be >= 0, got %s" % smoothing)
+  if smoothing == 0:
+    return svm_loss_vectorized(W, X, y, reg)
+
+  num_train = X.shape[0]
+  rows = np.arange(num_train)
+
+  margin = np.dot(X, W)
+  margin -= margin[rows, y][:, np.newaxis]
+  margin += 1
+  margin[rows, y] = 0
+  np.maximum(margin, 0, out=margin)
+
+  quadratic = margin < smoothing
+  loss = np.where(quadratic, margin**2 / (2 * smoothing), margin - 0.5 * smoothing)
+  loss = np.sum(loss) / num_train + 0.5 * reg * np.sum(W * W)
+
+  # d loss / d margin = min(margin / smoothing, 1)
+  coef = np.minimum(margin / smoothing, 1)
+  coef[rows, y] = -np.sum(coef, axis=1)
+  dW = np.dot(X.T, coef) / num_train
+  dW += reg * W
+  return loss, dW
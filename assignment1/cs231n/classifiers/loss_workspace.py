@@ -0,0 +1,43 @@
+import numpy as np
+
+
+class LossWorkspace(object):
+  """
+  A set of named, preallocated arrays reused by the fused loss kernels
+  (svm_loss_fused, softmax_loss_fused) across calls.
+
+  A buffer is only (re)allocated when it is first requested or when the
+  requested shape or dtype changes, so repeated calls with the same minibatch
+  size allocate nothing of size N x C or D x C.
+  """
+
+  def __init__(self):
+    self.buffers = {}
+    self.num_allocations = 0
+
+  def get(self, name, shape, dtype):
+    """
+    Return the buffer called name with the given shape and dtype. Its
+    contents are whatever the previous user left in it.
+    """
+    shape = tuple(shape)
+    dtype = np.dtype(dtype)
+    buf = self.buffers.get(name)
+    if buf is None or buf.shape != shape or buf.dtype != dtype:
+      buf = np.empty(shape, dtype=dtype)
+      self.buffers[name] = buf
+      self.num_allocations += 1
+    return buf
+
+  def arange(self, n):
+    """ A cached np.arange(n) (used for fancy indexing the correct classes). """
+    rows = self.buffers.get('arange')
+    if rows is None or rows.shape[0] != n:
+      rows = np.arange(n)
+      self.buffers['arange'] = rows
+      self.num_allocations += 1
+    return rows
+
+  def nbytes(self):
+    """ Total size in bytes of the buffers held by this workspace. """
+    return sum(buf.nbytes for buf in self.buffers.values())
@@ -1,5 +1,6 @@
 import numpy as np
 from random import shuffle
+from cs231n.classifiers.loss_workspace import LossWorkspace
 
 def softmax_loss_naive(W, X, y, reg):
   """
@@ -119,3 +120,116 @@ def softmax_loss_vectorized(W, X, y, reg):
   #############################################################################
 
   return loss, dW
+
+
+def softmax_loss_fused(W, X, y, reg, workspace=None):
+  """
+  Softmax loss function, fused and allocation-free version.
+
+  Same inputs and outputs as softmax_loss_vectorized. The scores are turned
+  into probabilities and then into the gradient coefficients (p - index) in
+  place in a single (N, C) buffer, and every array is taken from workspace
+  (a LossWorkspace) so that calls with the same shapes allocate no new N x C
+  or D x C arrays. The computation runs in the common dtype of W and X, so
+  float32 inputs stay float32.
+
+  Inputs:
+  - W, X, y, reg: Same as softmax_loss_naive.
+  - workspace: Optional LossWorkspace; a new one is used if None.
+
+  Returns a tuple of:
+  - loss as single float
+  - gradient with respect to weights W. NOTE: this is a workspace buffer that
+    is overwritten by the next call using the same workspace.
+  """
+  if W.ndim != 2:
+    raise ValueError("Require W to have X.ndim = 2;")
+  if X.ndim != 2:
+    raise ValueError("Require X to have X.ndim = 2;")
+  if y.ndim != 1:
+    raise ValueError("True class labels (y) should be input as a vector.")
+  if workspace is None:
+    workspace = LossWorkspace()
+
+  num_train = X.shape[0]
+  num_features, num_classes = W.shape
+  dtype = np.result_type(W.dtype, X.dtype, np.float32)
+  X = X.astype(dtype, copy=False)
+  W = W.astype(dtype, copy=False)
+
+  rows   = workspace.arange(num_train)
+  f      = workspace.get('scores', (num_train, num_classes), dtype)
+  rowvec = workspace.get('rows', (num_train, 1), dtype)
+  dW     = workspace.get('dW', (num_features, num_classes), dtype)
+  regW   = workspace.get('regW', (num_features, num_classes), dtype)
+
+  np.dot(X, W, out=f)
+  #remove the row-wise max for numerical stability
+  np.max(f, axis=1, keepdims=True, out=rowvec)
+  f -= rowvec
+  # loss_i = log(sum_j exp(f_ij)) - f_iy
+  loss = -np.sum(f[rows, y])
+  np.exp(f, out=f)
+  np.sum(f, axis=1, keepdims=True, out=rowvec)
+  f /= rowvec
+  np.log(rowvec, out=rowvec)
+  loss += np.sum(rowvec)
+  loss = loss / num_train + 0.5 * reg * np.vdot(W, W)
+
+  #Gradient: dW = 1 / num_train * X^T (p - index)
+  f[rows, y] -= 1
+  f *= 1.0 / num_train
+  np.dot(X.T, f, out=dW)
+  np.multiply(W, reg, out=regW)
+  dW += regW
+  return float(loss), dW
+
+
+def softmax_loss_batched(W, X, y, reg):
+  """
+  Softmax loss of M models at once, all on the same minibatch.
+
+  Same inputs and outputs as svm_loss_batched: the scores and gradients of
+  every model come from one matrix multiply each.
+
+  Inputs:
+  - W: A numpy array of shape (M, D, C) containing the weights of M models.
+  - X: A numpy array of shape (N, D) containing a minibatch of data.
+  - y: A numpy array of shape (N,) containing training labels.
+  - reg: Regularization strength, a float or an array of shape (M,).
+
+  Returns a tuple of:
+  - loss: A numpy array of shape (M,) holding the loss of every model.
+  - dW: Gradient with respect to W; an array of shape (M, D, C).
+  """
+  if W.ndim != 3:
+    raise ValueError("Require W to have W.ndim = 3;")
+  if X.ndim != 2:
+    raise ValueError("Require X to have X.ndim = 2;")
+  if y.ndim != 1:
+    raise ValueError("True class labels (y) should be input as a vector.")
+
+  num_models, num_features, num_classes = W.shape
+  num_train = X.shape[0]
+  rows = np.arange(num_train)
+  W_dmc = W.transpose(1, 0, 2)
+  reg = np.broadcast_to(np.asarray(reg, dtype=W.dtype), (num_models,))
+
+  scores = np.dot(X, W_dmc.reshape(num_features, -1))
+  f = scores.reshape(num_train, num_models, num_classes)
+  #remove the max of every (sample, model) row for numerical stability
+  f -= np.max(f, axis=2, keepdims=True)
+  loss = -np.sum(f[rows, :, y], axis=0)
+  np.exp(f, out=f)
+  sum_f = np.sum(f, axis=2, keepdims=True)
+  f /= sum_f
+  loss += np.sum(np.log(sum_f[:, :, 0]), axis=0)
+  loss /= num_train
+  loss += 0.5 * reg * np.einsum('dmc,dmc->m', W_dmc, W_dmc)
+
+  #Gradient: dW_m = 1 / num_train * X^T (p_m - index)
+  f[rows, :, y] -= 1
+  f *= 1.0 / num_train
+  dW = np.dot(X.T, scores).reshape(num_features, num_models, num_classes)
+  dW += reg[np.newaxis, :, np.newaxis] * W_dmc
+  return loss, dW.transpose(1, 0, 2)
@@ -28,6 +28,113 @@ def load_CIFAR10(ROOT):
   Xte, Yte = load_CIFAR_batch(os.path.join(ROOT, 'test_batch'))
   return Xtr, Ytr, Xte, Yte
 
+def read_CIFAR_batch_uint8(filename):
+  """ load single batch of cifar as (N, 32, 32, 3) uint8 images """
+  with open(filename, 'rb') as f:
+    datadict = pickle.load(f, encoding='latin1')
+    X = np.asarray(datadict['data'], dtype=np.uint8)
+    X = X.reshape(-1, 3, 32, 32).transpose(0,2,3,1)
+    Y = np.array(datadict['labels'], dtype=np.int64)
+    return X, Y
+
+CIFAR10_NPY_FILES = ('X_train.npy', 'y_train.npy', 'X_test.npy', 'y_test.npy')
+
+def convert_CIFAR10(ROOT, out_dir=None):
+  """
+  One-time conversion of the pickled CIFAR-10 batches to raw .npy files:
+  X_train.npy / X_test.npy hold the (N, 32, 32, 3) uint8 images and
+  y_train.npy / y_test.npy the int64 labels. Each file is written under a
+  temporary name and renamed, so an interrupted conversion leaves no partial
+  file behind.
+
+  Inputs:
+  - ROOT: Directory of the pickled batches (cifar-10-batches-py).
+  - out_dir: Directory of the .npy files; defaults to ROOT/npy.
+
+  Returns:
+  - out_dir
+  """
+  if out_dir is None:
+    out_dir = os.path.join(ROOT, 'npy')
+  if not os.path.isdir(out_dir):
+    os.makedirs(out_dir)
+  xs, ys = zip(*[read_CIFAR_batch_uint8(os.path.join(ROOT, 'data_batch_%d' % (b, )))
+                 for b in range(1,6)])
+  Xte, Yte = read_CIFAR_batch_uint8(os.path.join(ROOT, 'test_batch'))
+  arrays = (np.concatenate(xs), np.concatenate(ys), Xte, Yte)
+  for name, array in zip(CIFAR10_NPY_FILES, arrays):
+    path = os.path.join(out_dir, name)
+    with open(path + '.tmp', 'wb') as f:
+      np.save(f, np.ascontiguousarray(array))
+    os.replace(path + '.tmp', path)
+  return out_dir
+
+
+class LazyArray(object):
+  """
+  A read-only view of an array (typically a np.memmap of uint8 images) that
+  converts to dtype only what is indexed: X[idx] returns a new dtype array
+  holding X.data[idx], so slicing a minibatch out of a memory-mapped dataset
+  reads and converts just that minibatch. Anything that needs the whole
+  array (np.asarray(X), np.mean(X, axis=0), ...) converts all of it.
+  """
+
+  def __init__(self, data, dtype=np.float32):
+    self.data = data
+    self.dtype = np.dtype(dtype)
+
+  @property
+  def shape(self):
+    return self.data.shape
+
+  @property
+  def ndim(self):
+    return self.data.ndim
+
+  @property
+  def size(self):
+    return self.data.size
+
+  def __len__(self):
+    return self.data.shape[0]
+
+  def __getitem__(self, idx):
+    return np.asarray(self.data[idx], dtype=self.dtype)
+
+  def __array__(self, dtype=None, copy=None):
+    return np.asarray(self.data, dtype=self.dtype if dtype is None else dtype)
+
+
+def load_CIFAR10_mmap(ROOT, dtype=np.float32, npy_dir=None):
+  """
+  Load CIFAR-10 from the raw .npy files written by convert_CIFAR10 (which
+  is run first if they do not exist yet). The images are memory-mapped
+  rather than read, so loading is near instant and only the pages that are
+  actually used become resident.
+
+  Inputs:
+  - ROOT: Directory of the pickled batches (cifar-10-batches-py).
+  - dtype: dtype the images are converted to when indexed; None returns the
+    uint8 memmaps themselves.
+  - npy_dir: Directory of the .npy files; defaults to ROOT/npy.
+
+  Returns: A tuple of
+  - X_train: (50000, 32, 32, 3) LazyArray (or uint8 np.memmap) of images
+  - y_train: (50000,) array of labels
+  - X_test: (10000, 32, 32, 3) LazyArray (or uint8 np.memmap) of images
+  - y_test: (10000,) array of labels
+  """
+  if npy_dir is None:
+    npy_dir = os.path.join(ROOT, 'npy')
+  if not all(os.path.exists(os.path.join(npy_dir, name)) for name in CIFAR10_NPY_FILES):
+    convert_CIFAR10(ROOT, npy_dir)
+  Xtr, Ytr, Xte, Yte = [np.load(os.path.join(npy_dir, name), mmap_mode='r')
+                        for name in CIFAR10_NPY_FILES]
+  Ytr, Yte = np.array(Ytr), np.array(Yte)
+  if dtype is not None:
+    Xtr, Xte = LazyArray(Xtr, dtype), LazyArray(Xte, dtype)
+  return Xtr, Ytr, Xte, Yte
+
 def load_tiny_imagenet(path, dtype=np.float32):
   """
   Load TinyImageNet. Each of TinyImageNet-100-A, TinyImageNet-100-B, and
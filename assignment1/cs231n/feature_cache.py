@@ -0,0 +1,307 @@
+import functools
+import hashlib
+import json
+import os
+import types
+
+import numpy as np
+
+from cs231n.features import extract_features
+
+
+def feature_key(feature_fns):
+  """
+  A string identifying a list of feature functions and their parameters.
+
+  Plain functions are identified by their module, name and bytecode (nested
+  functions and comprehensions included), along with their default arguments,
+  the contents of their closure (arrays by their bytes) and the values
+  of the numbers / strings they read from globals (so that the notebook's
+  lambda img: color_histogram_hsv(img, nbin=num_color_bins) changes key when
+  num_color_bins changes). functools.partial objects are identified by the
+  wrapped function and their arguments.
+  """
+  h = hashlib.sha1()
+  for feature_fn in feature_fns:
+    h.update(_fn_identity(feature_fn).encode('utf-8'))
+    h.update(b'\0')
+  return h.hexdigest()
+
+
+def _fn_identity(fn):
+  if isinstance(fn, functools.partial):
+    return 'partial(%s, %s, %s)' % (_fn_identity(fn.func), _value_identity(fn.args),
+                                    _value_identity(fn.keywords or {}))
+  code = getattr(fn, '__code__', None)
+  if code is None:
+    return '%s.%s %r' % (type(fn).__module__, type(fn).__qualname__, fn)
+  simple = (bool, int, float, str, bytes, tuple, type(None))
+  global_values = dict((name, fn.__globals__[name]) for name in code.co_names
+                       if name in fn.__globals__ and
+                       isinstance(fn.__globals__[name], simple))
+  closure = tuple(cell.cell_contents for cell in (fn.__closure__ or ()))
+  return '%s.%s %s %s %s %s' % (
+      fn.__module__, fn.__qualname__, _code_identity(code),
+      _value_identity(fn.__defaults__), _value_identity(closure),
+      _value_identity(global_values))
+
+
+def _code_identity(code):
+  """
+  Digest of the bytecode, constants and names of a code object. The repr of
+  the code objects of nested functions, lambdas and comprehensions among the
+  constants holds their address, so they are digested the same way instead.
+  """
+  h = hashlib.sha1(code.co_code)
+  h.update(_value_identity(code.co_consts).encode('utf-8'))
+  h.update(_value_identity(code.co_names).encode('utf-8'))
+  return h.hexdigest()
+
+
+def _value_identity(value):
+  """
+  A string identifying a default argument, closure or global value that is
+  the same in every process: arrays are identified by their contents (their
+  repr elides all but a few elements), functions by their code and sets in
+  sorted order.
+  """
+  if isinstance(value, types.CodeType):
+    return 'code(%s)' % _code_identity(value)
+  if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+    h = hashlib.sha1(np.ascontiguousarray(value).tobytes())
+    return 'ndarray(%s, %s, %s)' % (value.dtype.str, value.shape, h.hexdigest())
+  if isinstance(value, functools.partial):
+    return _fn_identity(value)
+  if isinstance(value, types.FunctionType):
+    # not recursing into its closure, which may hold the function itself
+    return 'function(%s.%s %s)' % (value.__module__, value.__qualname__,
+                                   _code_identity(value.__code__))
+  if isinstance(value, (tuple, list)):
+    return '%s(%s)' % (type(value).__name__,
+                       ', '.join(_value_identity(item) for item in value))
+  if isinstance(value, (set, frozenset)):
+    return '%s(%s)' % (type(value).__name__,
+                       ', '.join(sorted(_value_identity(item) for item in value)))
+  if isinstance(value, dict):
+    return 'dict(%s)' % ', '.join(sorted('%s: %s' % (_value_identity(k), _value_identity(v))
+                                         for k, v in value.items()))
+  return repr(value)
+
+
+def image_digests(imgs):
+  """
+  SHA-1 digest of every image (its bytes, shape and dtype).
+
+  Inputs:
+  - imgs: N x H x W x C array of pixel data for N images.
+
+  Returns:
+    Array of shape (N,) and dtype 'S20'.
+  """
+  header = ('%s %s' % (imgs.dtype.str, imgs.shape[1:])).encode('utf-8')
+  digests = np.empty(imgs.shape[0], dtype='S20')
+  for i in range(imgs.shape[0]):
+    h = hashlib.sha1(header)
+    h.update(np.ascontiguousarray(imgs[i]))
+    digests[i] = h.digest()
+  return digests
+
+
+class FeatureCache(object):
+  """
+  A content-addressed on-disk cache of the feature matrices computed by
+  extract_features.
+
+  Features are stored in blocks: a .npy file of features and a .keys.npy
+  file holding the digest of the image of every row, named after the hash
+  of those digests, in a directory named after the feature_key of the
+  feature functions. A request looks every image up by its digest, so only
+  the images that are new (or changed) are passed to extract_features; when
+  the request is exactly a stored block the block is returned memory-mapped
+  without reading it. Blocks are evicted least recently used first once
+  their total size exceeds max_bytes.
+
+  Example:
+    cache = FeatureCache('cs231n/datasets/feature_cache')
+    X_train_feats = cache.extract(X_train, feature_fns, verbose=True)
+  """
+
+  def __init__(self, cache_dir, max_bytes=2**30):
+    """
+    Inputs:
+    - cache_dir: Directory holding the blocks (created if needed).
+    - max_bytes: Size cap of the blocks on disk.
+    """
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.num_extracted = 0
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    self._index_path = os.path.join(cache_dir, 'index.json')
+    self._load_index()
+
+  def extract(self, imgs, feature_fns, verbose=False):
+    """
+    Same result as extract_features(imgs, feature_fns), served from the cache
+    where possible.
+
+    Inputs:
+    - imgs: N x H X W X C array of pixel data for N images.
+    - feature_fns: List of k feature functions (see extract_features).
+    - verbose: Boolean; if true, print progress of the extraction.
+
+    Returns:
+    An array of shape (N, F_1 + ... + F_k); a read-only np.memmap when the
+    request matches a stored block.
+    """
+    if imgs.shape[0] == 0:
+      return extract_features(imgs, feature_fns)
+    fn_key = feature_key(feature_fns)
+    digests = image_digests(imgs)
+    block = self._block_name(fn_key, digests)
+    if block in self.blocks:
+      self._touch([block])
+      self._evict(keep=[block])
+      self._save_index()
+      return np.load(self._path(block), mmap_mode='r')
+
+    # (block, row) holding each image, if any
+    location = {}
+    block_keys = {}
+    for name in self.blocks:
+      if name.startswith(fn_key + '/'):
+        keys = block_keys[name] = np.load(self._path(name, '.keys.npy'))
+        for row, digest in enumerate(keys):
+          location.setdefault(digest, (name, row))
+
+    missing = {}
+    for i, digest in enumerate(digests):
+      if digest not in location:
+        missing.setdefault(digest, i)
+    if verbose:
+      print('Feature cache: %d / %d images to extract' % (len(missing), len(digests)))
+
+    missing_rows = np.array(sorted(missing.values()), dtype=np.intp)
+    if missing_rows.size > 0:
+      extracted = extract_features(imgs[missing_rows], feature_fns, verbose=verbose)
+      self.num_extracted += missing_rows.size
+    else:
+      extracted = None
+
+    used = set(location[digest][0] for digest in digests if digest in location)
+    if extracted is None:
+      stored = np.load(self._path(next(iter(used))), mmap_mode='r')
+      feats = np.empty((len(digests), stored.shape[1]), dtype=stored.dtype)
+      del stored
+    else:
+      feats = np.empty((len(digests), extracted.shape[1]), dtype=extracted.dtype)
+      for j, i in enumerate(missing_rows):
+        location[digests[i]] = (None, j)
+
+    # gather every row from the block that holds it (None: extracted now)
+    sources = {None: extracted}
+    for name in used:
+      sources[name] = np.load(self._path(name), mmap_mode='r')
+    by_source = {}
+    for i, digest in enumerate(digests):
+      name, row = location[digest]
+      by_source.setdefault(name, ([], []))
+      by_source[name][0].append(i)
+      by_source[name][1].append(row)
+    for name, (dst, src) in by_source.items():
+      feats[dst] = sources[name][src]
+    del sources
+
+    if extracted is not None:
+      # the whole request becomes one block, so that repeating it is a hit.
+      # The rows are gathered, so only the new block is pinned: the blocks it
+      # was partly built from age out through the LRU order, and those whose
+      # rows are all in the new block are dropped now.
+      self._write_block(block, feats, digests)
+      request = set(digests)
+      for name, keys in block_keys.items():
+        if request.issuperset(keys):
+          self._remove(name)
+      used = set([block])
+    self._touch(used)
+    self._evict(keep=used)
+    self._save_index()
+    return feats
+
+  def nbytes(self):
+    """ Total size in bytes of the blocks in the cache. """
+    return sum(entry['nbytes'] for entry in self.blocks.values())
+
+  def clear(self):
+    """ Remove every block from the cache. """
+    for name in list(self.blocks):
+      self._remove(name)
+    self._save_index()
+
+  def _block_name(self, fn_key, digests):
+    return '%s/%s' % (fn_key, hashlib.sha1(digests.tobytes()).hexdigest())
+
+  def _path(self, name, suffix='.npy'):
+    return os.path.join(self.cache_dir, *name.split('/')) + suffix
+
+  def _write_block(self, name, feats, digests):
+    directory = os.path.dirname(self._path(name))
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    # the keys are written last: a block without keys is not complete
+    np.save(self._path(name), feats)
+    np.save(self._path(name, '.keys.npy'), digests)
+    self.blocks[name] = {'nbytes': os.path.getsize(self._path(name)) +
+                                   os.path.getsize(self._path(name, '.keys.npy')),
+                         'last_used': 0}
+
+  def _remove(self, name):
+    for suffix in ('.keys.npy', '.npy'):
+      if os.path.exists(self._path(name, suffix)):
+        os.remove(self._path(name, suffix))
+    del self.blocks[name]
+
+  def _touch(self, names):
+    self.clock += 1
+    for name in names:
+      self.blocks[name]['last_used'] = self.clock
+
+  def _evict(self, keep=()):
+    total = self.nbytes()
+    for name in sorted(self.blocks, key=lambda name: self.blocks[name]['last_used']):
+      if total <= self.max_bytes:
+        break
+      if name not in keep:
+        total -= self.blocks[name]['nbytes']
+        self._remove(name)
+
+  def _load_index(self):
+    index = {'clock': 0, 'blocks': {}}
+    if os.path.exists(self._index_path):
+      with open(self._index_path) as f:
+        index = json.load(f)
+    self.clock = index['clock']
+    # the blocks are whatever is complete on disk; the index only remembers
+    # how recently they were used
+    self.blocks = {}
+    for fn_key in os.listdir(self.cache_dir):
+      directory = os.path.join(self.cache_dir, fn_key)
+      if not os.path.isdir(directory):
+        continue
+      for filename in os.listdir(directory):
+        if filename.endswith('.keys.npy'):
+          name = '%s/%s' % (fn_key, filename[:-len('.keys.npy')])
+          if os.path.exists(self._path(name)):
+            self.blocks[name] = {
+                'nbytes': os.path.getsize(self._path(name)) +
+                          os.path.getsize(self._path(name, '.keys.npy')),
+                'last_used': index['blocks'].get(name, 0)}
+
+  def _save_index(self):
+    index = {'clock': self.clock,
+             'blocks': dict((name, entry['last_used'])
+                            for name, entry in self.blocks.items())}
+    tmp_path = self._index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+      json.dump(index, f)
+    os.replace(tmp_path, self._index_path)
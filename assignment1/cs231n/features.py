@@ -1,3 +1,9 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import warnings
+
 import matplotlib
 import numpy as np
 from scipy.ndimage import uniform_filter
@@ -53,6 +59,131 @@ def extract_features(imgs, feature_fns, verbose=False):
   return imgs_features
 
 
+# Images and feature functions shared with the extract_features_parallel
+# workers. They are set before the pool is forked, so the images are read
+# copy-on-write and the feature functions (often lambdas) never need to be
+# pickled.
+_extract_shared = {}
+
+
+def _extract_chunk(chunk):
+  """ Compute the features of one chunk and write them to the output file. """
+  imgs, feature_fns = _extract_shared['imgs'], _extract_shared['feature_fns']
+  chunk_size = _extract_shared['chunk_size']
+  out = np.memmap(_extract_shared['out_path'], dtype=np.float32, mode='r+',
+                  shape=_extract_shared['shape'])
+  i0 = chunk * chunk_size
+  i1 = min(i0 + chunk_size, imgs.shape[0])
+  out[i0:i1] = extract_features(imgs[i0:i1], feature_fns)
+  out.flush()
+  del out
+  return chunk, i1 - i0
+
+
+def extract_features_parallel(imgs, feature_fns, out_path, chunk_size=1000,
+                              num_workers=None, verbose=False):
+  """
+  Same features as extract_features, computed by a pool of worker processes
+  and written straight into a float32 np.memmap at out_path.
+
+  The images are split into chunks of chunk_size images; every finished
+  chunk is recorded in the sidecar file out_path + '.done'. Calling this
+  again with the same out_path (e.g. after the run was interrupted) only
+  computes the chunks that are not recorded yet. The sidecar also records a
+  digest of the feature functions (see feature_cache.feature_key) and of the
+  images (their shape, dtype and a sample of rows); if they differ, nothing
+  is resumed and the extraction starts over with a warning.
+
+  Inputs:
+  - imgs: N x H X W X C array of pixel data for N images.
+  - feature_fns: List of k feature functions (see extract_features).
+  - out_path: Path of the output file (raw float32, N x F, C order).
+  - chunk_size: Number of images per task.
+  - num_workers: Number of worker processes; defaults to the number of CPUs.
+    With 1, or where fork is unavailable, the chunks are computed in this
+    process.
+  - verbose: Boolean; if true, print progress as chunks finish.
+
+  Returns:
+  A read-only np.memmap of shape (N, F_1 + ... + F_k) and dtype float32.
+  """
+  num_images = imgs.shape[0]
+  if num_images == 0:
+    return np.array([])
+  feature_dim = sum(feature_fn(imgs[0].squeeze()).size
+                    for feature_fn in feature_fns)
+  shape = (num_images, feature_dim)
+  num_chunks = (num_images + chunk_size - 1) // chunk_size
+
+  # The sidecar starts with the layout of the output and the digest of the
+  # inputs followed by one finished chunk index per line; a different header
+  # starts the extraction over.
+  done_path = out_path + '.done'
+  header = json.dumps({'shape': list(shape), 'chunk_size': chunk_size,
+                       'inputs': _inputs_digest(imgs, feature_fns)})
+  done = set()
+  if os.path.exists(done_path) and os.path.exists(out_path):
+    with open(done_path) as f:
+      lines = f.read().splitlines()
+    if lines and lines[0] == header:
+      done = set(int(line) for line in lines[1:] if line.strip())
+    elif len(lines) > 1:
+      warnings.warn('%s was extracted from other images, feature functions or '
+                    'chunk size; extracting it again' % out_path)
+  if not done:
+    np.memmap(out_path, dtype=np.float32, mode='w+', shape=shape).flush()
+    with open(done_path, 'w') as f:
+      f.write(header + '\n')
+  todo = [chunk for chunk in range(num_chunks) if chunk not in done]
+
+  if num_workers is None:
+    num_workers = multiprocessing.cpu_count()
+  num_workers = min(num_workers, len(todo))
+  _extract_shared.update(imgs=imgs, feature_fns=feature_fns, out_path=out_path,
+                         shape=shape, chunk_size=chunk_size)
+  num_done = num_images - sum(min(chunk_size, num_images - chunk * chunk_size)
+                              for chunk in todo)
+  try:
+    if num_workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+      pool = multiprocessing.get_context('fork').Pool(num_workers)
+      results = pool.imap_unordered(_extract_chunk, todo)
+    else:
+      pool = None
+      results = (_extract_chunk(chunk) for chunk in todo)
+    try:
+      with open(done_path, 'a') as f:
+        for chunk, count in results:
+          # the worker has flushed the chunk before it is recorded as done
+          f.write('%d\n' % chunk)
+          f.flush()
+          num_done += count
+          if verbose:
+            print(('Done extracting features for %d / %d images' % (num_done, num_images)))
+    finally:
+      if pool is not None:
+        pool.close()
+        pool.join()
+  finally:
+    _extract_shared.clear()
+
+  return np.memmap(out_path, dtype=np.float32, mode='r', shape=shape)
+
+
+def _inputs_digest(imgs, feature_fns, num_samples=64):
+  """
+  Digest of the feature functions and of the shape, dtype and num_samples
+  evenly spaced rows of imgs, identifying the inputs of a resumable
+  extraction without hashing every image.
+  """
+  # imported here since feature_cache imports this module
+  from cs231n.feature_cache import feature_key, image_digests
+  sample = np.unique(np.linspace(0, imgs.shape[0] - 1, num_samples).astype(int))
+  h = hashlib.sha1(feature_key(feature_fns).encode('utf-8'))
+  h.update(('%s %s' % (imgs.dtype.str, imgs.shape)).encode('utf-8'))
+  h.update(image_digests(imgs[sample]).tobytes())
+  return h.hexdigest()
+
+
 def rgb2gray(rgb):
   """Convert RGB image to grayscale
 
@@ -88,7 +219,7 @@ def hog_feature(im):
   if im.ndim == 3:
     image = rgb2gray(im)
   else:
-    image = np.at_least_2d(im)
+    image = np.atleast_2d(im)
 
   sx, sy = image.shape # image size
   orientations = 9 # number of gradient bins
@@ -115,11 +246,91 @@ def hog_feature(im):
     # select magnitudes for those orientations
     cond2 = temp_ori > 0
     temp_mag = np.where(cond2, grad_mag, 0)
-    orientation_histogram[:,:,i] = uniform_filter(temp_mag, size=(cx, cy))[cx/2::cx, cy/2::cy].T
+    orientation_histogram[:,:,i] = uniform_filter(temp_mag, size=(cx, cy))[cx//2::cx, cy//2::cy].T
   
   return orientation_histogram.ravel()
 
 
+def hog_feature_batch(imgs, batch_size=64):
+  """Compute the Histogram of Gradient (HOG) feature of a stack of images
+
+    Same features as calling hog_feature on every image, but the gradients
+    and the orientation binning are computed for batch_size images at a
+    time with whole-array operations, and the 8 x 8 cell averages of the 9
+    orientations are pooled with a single np.bincount instead of one
+    uniform_filter per orientation.
+
+    Parameters:
+      imgs : N x H x W x C array of RGB images (or N x H x W grayscale ones)
+      batch_size : number of images processed at once; the temporaries are a
+        few arrays of shape (batch_size, H, W), small enough to stay in cache
+
+    Returns:
+      feat: N x F array; feat[i] == hog_feature(imgs[i]) up to rounding
+  """
+  num_images = imgs.shape[0]
+  sx, sy = imgs.shape[1:3] # image size
+  orientations = 9 # number of gradient bins
+  cx, cy = (8, 8) # pixels per cell
+  n_cellsx = int(np.floor(sx / cx))  # number of cells in x
+  n_cellsy = int(np.floor(sy / cy))  # number of cells in y
+  width = 180 / orientations
+  # same (floating point) bin boundaries as the thresholds of hog_feature,
+  # extended to the whole range (-90, 270] of the orientations
+  edges = width * np.arange(int(270 / width) + 2)
+
+  # offset of the (cell, orientation) bins of every pixel; the extra bin
+  # (orientations) collects the pixels that hog_feature ignores
+  rows = np.arange(n_cellsx * cx) // cx
+  cols = np.arange(n_cellsy * cy) // cy
+  cell = (rows[:, np.newaxis] * n_cellsy + cols[np.newaxis, :]) * (orientations + 1)
+  bins_per_image = n_cellsx * n_cellsy * (orientations + 1)
+  offsets = cell + (bins_per_image * np.arange(batch_size))[:, np.newaxis, np.newaxis]
+
+  feat = np.zeros((num_images, n_cellsx * n_cellsy * orientations))
+  for i0 in range(0, num_images, batch_size):
+    batch = imgs[i0:i0 + batch_size]
+    n = batch.shape[0]
+    if batch.ndim == 4:
+      # NOTE: rgb2gray (rather than an equivalent matrix product) rounds
+      # exactly like hog_feature; exact zero gradients decide the bins.
+      image = rgb2gray(batch)
+    else:
+      image = batch.astype(np.float64)
+
+    gx = np.zeros(image.shape)
+    gy = np.zeros(image.shape)
+    np.subtract(image[:, :, 1:], image[:, :, :-1], out=gx[:, :, :-1]) # gradient on x-direction
+    np.subtract(image[:, 1:, :], image[:, :-1, :], out=gy[:, :-1, :]) # gradient on y-direction
+    gx = gx[:, :n_cellsx * cx, :n_cellsy * cy]
+    gy = gy[:, :n_cellsx * cx, :n_cellsy * cy]
+    grad_mag = np.sqrt(gx * gx + gy * gy) # gradient magnitude
+    gx += 1e-15
+    grad_ori = np.arctan2(gy, gx) # gradient orientation
+    grad_ori *= 180 / np.pi
+    grad_ori += 90
+
+    # ori_bin is the b with edges[b] <= grad_ori < edges[b + 1]: truncate,
+    # then fix the rounding of the division at the boundaries (and the
+    # truncation towards zero of negative orientations)
+    ori_bin = (grad_ori * (1 / width)).astype(np.intp)
+    ori_bin -= grad_ori < edges[ori_bin]
+    # negative bins wrap around to huge unsigned values, so a single minimum
+    # sends both b < 0 and b >= orientations to the extra bin; hog_feature
+    # also drops grad_ori == 0
+    ori_bin = np.minimum(ori_bin.view(np.uintp), orientations).view(np.intp)
+    ori_bin += orientations * (grad_ori == 0)
+    ori_bin += offsets[:n]
+
+    hist = np.bincount(ori_bin.ravel(), weights=grad_mag.ravel(),
+                       minlength=n * bins_per_image)
+    hist = hist.reshape(n, n_cellsx, n_cellsy, orientations + 1)[..., :orientations]
+    # cell averages, with the cell axes transposed like the .T of hog_feature
+    feat[i0:i0 + n] = (hist / (cx * cy)).transpose(0, 2, 1, 3).reshape(n, -1)
+
+  return feat
+
+
 def color_histogram_hsv(im, nbin=10, xmin=0, xmax=255, normalized=True):
   """
   Compute color histogram for an image using hue.
@@ -145,4 +356,88 @@ def color_histogram_hsv(im, nbin=10, xmin=0, xmax=255, normalized=True):
   return imhist
 
 
+def color_histogram_hsv_batch(imgs, nbin=10, xmin=0, xmax=255, normalized=True,
+                              batch_size=64):
+  """
+  Compute the hue color histograms of a stack of images.
+
+  Same histograms as calling color_histogram_hsv on every image: the hue is
+  computed with the same elementwise operations as matplotlib's rgb_to_hsv,
+  and the pixels are assigned to bins with the rules of np.histogram (bins
+  are half open except the last one, values outside [xmin, xmax] are not
+  counted), but for batch_size images at a time, and the histograms of a
+  batch are counted with a single offset np.bincount.
+
+  Inputs:
+  - imgs: N x H x W x C array of pixel data for N RGB images.
+  - nbin: Number of histogram bins. (default: 10)
+  - xmin: Minimum pixel value (default: 0)
+  - xmax: Maximum pixel value (default: 255)
+  - normalized: Whether to normalize the histograms (default: True)
+  - batch_size: Number of images processed at once.
+
+  Returns:
+    N x nbin array; row i is color_histogram_hsv(imgs[i]) (with the same
+    nbin, xmin, xmax and normalized).
+  """
+  num_images = imgs.shape[0]
+  bins = np.linspace(xmin, xmax, nbin+1)
+  db = np.diff(bins)
+  # the extra bin (nbin) of every image collects the values np.histogram drops
+  offsets = (nbin + 1) * np.arange(batch_size)[:, np.newaxis]
+
+  imhist = np.zeros((num_images, nbin))
+  for i0 in range(0, num_images, batch_size):
+    hue = _hue(imgs[i0:i0 + batch_size] / xmax) * xmax
+    n = hue.shape[0]
+    hue = hue.reshape(n, -1)
+
+    # b with bins[b] <= hue < bins[b + 1], the last edge belongs to the last
+    # bin; values below xmin give -1, which the unsigned minimum sends to the
+    # extra bin together with the values above xmax
+    b = np.searchsorted(bins, hue, side='right') - 1
+    b[hue == bins[-1]] = nbin - 1
+    b = np.minimum(b.view(np.uintp), nbin).view(np.intp)
+    b += offsets[:n]
+    counts = np.bincount(b.ravel(), minlength=n * (nbin + 1))
+    counts = counts.reshape(n, nbin + 1)[:, :nbin]
+
+    if normalized:
+      # density=True then * np.diff(bin_edges), as in color_histogram_hsv
+      imhist[i0:i0 + n] = counts / db / counts.sum(axis=1, keepdims=True) * db
+    else:
+      imhist[i0:i0 + n] = counts * db
+
+  return imhist
+
+
+def _hue(arr):
+  """
+  The hue channel of matplotlib.colors.rgb_to_hsv(arr) for a stack of
+  images, computed with the same operations (so with the same rounding).
+  """
+  arr = np.asarray(arr, dtype=np.promote_types(arr.dtype, np.float32))
+  r, g, b = arr[..., 0], arr[..., 1], arr[..., 2]
+  # max / min over the channels as elementwise ufuncs (exactly the values of
+  # arr.max(-1) and np.ptp, much faster than a reduction over a length-3 axis)
+  arr_max = np.maximum(np.maximum(r, g), b)
+  arr_min = np.minimum(np.minimum(r, g), b)
+  if np.any(arr_max > 1) or np.any(arr_min < 0):
+    raise ValueError("Pixel values must be in the range [0, xmax].")
+  delta = arr_max - arr_min
+
+  # every candidate hue is computed for all pixels (the divisions by a zero
+  # delta are discarded below), then selected: later assignments of
+  # rgb_to_hsv win, i.e. blue over green over red, and 0 where delta == 0
+  with np.errstate(divide='ignore', invalid='ignore'):
+    h_r = (g - b) / delta
+    h_g = 2. + (b - r) / delta
+    h_b = 4. + (r - g) / delta
+  out = np.where(b == arr_max, h_b, np.where(g == arr_max, h_g, h_r))
+  out[delta == 0] = 0
+  out /= 6.0
+  out %= 1.0
+  return out
+
+
 pass
@@ -1,13 +1,32 @@
+import multiprocessing
+
 import numpy as np
+import scipy.stats
 from random import randrange
 
-def eval_numerical_gradient(f, x, verbose=True, h=0.00001):
+# Forking a pool of workers costs tens of milliseconds, more than the serial
+# check of a few hundred coordinates of a typical layer: a gradient check only
+# goes parallel with at least this many coordinates per worker.
+MIN_COORDINATES_PER_WORKER = 500
+
+def eval_numerical_gradient(f, x, verbose=True, h=0.00001, num_workers=1):
   """ 
   a naive implementation of numerical gradient of f at x 
   - f should be a function that takes a single argument
   - x is the point (numpy array) to evaluate the gradient at
+  - num_workers: with more than one, the coordinates are split over up to that
+    many forked processes (None: one per CPU), see MIN_COORDINATES_PER_WORKER
   """ 
 
+  num_workers = _grad_workers(num_workers, x.size)
+  if num_workers > 1:
+    grad = _eval_numerical_gradient_parallel(f, x, None, h, num_workers)
+    if grad is not None:
+      if verbose:
+        for ix in np.ndindex(*x.shape):
+          print((ix, grad[ix]))
+      return grad
+
   fx = f(x) # evaluate function value at original point
   grad = np.zeros_like(x)
   # iterate over all indexes in x
@@ -32,11 +51,20 @@ def eval_numerical_gradient(f, x, verbose=True, h=0.00001):
   return grad
 
 
-def eval_numerical_gradient_array(f, x, df, h=1e-5):
+def eval_numerical_gradient_array(f, x, df, h=1e-5, num_workers=1):
   """
   Evaluate a numeric gradient for a function that accepts a numpy
   array and returns a numpy array.
+
+  With num_workers > 1 the coordinates are split over up to that many forked
+  processes (None: one per CPU), see MIN_COORDINATES_PER_WORKER.
   """
+  num_workers = _grad_workers(num_workers, x.size)
+  if num_workers > 1:
+    grad = _eval_numerical_gradient_parallel(f, x, df, h, num_workers)
+    if grad is not None:
+      return grad
+
   grad = np.zeros_like(x)
   it = np.nditer(x, flags=['multi_index'], op_flags=['readwrite'])
   while not it.finished:
@@ -54,6 +82,66 @@ def eval_numerical_gradient_array(f, x, df, h=1e-5):
   return grad
 
 
+# The function, the point and the upstream gradient of the running
+# eval_numerical_gradient* call, set before the worker processes are forked:
+# the workers perturb their own copy-on-write copy of x, which f (often a
+# closure over a model whose params *are* x) sees exactly like the original.
+_grad_shared = {}
+
+
+def _grad_workers(num_workers, size):
+  """
+  The number of processes to check size coordinates with, given the requested
+  num_workers: fewer if some would get less than MIN_COORDINATES_PER_WORKER.
+  """
+  if num_workers is None:
+    num_workers = multiprocessing.cpu_count()
+  return max(1, min(num_workers, size // MIN_COORDINATES_PER_WORKER))
+
+
+def _eval_coordinates(bounds):
+  """ Centered differences of the flat coordinates [start, stop) of x. """
+  f, x, df, h = (_grad_shared[k] for k in ('f', 'x', 'df', 'h'))
+  start, stop = bounds
+  grad = np.zeros(stop - start)
+  for i, ix in enumerate(zip(*np.unravel_index(np.arange(start, stop), x.shape))):
+    oldval = x[ix]
+    x[ix] = oldval + h
+    pos = np.copy(f(x))
+    x[ix] = oldval - h
+    neg = np.copy(f(x))
+    x[ix] = oldval
+    # the same formulas as the serial loops, so the results are identical
+    if df is None:
+      grad[i] = (pos - neg) / (2 * h)
+    else:
+      grad[i] = np.sum((pos - neg) * df) / (2 * h)
+  return grad
+
+
+def _eval_numerical_gradient_parallel(f, x, df, h, num_workers):
+  """
+  Numerical gradient of f (or of sum(f(x) * df)) at x, with the coordinates
+  sharded over num_workers forked processes. Returns None where fork is not
+  available.
+  """
+  if 'fork' not in multiprocessing.get_all_start_methods():
+    return None
+  num_shards = min(x.size, 4 * num_workers)
+  edges = np.linspace(0, x.size, num_shards + 1).astype(int)
+  _grad_shared.update(f=f, x=x, df=df, h=h)
+  try:
+    pool = multiprocessing.get_context('fork').Pool(num_workers)
+    try:
+      shards = pool.map(_eval_coordinates, list(zip(edges[:-1], edges[1:])))
+    finally:
+      pool.close()
+      pool.join()
+  finally:
+    _grad_shared.clear()
+  return np.concatenate(shards).reshape(x.shape).astype(x.dtype)
+
+
 def eval_numerical_gradient_blobs(f, inputs, output, h=1e-5):
   """
   Compute numeric gradients for a function that operates on input
@@ -122,3 +210,108 @@ def grad_check_sparse(f, x, analytic_grad, num_checks=10, h=1e-5):
     rel_error = abs(grad_numerical - grad_analytic) / (abs(grad_numerical) + abs(grad_analytic))
     print(('numerical: %f analytic: %f, relative error: %e' % (grad_numerical, grad_analytic, rel_error)))
 
+
+def _scalarize(f, df):
+  """ f itself for a scalar f, x -> sum(f(x) * df) for an array valued f. """
+  if df is None:
+    return f
+  return lambda x: np.sum(f(x) * df)
+
+
+def grad_check_directional(f, x, analytic_grad, df=None, num_directions=10,
+                           h=1e-5, seed=None):
+  """
+  Check a gradient along random directions (SPSA-style) instead of one
+  coordinate at a time: for a random direction d with entries +-1 the
+  centered difference (f(x + h d) - f(x - h d)) / (2 h) perturbs every
+  coordinate at once and must match the directional derivative
+  sum(analytic_grad * d). Each direction costs 2 evaluations of f whatever
+  the size of x, so a whole conv or LSTM layer is checked with a few dozen
+  forward passes; a wrong entry of analytic_grad shows up in every
+  direction, since d gives it weight +-1.
+
+  Inputs:
+  - f: Function of x returning a scalar, or an array if df is given.
+  - x: Array at which the gradient is checked; modified in place and
+    restored.
+  - analytic_grad: Array of the shape of x to check.
+  - df: Upstream gradient of an array valued f (as in
+    eval_numerical_gradient_array); the scalar checked is sum(f(x) * df).
+  - num_directions: Number of random directions.
+  - h: Step size.
+  - seed: Optional seed of the directions.
+
+  Returns a tuple of:
+  - numerical: Array of shape (num_directions,) of numerical directional
+    derivatives.
+  - analytic: Array of shape (num_directions,) of the matching analytic
+    directional derivatives.
+  """
+  g = _scalarize(f, df)
+  rng = np.random.RandomState(seed)
+  x0 = x.copy()
+  numerical = np.zeros(num_directions)
+  analytic = np.zeros(num_directions)
+  for i in range(num_directions):
+    d = rng.randint(2, size=x.shape) * 2.0 - 1.0
+    x[...] = x0 + h * d
+    fxph = g(x)
+    x[...] = x0 - h * d
+    fxmh = g(x)
+    x[...] = x0
+    numerical[i] = (fxph - fxmh) / (2 * h)
+    analytic[i] = np.sum(analytic_grad * d)
+  return numerical, analytic
+
+
+def grad_check_sparse_bound(f, x, analytic_grad, df=None, num_checks=100,
+                            h=1e-5, tol=1e-6, confidence=0.95, seed=None):
+  """
+  Check num_checks coordinates of a gradient drawn at random without
+  replacement, and bound the fraction of all coordinates that are wrong.
+
+  A coordinate fails if the relative error between its centered difference
+  and analytic_grad exceeds tol. If m of the k sampled coordinates fail, the
+  fraction of failing coordinates of x is below the one-sided Clopper-Pearson
+  bound returned, with probability confidence (with no failure the bound is
+  1 - (1 - confidence) ** (1 / k), about 3 / k at 95%). When k covers all of
+  x the exact fraction is returned.
+
+  Inputs:
+  - f, x, analytic_grad, df, h: As for grad_check_directional.
+  - num_checks: Number of coordinates to check.
+  - tol: Relative error above which a coordinate fails.
+  - confidence: Confidence level of the bound.
+  - seed: Optional seed of the sampled coordinates.
+
+  Returns a tuple of:
+  - max_rel_error: Largest relative error among the checked coordinates.
+  - fail_bound: Upper bound on the fraction of failing coordinates of x.
+  """
+  g = _scalarize(f, df)
+  rng = np.random.RandomState(seed)
+  num_checks = min(num_checks, x.size)
+  flat = rng.choice(x.size, num_checks, replace=False)
+
+  rel_errors = np.zeros(num_checks)
+  for i, ix in enumerate(zip(*np.unravel_index(flat, x.shape))):
+    oldval = x[ix]
+    x[ix] = oldval + h
+    fxph = g(x)
+    x[ix] = oldval - h
+    fxmh = g(x)
+    x[ix] = oldval
+
+    grad_numerical = (fxph - fxmh) / (2 * h)
+    grad_analytic = analytic_grad[ix]
+    rel_errors[i] = abs(grad_numerical - grad_analytic) / \
+        max(1e-8, abs(grad_numerical) + abs(grad_analytic))
+
+  failures = int(np.sum(rel_errors > tol))
+  if num_checks == x.size:
+    fail_bound = failures / float(x.size)
+  elif failures == num_checks:
+    fail_bound = 1.0
+  else:
+    fail_bound = scipy.stats.beta.ppf(confidence, failures + 1, num_checks - failures)
+  return np.max(rel_errors), fail_bound
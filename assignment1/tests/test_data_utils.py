@@ -0,0 +1,83 @@
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 1 root):
+python -m py.test tests/test_data_utils.py -vv -s -q
+python -m py.test tests/test_data_utils.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_data_utils.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+
+import os
+import pickle
+
+import pytest
+import numpy as np
+
+from cs231n.data_utils import (load_CIFAR_batch, convert_CIFAR10, load_CIFAR10_mmap,
+                               LazyArray, CIFAR10_NPY_FILES)
+
+
+@pytest.fixture(scope='module')
+def cifar_dir(tmpdir_factory):
+    #a CIFAR-10 directory with small batches of 20 (train) and 10 (test) images
+    root = str(tmpdir_factory.mktemp('cifar-10-batches-py'))
+    rng = np.random.RandomState(0)
+    names = ['data_batch_%d' % b for b in range(1, 6)] + ['test_batch']
+    for name in names:
+        count = 10 if name == 'test_batch' else 20
+        datadict = {'data': rng.randint(0, 256, size=(count, 3072)).astype(np.uint8),
+                    'labels': list(rng.randint(0, 10, size=count))}
+        with open(os.path.join(root, name), 'wb') as f:
+            pickle.dump(datadict, f)
+    return root
+
+def load_reference(root):
+    xs, ys = zip(*[load_CIFAR_batch_any(os.path.join(root, 'data_batch_%d' % b))
+                   for b in range(1, 6)])
+    Xte, Yte = load_CIFAR_batch_any(os.path.join(root, 'test_batch'))
+    return np.concatenate(xs), np.concatenate(ys), Xte, Yte
+
+def load_CIFAR_batch_any(filename):
+    #load_CIFAR_batch for batches of any size
+    with open(filename, 'rb') as f:
+        datadict = pickle.load(f, encoding='latin1')
+    X = datadict['data'].reshape(-1, 3, 32, 32).transpose(0, 2, 3, 1).astype("float")
+    return X, np.array(datadict['labels'])
+
+def test_assert():
+    assert 1
+
+def test_convert_CIFAR10(cifar_dir, tmp_path):
+    out_dir = convert_CIFAR10(cifar_dir, str(tmp_path))
+    assert sorted(os.listdir(out_dir)) == sorted(CIFAR10_NPY_FILES)
+    Xtr = np.load(os.path.join(out_dir, 'X_train.npy'))
+    assert Xtr.dtype == np.uint8
+    assert Xtr.shape == (100, 32, 32, 3)
+
+def test_load_CIFAR10_mmap(cifar_dir):
+    Xtr, Ytr, Xte, Yte = load_CIFAR10_mmap(cifar_dir)
+    Xtr_ref, Ytr_ref, Xte_ref, Yte_ref = load_reference(cifar_dir)
+    assert os.path.isdir(os.path.join(cifar_dir, 'npy'))
+
+    assert isinstance(Xtr, LazyArray)
+    assert Xtr.shape == Xtr_ref.shape and len(Xte) == 10
+    assert np.array_equal(np.asarray(Xtr), Xtr_ref)
+    assert np.array_equal(np.asarray(Xte), Xte_ref)
+    assert np.array_equal(Ytr, Ytr_ref) and np.array_equal(Yte, Yte_ref)
+
+    #indexing converts just the minibatch
+    idx = np.array([3, 0, 57])
+    batch = Xtr[idx]
+    assert batch.dtype == np.float32
+    assert np.array_equal(batch, Xtr_ref[idx])
+    assert np.array_equal(Xtr[5:9, :, :, 0], Xtr_ref[5:9, :, :, 0])
+    assert np.mean(Xtr, axis=0).shape == (32, 32, 3)
+
+    Xtr, _, _, _ = load_CIFAR10_mmap(cifar_dir, dtype=None)
+    assert isinstance(Xtr, np.memmap) and Xtr.dtype == np.uint8
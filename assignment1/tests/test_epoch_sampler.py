@@ -0,0 +1,72 @@
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 1 root):
+python -m py.test tests/test_epoch_sampler.py -vv -s -q
+python -m py.test tests/test_epoch_sampler.py -vv -s -q --cov
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+'''
+
+import pytest
+import numpy as np
+
+from cs231n.classifiers.epoch_sampler import EpochSampler
+
+
+def test_assert():
+    assert 1
+
+@pytest.fixture(scope='function')
+def random_data():
+    def make_sample(count=103, dim=7):
+        #row i is filled with the value i so that rows can be identified
+        X = np.repeat(np.arange(count, dtype=np.float64)[:, np.newaxis], dim, axis=1)
+        y = np.arange(count)
+        return X, y
+    return make_sample
+
+@pytest.mark.parametrize("prefetch", [False, True])
+@pytest.mark.parametrize("batch_size", [1, 10, 103, 500])
+def test_EpochSampler_without_replacement(random_data, prefetch, batch_size):
+    X, y = random_data()
+    sampler = EpochSampler(X, y, batch_size, prefetch=prefetch, seed=0)
+    batch_size = min(batch_size, X.shape[0])
+
+    for epoch in range(3):
+        seen = []
+        for it in range(sampler.batches_per_epoch):
+            X_batch, y_batch = sampler.next_batch()
+            assert sampler.epoch == epoch
+            assert X_batch.shape == (batch_size, X.shape[1])
+            assert X_batch.dtype == np.float32
+            assert np.all(X_batch == y_batch[:, np.newaxis])
+            seen.append(y_batch.copy())
+        seen = np.concatenate(seen)
+        #every sample at most once per epoch, only the remainder is left out
+        assert len(np.unique(seen)) == len(seen) == X.shape[0] // batch_size * batch_size
+    sampler.close()
+
+def test_EpochSampler_batches_are_views(random_data):
+    X, y = random_data()
+    sampler = EpochSampler(X, y, 10, seed=0)
+    X_first, y_first = sampler.next_batch()
+    X_second, y_second = sampler.next_batch()
+    #both are slices of the same shuffled buffer
+    assert X_first.base is not None and X_first.base is X_second.base
+    assert X_second.flags['C_CONTIGUOUS']
+
+def test_EpochSampler_prefetch_same_batches(random_data):
+    X, y = random_data()
+    plain    = EpochSampler(X, y, 10, prefetch=False, seed=1)
+    threaded = EpochSampler(X, y, 10, prefetch=True, seed=1)
+    for it in range(5 * plain.batches_per_epoch):
+        assert np.all(plain.next_batch()[1] == threaded.next_batch()[1])
+    threaded.close()
+
+def test_EpochSampler_incorrect_shape(random_data):
+    X, y = random_data()
+    with pytest.raises(ValueError):
+        EpochSampler(X, y[:-1], 10)
+    with pytest.raises(ValueError):
+        EpochSampler(X.reshape(X.shape[0], 1, -1), y, 10)
@@ -0,0 +1,166 @@
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 1 root):
+python -m py.test tests/test_feature_cache.py -vv -s -q
+python -m py.test tests/test_feature_cache.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_feature_cache.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+
+import functools
+import os
+import subprocess
+import sys
+
+import pytest
+import numpy as np
+
+from cs231n.features      import hog_feature, color_histogram_hsv, extract_features
+from cs231n.feature_cache import FeatureCache, feature_key, image_digests
+
+
+@pytest.fixture(scope='module')
+def imgs():
+    return np.random.RandomState(0).randint(0, 256, size=(60, 32, 32, 3)).astype(np.float64)
+
+@pytest.fixture(scope='module')
+def feature_fns():
+    return [hog_feature, functools.partial(color_histogram_hsv, nbin=10)]
+
+def test_assert():
+    assert 1
+
+def test_feature_cache_hit(imgs, feature_fns, tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    feats_ref = extract_features(imgs, feature_fns)
+
+    feats = cache.extract(imgs, feature_fns)
+    assert cache.num_extracted == 60
+    assert np.array_equal(feats, feats_ref)
+
+    #a new cache on the same directory serves the request memory-mapped
+    cache = FeatureCache(str(tmp_path))
+    feats = cache.extract(imgs, feature_fns)
+    assert cache.num_extracted == 0
+    assert isinstance(feats, np.memmap)
+    assert np.array_equal(feats, feats_ref)
+
+def test_feature_cache_changed_images(imgs, feature_fns, tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.extract(imgs[:40], feature_fns)
+
+    #3 changed images and 20 new ones, in a different order
+    changed = imgs.copy()
+    changed[[1, 5, 7]] = 255 - changed[[1, 5, 7]]
+    changed = changed[::-1]
+    feats = cache.extract(changed, feature_fns)
+    assert cache.num_extracted == 40 + 3 + 20
+    assert np.array_equal(feats, extract_features(changed, feature_fns))
+
+    #a subset of the stored images extracts nothing
+    feats = cache.extract(imgs[10:30], feature_fns)
+    assert cache.num_extracted == 63
+    assert np.array_equal(feats, extract_features(imgs[10:30], feature_fns))
+
+def test_feature_key():
+    hog = [hog_feature]
+    assert feature_key(hog) == feature_key([hog_feature])
+    assert feature_key(hog) != feature_key([hog_feature, hog_feature])
+    assert (feature_key([functools.partial(color_histogram_hsv, nbin=10)]) !=
+            feature_key([functools.partial(color_histogram_hsv, nbin=12)]))
+    nbin = 10
+    key_10 = feature_key([lambda img: color_histogram_hsv(img, nbin=nbin)])
+    nbin = 12
+    key_12 = feature_key([lambda img: color_histogram_hsv(img, nbin=nbin)])
+    assert key_10 != key_12
+
+    #closed over arrays are identified by all of their contents
+    bins = np.linspace(0, 255, 2000)
+    other_bins = bins.copy()
+    other_bins[1000] += 0.5
+    key = feature_key([(lambda bins: lambda img: np.histogram(img, bins)[0])(bins)])
+    assert key == feature_key([(lambda bins: lambda img: np.histogram(img, bins)[0])(bins.copy())])
+    assert key != feature_key([(lambda bins: lambda img: np.histogram(img, bins)[0])(other_bins)])
+
+FEATURE_FNS_SOURCE = """
+import numpy as np
+
+def comprehension_feature(img):
+    return np.array([row.sum() for row in img if row.dtype.kind in {'f', 'u', 'i'}])
+
+def make_feature(bins):
+    def feature(img):
+        return np.histogram(img, bins)[0]
+    return feature
+
+feature_fns = [comprehension_feature, make_feature(np.linspace(0, 255, 2000)),
+               lambda img: comprehension_feature(img) + 1]
+"""
+
+def test_feature_key_across_processes():
+    namespace = {'__name__': 'feature_fns'}
+    exec(FEATURE_FNS_SOURCE, namespace)
+    key = feature_key(namespace['feature_fns'])
+
+    script = ('from cs231n.feature_cache import feature_key\n'
+              'namespace = {"__name__": "feature_fns"}\n'
+              'exec(%r, namespace)\n'
+              'print(feature_key(namespace["feature_fns"]))\n' % FEATURE_FNS_SOURCE)
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.check_output([sys.executable, '-c', script], env=env)
+    assert output.decode('utf-8').strip() == key
+
+def test_image_digests(imgs):
+    digests = image_digests(imgs)
+    assert digests.shape == (60,)
+    assert len(set(digests)) == 60
+    assert np.array_equal(image_digests(imgs[::2].copy()), digests[::2])
+    assert image_digests(imgs[:1].astype(np.float32))[0] != digests[0]
+
+def test_feature_cache_lru(imgs, feature_fns, tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.extract(imgs[:20], feature_fns)
+    block_bytes = cache.nbytes()
+    cache.max_bytes = int(2.5 * block_bytes)
+    cache.extract(imgs[20:40], feature_fns)
+    cache.extract(imgs[:20], feature_fns)
+    #imgs[20:40] is now the least recently used block
+    cache.extract(imgs[40:60], feature_fns)
+    assert len(cache.blocks) == 2
+    assert cache.nbytes() <= cache.max_bytes
+
+    extracted = cache.num_extracted
+    cache.extract(imgs[:20], feature_fns)
+    cache.extract(imgs[40:60], feature_fns)
+    assert cache.num_extracted == extracted
+    cache.extract(imgs[20:40], feature_fns)
+    assert cache.num_extracted == extracted + 20
+
+def test_feature_cache_superset_request(imgs, feature_fns, tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.extract(imgs[:20], feature_fns)
+    cache.max_bytes = int(3.3 * cache.nbytes())
+    feats = cache.extract(imgs, feature_fns)
+    assert np.array_equal(feats, extract_features(imgs, feature_fns))
+    #the block of the subset is replaced by the one of its superset
+    assert len(cache.blocks) == 1
+    assert cache.nbytes() <= cache.max_bytes
+
+    #a subset of the stored rows extracts nothing and stores nothing new
+    cache.extract(imgs[10:30], feature_fns)
+    assert cache.num_extracted == 60
+    assert len(cache.blocks) == 1
+
+def test_feature_cache_clear(imgs, feature_fns, tmp_path):
+    cache = FeatureCache(str(tmp_path))
+    cache.extract(imgs[:10], feature_fns)
+    cache.clear()
+    assert cache.nbytes() == 0
+    assert not any(f.endswith('.npy') for _, _, files in os.walk(str(tmp_path)) for f in files)
+    assert FeatureCache(str(tmp_path)).nbytes() == 0
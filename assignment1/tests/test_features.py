@@ -25,6 +25,9 @@ from cs231n.classifiers                   import Softmax
 from cs231n.classifiers.softmax           import softmax_loss_naive, softmax_loss_vectorized
 
 from cs231n.classifiers.neural_net        import TwoLayerNet
+from cs231n.features                      import hog_feature, hog_feature_batch, extract_features
+from cs231n.features                      import extract_features_parallel, color_histogram_hsv
+from cs231n.features                      import color_histogram_hsv_batch
 from cs231n.gradient_check                import grad_check_sparse, eval_numerical_gradient
 from cs231n.data_utils                    import load_CIFAR10, load_CIFAR_batch
 
@@ -145,3 +148,117 @@ def test_sampling(sample_train):
     assert Xtrain.shape == (3500,32,32,3)
     assert ytrain.shape == (3500,)
 
+@pytest.mark.parametrize("batch_size", [1, 7, 64])
+def test_hog_feature_batch(sample_train, batch_size):
+    Xtrain, ytrain = sample_train(count=150)
+
+    feats = hog_feature_batch(Xtrain, batch_size=batch_size)
+    feats_ref = extract_features(Xtrain, [hog_feature])
+    assert feats.shape == feats_ref.shape
+    #uniform_filter leaves ~1e-15 residues where the exact cell average is 0
+    assert np.max(np.abs(feats - feats_ref)) < 1e-10
+
+@pytest.mark.parametrize("shape", [(20, 32, 32), (20, 36, 36, 3), (20, 40, 40, 3)])
+def test_hog_feature_batch_shapes(shape):
+    #random integer images (many exactly zero gradients), grayscale and larger images
+    imgs = np.random.randint(0, 256, size=shape).astype(np.float64)
+    imgs[:, 5:15, 5:15] = 128
+
+    feats = hog_feature_batch(imgs, batch_size=6)
+    feats_ref = np.array([hog_feature(im) for im in imgs])
+    assert feats.shape == feats_ref.shape
+    assert np.max(np.abs(feats - feats_ref)) < 1e-10
+
+
+@pytest.mark.parametrize("num_workers,chunk_size", [(1, 16), (2, 16), (2, 1000)])
+def test_extract_features_parallel(sample_train, tmp_path, num_workers, chunk_size):
+    Xtrain, ytrain = sample_train(count=70)
+    feature_fns = [hog_feature, lambda img: color_histogram_hsv(img, nbin=10)]
+    out_path = str(tmp_path / 'feats.dat')
+
+    feats = extract_features_parallel(Xtrain, feature_fns, out_path,
+                                      chunk_size=chunk_size, num_workers=num_workers)
+    feats_ref = extract_features(Xtrain, feature_fns)
+    assert feats.dtype == np.float32
+    assert feats.shape == feats_ref.shape
+    assert np.allclose(feats, feats_ref, rtol=1e-5, atol=1e-6)
+
+def test_extract_features_parallel_resume(sample_train, tmp_path):
+    Xtrain, ytrain = sample_train(count=50)
+    calls = []
+    def feature_fn(img):
+        calls.append(1)
+        return hog_feature(img)
+    out_path = str(tmp_path / 'feats.dat')
+    feats_ref = extract_features_parallel(Xtrain, [feature_fn], out_path,
+                                          chunk_size=10, num_workers=1).copy()
+
+    #forget chunks 1 and 4 as if the run had been interrupted, and clobber them
+    with open(out_path + '.done') as f:
+        lines = f.read().splitlines()
+    with open(out_path + '.done', 'w') as f:
+        f.write('\n'.join([lines[0]] + [l for l in lines[1:] if l not in ('1', '4')]) + '\n')
+    feats = np.memmap(out_path, dtype=np.float32, mode='r+', shape=feats_ref.shape)
+    feats[10:20] = 0
+    feats[40:50] = 0
+    feats.flush()
+    del feats
+
+    del calls[:]
+    feats = extract_features_parallel(Xtrain, [feature_fn], out_path,
+                                      chunk_size=10, num_workers=1)
+    #one call sizes the output, then only the 20 images of chunks 1 and 4
+    assert len(calls) == 1 + 20
+    assert np.array_equal(feats, feats_ref)
+
+    #a different chunk size does not match the sidecar and starts over
+    del calls[:]
+    with pytest.warns(UserWarning):
+        feats = extract_features_parallel(Xtrain, [feature_fn], out_path,
+                                          chunk_size=25, num_workers=1)
+    assert len(calls) == 1 + 50
+    assert np.array_equal(feats, feats_ref)
+
+def test_extract_features_parallel_inputs_changed(sample_train, tmp_path):
+    Xtrain, ytrain = sample_train(count=40)
+    out_path = str(tmp_path / 'feats.dat')
+    extract_features_parallel(Xtrain, [hog_feature], out_path, chunk_size=10, num_workers=1)
+
+    #other images of the same shape are not served from the stale chunks
+    other = Xtrain[::-1].copy()
+    with pytest.warns(UserWarning):
+        feats = extract_features_parallel(other, [hog_feature], out_path,
+                                          chunk_size=10, num_workers=1)
+    assert np.allclose(feats, extract_features(other, [hog_feature]), rtol=1e-5, atol=1e-6)
+
+    #nor are other feature functions of the same width
+    feature_fns = [lambda img: 2 * hog_feature(img)]
+    with pytest.warns(UserWarning):
+        feats = extract_features_parallel(other, feature_fns, out_path,
+                                          chunk_size=10, num_workers=1)
+    assert np.allclose(feats, extract_features(other, feature_fns), rtol=1e-5, atol=1e-6)
+
+@pytest.mark.parametrize("kwargs", [{}, {'normalized': False}, {'nbin': 7, 'xmin': 20},
+                                    {'nbin': 13, 'xmin': -10, 'xmax': 300}])
+def test_color_histogram_hsv_batch(sample_train, kwargs):
+    Xtrain, ytrain = sample_train(count=100)
+    #gray pixels (no hue) and ties between the maximal channels
+    Xtrain[:10, :8] = Xtrain[:10, :8, :, :1]
+    Xtrain[10:20, :, :, 1] = Xtrain[10:20, :, :, 2]
+
+    feats = color_histogram_hsv_batch(Xtrain, batch_size=30, **kwargs)
+    feats_ref = np.array([color_histogram_hsv(img, **kwargs) for img in Xtrain])
+    assert feats.shape == feats_ref.shape
+    assert np.array_equal(feats, feats_ref)
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+def test_color_histogram_hsv_batch_dtype(dtype):
+    imgs = np.random.randint(0, 256, size=(20, 16, 16, 3)).astype(dtype)
+    feats = color_histogram_hsv_batch(imgs)
+    feats_ref = np.array([color_histogram_hsv(img) for img in imgs])
+    assert np.array_equal(feats, feats_ref)
+
+def test_color_histogram_hsv_batch_range():
+    imgs = np.full((2, 4, 4, 3), 300.0)
+    with pytest.raises(ValueError):
+        color_histogram_hsv_batch(imgs)
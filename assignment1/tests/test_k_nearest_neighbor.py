@@ -15,10 +15,11 @@ Open index.html contained within htmlcov
 import pytest
 import numpy as np
 import random
+import tracemalloc
 
 from collections import defaultdict, OrderedDict, Counter
 
-from cs231n.classifiers.k_nearest_neighbor import KNearestNeighbor
+from cs231n.classifiers.k_nearest_neighbor import KNearestNeighbor, IVFIndex, cross_validate_k
 from cs231n.data_utils import load_CIFAR10, load_CIFAR_batch
 
 batch_id = random.choice(list(range(1,6)))
@@ -314,6 +315,180 @@ def test_KNN_predict_incorrect_shape(sample_train, sample_test):
     with pytest.raises(ValueError):
         knn.predict(ytrain)#using ytrain, shich has incorrect dimensions;
 
+@pytest.fixture(scope='function')
+def random_train_test():
+    #small integer valued data (CIFAR-like pixels) that doesn't need the dataset
+    def make_sample(train_count=600, test_count=70, dim=48, num_classes=10):
+        Xtrain = np.random.randint(0, 256, size=(train_count, dim)).astype(np.float64)
+        ytrain = np.random.randint(0, num_classes, size=train_count)
+        Xtest  = np.random.randint(0, 256, size=(test_count, dim)).astype(np.float64)
+        return Xtrain, ytrain, Xtest
+    return make_sample
+
+@pytest.mark.parametrize("k", [1, 3, 8])
+@pytest.mark.parametrize("memory_budget", [2**12, 2**16, 2**27])
+def test_KNN_nearest_blocked_matches_full(random_train_test, k, memory_budget):
+    Xtrain, ytrain, Xtest = random_train_test()
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, ytrain)
+
+    dists = np.asarray(knn.compute_distances_no_loops(Xtest))
+    nearest_dists, nearest_idx = knn.compute_nearest_blocked(Xtest, k=k, memory_budget=memory_budget)
+    assert nearest_dists.shape == (Xtest.shape[0], k)
+    assert nearest_idx.shape == (Xtest.shape[0], k)
+    assert np.allclose(nearest_dists, np.sort(dists, axis=1)[:, :k])
+    assert np.allclose(np.take_along_axis(dists, nearest_idx, axis=1), nearest_dists)
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint8])
+@pytest.mark.parametrize("memory_budget", [2**18, 2**20])
+def test_KNN_nearest_blocked_memory_budget(dtype, memory_budget, k=5):
+    np.random.seed(0)
+    Xtrain = np.random.randint(0, 256, size=(20000, 48)).astype(dtype)
+    Xtest = np.random.randint(0, 256, size=(300, 48)).astype(dtype)
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, np.zeros(20000, dtype=np.int64))
+
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        knn.compute_nearest_blocked(Xtest, k=k, memory_budget=memory_budget)
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    #besides the tiles: the training norms and the (num_test, k) results
+    itemsize = np.result_type(dtype, np.float32).itemsize
+    fixed = Xtrain.shape[0] * itemsize + Xtest.shape[0] * k * (itemsize + 8)
+    assert peak - fixed < 1.2 * memory_budget
+
+@pytest.mark.parametrize("k", [1, 2, 5])
+def test_KNN_predict_blocked(random_train_test, k):
+    Xtrain, ytrain, Xtest = random_train_test()
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, ytrain)
+
+    y_full    = knn.predict(Xtest, k=k)
+    y_blocked = knn.predict(Xtest, k=k, num_loops='blocked', memory_budget=2**14)
+    assert y_blocked.shape == (Xtest.shape[0],)
+    assert np.all(y_full == y_blocked)
+
+@pytest.mark.parametrize("k", [1, 5])
+def test_KNN_ivf_index_all_probes_is_exact(random_train_test, k):
+    Xtrain, ytrain, Xtest = random_train_test()
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, ytrain, index=IVFIndex(num_lists=8, num_probes=8, seed=0))
+
+    exact_dists, _ = knn.compute_nearest_blocked(Xtest, k=k)
+    ann_dists, ann_idx = knn.index.query(Xtest, k=k)
+    assert np.allclose(ann_dists, exact_dists)
+    assert np.all(knn.predict(Xtest, k=k, num_loops='ann') == knn.predict(Xtest, k=k))
+
+def test_KNN_ivf_index_few_probes(random_train_test, k=5):
+    Xtrain, ytrain, Xtest = random_train_test()
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, ytrain, index=IVFIndex(num_lists=16, num_probes=1, seed=0))
+
+    ann_dists, ann_idx = knn.index.query(Xtest, k=k)
+    assert ann_idx.shape == (Xtest.shape[0], k)
+    assert np.all(np.diff(ann_dists, axis=1) >= 0)
+    assert np.allclose(np.linalg.norm(Xtest[:, None] - Xtrain[ann_idx], axis=2), ann_dists)
+
+def test_KNN_predict_ann_without_index(random_train_test):
+    Xtrain, ytrain, Xtest = random_train_test()
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, ytrain)
+    with pytest.raises(ValueError):
+        knn.predict(Xtest, k=1, num_loops='ann')
+
+def vote_reference(dists, ytrain, k):
+    #per row majority vote; ties -> smallest summed squared distance -> smallest label
+    y_pred = []
+    for row in dists:
+        closest = np.argsort(row)[:k]
+        counts = Counter(ytrain[closest])
+        tied = sorted(c for c in counts if counts[c] == max(counts.values()))
+        total = {c: sum(row[j]**2 for j in closest if ytrain[j] == c) for c in tied}
+        y_pred.append(min(tied, key=total.get))
+    return np.array(y_pred)
+
+@pytest.mark.parametrize("k", [1, 2, 3, 4, 7])
+def test_KNN_predict_labels_vote(random_train_test, k):
+    #few classes so that ties actually show up
+    Xtrain, ytrain, Xtest = random_train_test(num_classes=3)
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain, ytrain)
+
+    dists = np.asarray(knn.compute_distances_no_loops(Xtest))
+    assert np.all(knn.predict_labels(dists, k=k) == vote_reference(dists, ytrain, k))
+
+    proba = knn.predict_proba_labels(dists, k=k)
+    assert proba.shape == (Xtest.shape[0], 3)
+    assert np.allclose(np.sum(proba, axis=1), 1.0)
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+@pytest.mark.parametrize("num_loops", [0, 1, 2, 'blocked'])
+@pytest.mark.parametrize("k", [1, 4])
+def test_KNN_predict_dtype(random_train_test, dtype, num_loops, k):
+    #small integer data: float32 and int32 squared distances are exact here
+    Xtrain, ytrain, Xtest = random_train_test(train_count=200, test_count=30)
+
+    knn64 = KNearestNeighbor()
+    knn64.train(Xtrain, ytrain)
+    knn = KNearestNeighbor()
+    knn.train(Xtrain.astype(dtype), ytrain)
+
+    y64 = knn64.predict(Xtest, k=k, num_loops=num_loops)
+    y = knn.predict(Xtest.astype(dtype), k=k, num_loops=num_loops, dtype=dtype)
+    assert np.all(y == y64)
+
+@pytest.mark.parametrize("dtype", [np.float32, np.uint8])
+def test_KNN_dists_dtype_squared(random_train_test, dtype):
+    Xtrain, ytrain, Xtest = random_train_test(train_count=200, test_count=30)
+
+    knn = KNearestNeighbor()
+    knn.train(Xtrain.astype(dtype), ytrain)
+    dists = np.asarray(knn.compute_distances_no_loops(Xtest.astype(dtype)))
+
+    for method in [knn.compute_distances_two_loops, knn.compute_distances_one_loop,
+                   knn.compute_distances_no_loops]:
+        d2 = method(Xtest.astype(dtype), dtype=dtype, squared=True)
+        assert d2.dtype == (np.int32 if dtype == np.uint8 else np.float32)
+        assert np.all(d2 == np.round(dists**2))
+
+    nearest_d2, _ = knn.compute_nearest_blocked(Xtest.astype(dtype), k=5, dtype=dtype, squared=True)
+    assert nearest_d2.dtype == d2.dtype
+    assert np.all(nearest_d2 == np.sort(d2, axis=1)[:, :5])
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_KNN_cross_validate_k(random_train_test, num_workers, num_folds=4):
+    Xtrain, ytrain, _ = random_train_test(train_count=400)
+    k_choices = [1, 3, 5, 8, 10]
+
+    k_to_accuracies = cross_validate_k(Xtrain, ytrain, k_choices,
+                                       num_folds=num_folds, num_workers=num_workers)
+    assert sorted(k_to_accuracies) == k_choices
+
+    #reference: the notebook loop over (k, fold) with predict
+    X_folds = np.array_split(Xtrain, num_folds)
+    y_folds = np.array_split(ytrain, num_folds)
+    for k in k_choices:
+        assert len(k_to_accuracies[k]) == num_folds
+        for j in range(num_folds):
+            knn = KNearestNeighbor()
+            knn.train(np.vstack(X_folds[:j] + X_folds[j+1:]), np.hstack(y_folds[:j] + y_folds[j+1:]))
+            y_pred = knn.predict(X_folds[j], k=k)
+            assert np.isclose(k_to_accuracies[k][j], np.mean(y_pred == y_folds[j]))
+
+def test_KNN_cross_validate_k_invalid(random_train_test):
+    Xtrain, ytrain, _ = random_train_test()
+    with pytest.raises(ValueError):
+        cross_validate_k(Xtrain, ytrain, [0, 1])
+
 #options are 'module', 'fixture', 'session'
 ### Extra Test Code: ###
 @pytest.fixture(scope='module')
@@ -19,8 +19,9 @@ import random
 
 from collections import defaultdict, OrderedDict, Counter
 
-from cs231n.classifiers                   import Softmax
-from cs231n.classifiers.softmax           import softmax_loss_naive, softmax_loss_vectorized
+from cs231n.classifiers                   import Softmax, BatchedSoftmax
+from cs231n.classifiers.softmax           import softmax_loss_naive, softmax_loss_vectorized, softmax_loss_fused, softmax_loss_batched
+from cs231n.classifiers.loss_workspace    import LossWorkspace
 from cs231n.gradient_check                import grad_check_sparse, eval_numerical_gradient
 from cs231n.data_utils                    import load_CIFAR10, load_CIFAR_batch
 
@@ -241,6 +242,73 @@ def test_softmax_loss_naive_vectorized_comparison_reg(sample_train, train_count,
     assert np.abs(loss - loss_naive) < 0.0001
     assert np.linalg.norm(grad - grad_naive) < 0.0001
 
+@pytest.mark.parametrize("train_count", [1, 17, 200])
+@pytest.mark.parametrize("reg", [0., 1e2, 5e4])
+def test_softmax_loss_fused_comparison(sample_train, train_count, reg):
+    Xtrain, ytrain = sample_train(count=train_count)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    W = np.random.randn(Xtrain.shape[1],10) * 0.0001
+    loss, grad = softmax_loss_vectorized(W, Xtrain, ytrain, reg)
+    loss_fused, grad_fused = softmax_loss_fused(W, Xtrain, ytrain, reg)
+    assert np.abs(loss - loss_fused) < 0.0001
+    assert np.linalg.norm(grad - grad_fused) < 0.0001
+
+def test_softmax_loss_fused_float32(sample_train, reg=1e2):
+    Xtrain, ytrain = sample_train(count=200)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    W = np.random.randn(Xtrain.shape[1],10) * 0.0001
+    loss, grad = softmax_loss_vectorized(W, Xtrain, ytrain, reg)
+    loss32, grad32 = softmax_loss_fused(W.astype(np.float32), Xtrain.astype(np.float32), ytrain, reg)
+    assert grad32.dtype == np.float32
+    assert np.abs(loss - loss32) / np.abs(loss) < 1e-4
+    assert np.linalg.norm(grad - grad32) / np.linalg.norm(grad) < 1e-3
+
+def test_softmax_loss_fused_workspace_reuse(sample_train, reg=1e2):
+    Xtrain, ytrain = sample_train(count=100)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    workspace = LossWorkspace()
+    W = np.random.randn(Xtrain.shape[1],10) * 0.0001
+    loss, grad = softmax_loss_fused(W, Xtrain[:50], ytrain[:50], reg, workspace)
+    num_allocations = workspace.num_allocations
+    loss, grad = softmax_loss_fused(W, Xtrain[50:], ytrain[50:], reg, workspace)
+    #same shapes -> every buffer (including the returned gradient) is reused
+    assert workspace.num_allocations == num_allocations
+    loss_vec, grad_vec = softmax_loss_vectorized(W, Xtrain[50:], ytrain[50:], reg)
+    assert np.abs(loss - loss_vec) < 0.0001
+    assert np.linalg.norm(grad - grad_vec) < 0.0001
+
+def test_Softmax_loss_returns_own_gradient(reg=1e2):
+    np.random.seed(7)
+    X = np.random.randn(40, 11)
+    y = np.random.randint(10, size=40)
+    clf = Softmax()
+    clf.W = np.random.randn(11, 10) * 0.0001
+    loss1, g1 = clf.loss(X[:20], y[:20], reg)
+    loss2, g2 = clf.loss(X[20:], y[20:], reg)
+    #a later call does not overwrite the gradient of an earlier one
+    assert g1 is not g2 and not np.shares_memory(g1, g2)
+    assert np.allclose(g1, softmax_loss_vectorized(clf.W, X[:20], y[:20], reg)[1])
+    assert np.allclose(g2, softmax_loss_vectorized(clf.W, X[20:], y[20:], reg)[1])
+
+def test_Softmax_train_float32(sample_train, num_iters=50):
+    Xtrain, ytrain = sample_train(count=500)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1)).astype(np.float32)
+    Xtrain -= np.mean(Xtrain, axis=0)
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1), dtype=np.float32)])
+
+    classifier = Softmax()
+    loss_hist = classifier.train(Xtrain, ytrain, learning_rate=1e-7, reg=5e3,
+                                 num_iters=num_iters, verbose=False)
+    assert classifier.W.dtype == np.float32
+    assert len(loss_hist) == num_iters
+    assert loss_hist[-1] < loss_hist[0]
+
 @pytest.mark.parametrize("train_count", [10 * x + 1 for x in range(1,10)])
 @pytest.mark.parametrize("reg", [10. * x + 1 for x in range(10,100000, 10000)])
 def test_softmax_loss_vectorized_comparison_mean(sample_train, train_count, reg):
@@ -367,3 +435,45 @@ def test_softmax_random_weights(sample_train, weight_size=0.0001, regularization
     assert loss > 1.8 and loss < 2.8
     #expect a loss of  loss ~ -np.log(0.1)
     # i.e. we get it right 1/10 times
+
+@pytest.mark.parametrize("train_count", [1, 50])
+def test_softmax_loss_batched_comparison(sample_train, train_count, num_models=4):
+    Xtrain, ytrain = sample_train(count=train_count)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    W = np.random.randn(num_models, Xtrain.shape[1], 10) * 0.0001
+    regs = np.array([0., 1e2, 5e3, 5e4])
+    loss, grad = softmax_loss_batched(W, Xtrain, ytrain, regs)
+    assert loss.shape == (num_models,)
+    assert grad.shape == W.shape
+    for m in range(num_models):
+        loss_m, grad_m = softmax_loss_vectorized(W[m], Xtrain, ytrain, regs[m])
+        assert np.abs(loss[m] - loss_m) < 0.0001
+        assert np.linalg.norm(grad[m] - grad_m) < 0.0001
+
+def test_BatchedSoftmax_train(sample_train, num_iters=100):
+    Xtrain, ytrain = sample_train(count=1000)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain -= np.mean(Xtrain, axis=0)
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    batched = BatchedSoftmax([1e-7, 5e-7, 1e-7], [5e3, 5e3, 5e4])
+    loss_hists = batched.train(Xtrain, ytrain, num_iters=num_iters, sampling='epoch')
+    assert batched.W.shape == (3, Xtrain.shape[1], 10)
+    for loss_hist in loss_hists:
+        assert len(loss_hist) == num_iters
+        assert loss_hist[-1] < loss_hist[0]
+
+def test_softmax_train_lbfgs(sample_train, reg=1e-2, dim=200):
+    Xtrain, ytrain = sample_train(count=500)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))[:, :dim]
+    Xtrain = (Xtrain - np.mean(Xtrain, axis=0)) / (np.std(Xtrain, axis=0) + 1e-8)
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    classifier = Softmax()
+    loss_hist = classifier.train_lbfgs(Xtrain, ytrain, reg=reg, max_iter=200, tol=1e-12)
+    #at the optimum the full-batch gradient vanishes
+    loss, grad = softmax_loss_vectorized(classifier.W, Xtrain, ytrain, reg)
+    assert np.isclose(loss, loss_hist[-1])
+    assert np.max(np.abs(grad)) < 1e-3
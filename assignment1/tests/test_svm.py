@@ -18,8 +18,9 @@ import random
 
 from collections import defaultdict, OrderedDict, Counter
 
-from cs231n.classifiers.linear_classifier import LinearSVM
-from cs231n.classifiers.linear_svm        import svm_loss_naive, svm_loss_vectorized
+from cs231n.classifiers.linear_classifier import LinearSVM, BatchedLinearSVM
+from cs231n.classifiers.linear_svm        import svm_loss_naive, svm_loss_vectorized, svm_loss_fused, svm_loss_batched, svm_loss_smoothed
+from cs231n.classifiers.loss_workspace    import LossWorkspace
 from cs231n.gradient_check                import grad_check_sparse, eval_numerical_gradient
 from cs231n.data_utils                    import load_CIFAR10, load_CIFAR_batch
 
@@ -229,6 +230,73 @@ def test_SVM_loss_naive_vectorized_comparison_reg(sample_train, train_count, reg
     assert np.linalg.norm(grad - grad_naive) < 0.0001
 
 
+@pytest.mark.parametrize("train_count", [1, 17, 200])
+@pytest.mark.parametrize("reg", [0., 1e2, 5e4])
+def test_SVM_loss_fused_comparison(sample_train, train_count, reg):
+    Xtrain, ytrain = sample_train(count=train_count)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    W = np.random.randn(Xtrain.shape[1],10) * 0.0001
+    loss, grad = svm_loss_vectorized(W, Xtrain, ytrain, reg)
+    loss_fused, grad_fused = svm_loss_fused(W, Xtrain, ytrain, reg)
+    assert np.abs(loss - loss_fused) < 0.0001
+    assert np.linalg.norm(grad - grad_fused) < 0.0001
+
+def test_SVM_loss_fused_float32(sample_train, reg=1e2):
+    Xtrain, ytrain = sample_train(count=200)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    W = np.random.randn(Xtrain.shape[1],10) * 0.0001
+    loss, grad = svm_loss_vectorized(W, Xtrain, ytrain, reg)
+    loss32, grad32 = svm_loss_fused(W.astype(np.float32), Xtrain.astype(np.float32), ytrain, reg)
+    assert grad32.dtype == np.float32
+    assert np.abs(loss - loss32) / np.abs(loss) < 1e-4
+    assert np.linalg.norm(grad - grad32) / np.linalg.norm(grad) < 1e-3
+
+def test_SVM_loss_fused_workspace_reuse(sample_train, reg=1e2):
+    Xtrain, ytrain = sample_train(count=100)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    workspace = LossWorkspace()
+    W = np.random.randn(Xtrain.shape[1],10) * 0.0001
+    loss, grad = svm_loss_fused(W, Xtrain[:50], ytrain[:50], reg, workspace)
+    num_allocations = workspace.num_allocations
+    loss, grad = svm_loss_fused(W, Xtrain[50:], ytrain[50:], reg, workspace)
+    #same shapes -> every buffer (including the returned gradient) is reused
+    assert workspace.num_allocations == num_allocations
+    loss_vec, grad_vec = svm_loss_vectorized(W, Xtrain[50:], ytrain[50:], reg)
+    assert np.abs(loss - loss_vec) < 0.0001
+    assert np.linalg.norm(grad - grad_vec) < 0.0001
+
+def test_LinearSVM_loss_returns_own_gradient(reg=1e2):
+    np.random.seed(7)
+    X = np.random.randn(40, 11)
+    y = np.random.randint(10, size=40)
+    clf = LinearSVM()
+    clf.W = np.random.randn(11, 10) * 0.0001
+    loss1, g1 = clf.loss(X[:20], y[:20], reg)
+    loss2, g2 = clf.loss(X[20:], y[20:], reg)
+    #a later call does not overwrite the gradient of an earlier one
+    assert g1 is not g2 and not np.shares_memory(g1, g2)
+    assert np.allclose(g1, svm_loss_vectorized(clf.W, X[:20], y[:20], reg)[1])
+    assert np.allclose(g2, svm_loss_vectorized(clf.W, X[20:], y[20:], reg)[1])
+
+def test_LinearSVM_train_float32(sample_train, num_iters=50):
+    Xtrain, ytrain = sample_train(count=500)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1)).astype(np.float32)
+    Xtrain -= np.mean(Xtrain, axis=0)
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1), dtype=np.float32)])
+
+    classifier = LinearSVM()
+    loss_hist = classifier.train(Xtrain, ytrain, learning_rate=1e-7, reg=5e3,
+                                 num_iters=num_iters, verbose=False)
+    assert classifier.W.dtype == np.float32
+    assert len(loss_hist) == num_iters
+    assert loss_hist[-1] < loss_hist[0]
+
 @pytest.mark.parametrize("train_count", [10 * x + 1 for x in range(1,10)])
 @pytest.mark.parametrize("reg", [10. * x + 1 for x in range(10,100000, 10000)])
 def test_SVM_loss_vectorized_comparison_mean(sample_train, train_count, reg):
@@ -382,3 +450,139 @@ def test_LinearSVM_train(sample_train, num_iters=200,
 
 
 
+
+@pytest.mark.parametrize("prefetch", [False, True])
+def test_LinearSVM_train_epoch_sampling(sample_train, prefetch, num_iters=60,
+                                        learning_rate=1e-7, regularization=5e3):
+    Xtrain, ytrain = sample_train(count=1000)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    svm = LinearSVM()
+    loss_hist = svm.train(Xtrain, ytrain, learning_rate=learning_rate,
+                          reg=regularization, num_iters=num_iters, verbose=False,
+                          sampling='epoch', prefetch=prefetch)
+    assert len(loss_hist) == num_iters
+    assert loss_hist[-1] < loss_hist[0]
+    assert svm.W.dtype == np.float32
+
+def test_LinearSVM_train_invalid_sampling(sample_train):
+    Xtrain, ytrain = sample_train(count=100)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+
+    svm = LinearSVM()
+    with pytest.raises(ValueError):
+        svm.train(Xtrain, ytrain, num_iters=1, sampling='bootstrap')
+
+@pytest.mark.parametrize("train_count", [1, 50])
+def test_SVM_loss_batched_comparison(sample_train, train_count, num_models=4):
+    Xtrain, ytrain = sample_train(count=train_count)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+
+    W = np.random.randn(num_models, Xtrain.shape[1], 10) * 0.0001
+    regs = np.array([0., 1e2, 5e3, 5e4])
+    loss, grad = svm_loss_batched(W, Xtrain, ytrain, regs)
+    assert loss.shape == (num_models,)
+    assert grad.shape == W.shape
+    for m in range(num_models):
+        loss_m, grad_m = svm_loss_vectorized(W[m], Xtrain, ytrain, regs[m])
+        assert np.abs(loss[m] - loss_m) < 0.0001
+        assert np.linalg.norm(grad[m] - grad_m) < 0.0001
+
+def test_BatchedLinearSVM_matches_sequential(sample_train, num_iters=20, batch_size=50):
+    Xtrain, ytrain = sample_train(count=500)
+    Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))
+    Xtrain -= np.mean(Xtrain, axis=0)
+    Xtrain = np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))])
+    learning_rates, regs = [1e-7, 1e-7, 5e-7], [5e3, 5e4, 5e3]
+
+    batched = BatchedLinearSVM(learning_rates, regs)
+    W0 = 0.001 * np.random.randn(Xtrain.shape[1], 3, 10)
+    batched.W_dmc = W0.copy()
+    np.random.seed(231)
+    loss_hists = batched.train(Xtrain, ytrain, num_iters=num_iters, batch_size=batch_size)
+    assert len(loss_hists) == 3
+
+    #same initial weights and the same minibatches -> the same models
+    for m, (learning_rate, reg) in enumerate(zip(learning_rates, regs)):
+        svm = LinearSVM()
+        svm.W = W0[:, m, :].copy()
+        np.random.seed(231)
+        loss_hist = svm.train(Xtrain, ytrain, learning_rate=learning_rate, reg=reg,
+                              num_iters=num_iters, batch_size=batch_size)
+        assert np.allclose(loss_hists[m], loss_hist)
+        assert np.allclose(batched.W[m], svm.W)
+
+    y_pred = batched.predict(Xtrain)
+    assert y_pred.shape == (3, Xtrain.shape[0])
+    for m, model in enumerate(batched.classifiers()):
+        assert isinstance(model, LinearSVM)
+        assert np.all(model.predict(Xtrain) == y_pred[m])
+
+def test_BatchedLinearSVM_invalid_parameters():
+    with pytest.raises(ValueError):
+        BatchedLinearSVM([1e-7, 1e-6], [5e3])
+
+@pytest.fixture(scope='function')
+def sample_features(sample_train):
+    #a small, feature-like problem: a few hundred standardized dimensions
+    def make_sample(count=500, dim=200):
+        Xtrain, ytrain = sample_train(count=count)
+        Xtrain = np.reshape(Xtrain, (Xtrain.shape[0], -1))[:, :dim]
+        Xtrain = (Xtrain - np.mean(Xtrain, axis=0)) / (np.std(Xtrain, axis=0) + 1e-8)
+        return np.hstack([Xtrain, np.ones((Xtrain.shape[0], 1))]), ytrain
+    return make_sample
+
+def test_SVM_loss_smoothed_zero_is_hinge(sample_features, reg=1e-2):
+    Xtrain, ytrain = sample_features()
+    W = np.random.randn(Xtrain.shape[1],10) * 0.01
+    loss, grad = svm_loss_vectorized(W, Xtrain, ytrain, reg)
+    loss0, grad0 = svm_loss_smoothed(W, Xtrain, ytrain, reg, smoothing=0.)
+    loss_small, grad_small = svm_loss_smoothed(W, Xtrain, ytrain, reg, smoothing=1e-6)
+    assert np.abs(loss - loss0) < 0.0001
+    assert np.abs(loss - loss_small) < 0.0001
+    assert np.linalg.norm(grad - grad0) < 0.0001
+
+@pytest.mark.parametrize("smoothing", [0.1, 1.0, 5.0])
+def test_SVM_loss_smoothed_numerical_gradient(sample_features, smoothing, reg=1e-2):
+    Xtrain, ytrain = sample_features(count=50, dim=20)
+    W = np.random.randn(Xtrain.shape[1],10) * 0.1
+
+    f = lambda w: svm_loss_smoothed(w, Xtrain, ytrain, reg, smoothing)[0]
+    loss, grad = svm_loss_smoothed(W, Xtrain, ytrain, reg, smoothing)
+    grad_num = eval_numerical_gradient(f, W, verbose=False, h=1e-6)
+    assert np.max(np.abs(grad - grad_num)) < 1e-6
+
+def test_LinearSVM_train_closed_form(sample_features, reg=1e-1):
+    Xtrain, ytrain = sample_features()
+    svm = LinearSVM()
+    W = svm.train_closed_form(Xtrain, ytrain, reg=reg)
+    assert W.shape == (Xtrain.shape[1], 10)
+
+    #gradient of the ridge objective vanishes at the solution
+    Y = np.eye(10)[ytrain]
+    grad = np.dot(Xtrain.T, np.dot(Xtrain, W) - Y) / Xtrain.shape[0] + reg * W
+    assert np.max(np.abs(grad)) < 1e-8
+
+@pytest.mark.parametrize("init", ['random', 'closed_form'])
+def test_LinearSVM_train_lbfgs(sample_features, init, reg=1e-2):
+    Xtrain, ytrain = sample_features()
+
+    svm = LinearSVM()
+    loss_hist = svm.train_lbfgs(Xtrain, ytrain, reg=reg, max_iter=100, init=init)
+    assert svm.W.shape == (Xtrain.shape[1], 10)
+    assert 0 < len(loss_hist) <= 100
+    assert loss_hist[-1] < loss_hist[0]
+
+    #a long SGD run doesn't reach a lower smoothed loss
+    sgd = LinearSVM()
+    sgd.train(Xtrain, ytrain, learning_rate=1e-3, reg=reg, num_iters=500)
+    loss_sgd, _ = svm_loss_smoothed(sgd.W, Xtrain, ytrain, reg, smoothing=1.0)
+    loss_lbfgs, _ = svm_loss_smoothed(svm.W, Xtrain, ytrain, reg, smoothing=1.0)
+    assert loss_lbfgs <= loss_sgd
+
+def test_LinearSVM_train_lbfgs_invalid_init(sample_features):
+    Xtrain, ytrain = sample_features(count=50)
+    with pytest.raises(ValueError):
+        LinearSVM().train_lbfgs(Xtrain, ytrain, init='current')
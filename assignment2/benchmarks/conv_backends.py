@@ -0,0 +1,81 @@
+'''
+Time the forward + backward pass of every conv backend in
+fast_layers.CONV_BACKENDS on typical CIFAR-10 / TinyImageNet layer shapes,
+and show which backend conv_forward_auto chooses for each.
+
+HOW TO RUN THIS CODE (from the assignment 2 root):
+PYTHONPATH=${PWD} python benchmarks/conv_backends.py
+PYTHONPATH=${PWD} python benchmarks/conv_backends.py --batch-size 100 --dtype float32
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from cs231n.fast_layers import (CONV_BACKENDS, conv_backend, conv_backend_supported,
+                                conv_forward_auto, NAIVE_MAX_OUTPUTS)
+
+# (channels, height, width, filters, filter size, stride, pad)
+CONFIGS = [
+    (3, 32, 32, 32, 3, 1, 1),
+    (32, 32, 32, 32, 3, 1, 1),
+    (64, 16, 16, 64, 3, 1, 1),
+    (128, 8, 8, 128, 3, 1, 1),
+    (64, 15, 15, 64, 3, 2, 1),
+    (3, 32, 32, 32, 5, 1, 2),
+    (3, 32, 32, 32, 7, 1, 3),
+    (8, 32, 32, 16, 11, 1, 5),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float64')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def time_conv(forward, backward, x, w, b, conv_param, repeats):
+    """ Best time of repeats forward + backward passes. """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out, cache = forward(x, w, b, conv_param)
+        backward(np.ones_like(out), cache)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+    names = [name for name in CONV_BACKENDS if name != 'naive']
+
+    print('%-28s' % 'input, filters, stride / pad' +
+          ''.join('%10s' % name for name in names) + '%10s' % 'auto' + '  (ms)')
+    for C, H, W, F, size, stride, pad in CONFIGS:
+        x = np.random.randn(args.batch_size, C, H, W).astype(args.dtype)
+        w = np.random.randn(F, C, size, size).astype(args.dtype)
+        b = np.random.randn(F).astype(args.dtype)
+        conv_param = {'stride': stride, 'pad': pad}
+
+        row = '%-28s' % ('%dx%dx%d, %dx%dx%d, %d / %d' % (C, H, W, F, size, size,
+                                                           stride, pad))
+        for name in names:
+            if not conv_backend_supported(name, w.shape, conv_param):
+                row += '%10s' % '-'
+                continue
+            forward, backward = CONV_BACKENDS[name]
+            row += '%10.1f' % (1000 * time_conv(forward, backward, x, w, b, conv_param,
+                                                args.repeats))
+        conv_forward_auto(x, w, b, conv_param)
+        row += '%10s' % conv_backend(x.shape, w.shape, conv_param, dtype=x.dtype)
+        print(row)
+    print('(naive is only a candidate for outputs of at most %d numbers)' % NAIVE_MAX_OUTPUTS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+'''
+Time the conv, max pool and spatial batchnorm layers (forward + backward) and
+the ThreeLayerConvNet loss on channels-first (NCHW) and channels-last (NHWC)
+images, to show where each memory layout wins on this CPU.
+
+HOW TO RUN THIS CODE (from the assignment 2 root):
+PYTHONPATH=${PWD} python benchmarks/layout.py
+PYTHONPATH=${PWD} python benchmarks/layout.py --batch-size 100 --dtype float32
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from cs231n.classifiers.cnn import ThreeLayerConvNet
+from cs231n.fast_layers import (conv_forward_auto, conv_backward_auto,
+                                max_pool_forward_fast, max_pool_backward_fast)
+from cs231n.layers import (nchw_to_nhwc, spatial_batchnorm_forward,
+                           spatial_batchnorm_backward)
+
+# (channels, height, width, filters, filter size, stride, pad)
+CONV_CONFIGS = [
+    (3, 32, 32, 32, 3, 1, 1),
+    (32, 32, 32, 32, 3, 1, 1),
+    (64, 16, 16, 64, 3, 1, 1),
+    (128, 8, 8, 128, 3, 1, 1),
+    (3, 32, 32, 32, 7, 1, 3),
+]
+
+# (channels, height, width, pool size, stride)
+POOL_CONFIGS = [
+    (32, 32, 32, 2, 2),
+    (64, 16, 16, 3, 2),
+    (128, 8, 8, 2, 2),
+]
+
+# (channels, height, width)
+BATCHNORM_CONFIGS = [
+    (32, 32, 32),
+    (64, 16, 16),
+    (128, 8, 8),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float64')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def best_time(fn, repeats):
+    """ Best time of repeats calls of fn. """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def forward_backward(forward, backward, x, *args):
+    """ A function running forward and then backward with a dout of ones. """
+    def run():
+        out, cache = forward(x, *args)
+        backward(np.ones_like(out), cache)
+    return run
+
+
+def print_row(label, nchw, nhwc):
+    print('%-30s%10.2f%10.2f%10s' % (label, 1000 * nchw, 1000 * nhwc,
+                                     'NCHW' if nchw <= nhwc else 'NHWC'))
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+    N = args.batch_size
+
+    print('%-30s%10s%10s%10s' % ('layer (ms)', 'NCHW', 'NHWC', 'faster'))
+    for C, H, W, F, size, stride, pad in CONV_CONFIGS:
+        x = np.random.randn(N, C, H, W).astype(args.dtype)
+        w = np.random.randn(F, C, size, size).astype(args.dtype)
+        b = np.random.randn(F).astype(args.dtype)
+        times = []
+        for layout, data in (('NCHW', x), ('NHWC', nchw_to_nhwc(x))):
+            conv_param = {'stride': stride, 'pad': pad, 'layout': layout}
+            times.append(best_time(forward_backward(conv_forward_auto, conv_backward_auto,
+                                                    data, w, b, conv_param), args.repeats))
+        print_row('conv %dx%dx%d, %dx%dx%d' % (C, H, W, F, size, size), *times)
+
+    for C, H, W, size, stride in POOL_CONFIGS:
+        x = np.random.randn(N, C, H, W).astype(args.dtype)
+        times = []
+        for layout, data in (('NCHW', x), ('NHWC', nchw_to_nhwc(x))):
+            pool_param = {'pool_height': size, 'pool_width': size, 'stride': stride,
+                          'layout': layout}
+            times.append(best_time(forward_backward(max_pool_forward_fast, max_pool_backward_fast,
+                                                    data, pool_param), args.repeats))
+        print_row('pool %dx%dx%d, %dx%d / %d' % (C, H, W, size, size, stride), *times)
+
+    for C, H, W in BATCHNORM_CONFIGS:
+        x = np.random.randn(N, C, H, W).astype(args.dtype)
+        gamma, beta = np.ones(C, dtype=args.dtype), np.zeros(C, dtype=args.dtype)
+        times = []
+        for layout, data in (('NCHW', x), ('NHWC', nchw_to_nhwc(x))):
+            bn_param = {'mode': 'train', 'layout': layout}
+            times.append(best_time(forward_backward(spatial_batchnorm_forward,
+                                                    spatial_batchnorm_backward,
+                                                    data, gamma, beta, bn_param), args.repeats))
+        print_row('spatial batchnorm %dx%dx%d' % (C, H, W), *times)
+
+    # the whole network, including the conversion of the data at the input
+    X = np.random.randn(N, 3, 32, 32)
+    y = np.random.randint(10, size=N)
+    times = []
+    for layout in ('NCHW', 'NHWC'):
+        model = ThreeLayerConvNet(dtype=np.dtype(args.dtype).type, layout=layout)
+        times.append(best_time(lambda: model.loss(X, y), args.repeats))
+    print_row('ThreeLayerConvNet loss', *times)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+'''
+Time the forward + backward pass of the max pooling implementations (naive,
+reshape, im2col and strided) on typical CIFAR-10 sized activations, with
+tiling and overlapping windows.
+
+HOW TO RUN THIS CODE (from the assignment 2 root):
+PYTHONPATH=${PWD} python benchmarks/max_pool.py
+PYTHONPATH=${PWD} python benchmarks/max_pool.py --batch-size 100 --naive
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+from cs231n.fast_layers import (max_pool_forward_reshape, max_pool_backward_reshape,
+                                max_pool_forward_im2col, max_pool_backward_im2col,
+                                max_pool_forward_strided, max_pool_backward_strided)
+from cs231n.layers import max_pool_forward_naive, max_pool_backward_naive
+
+# (channels, height, width, pool_height, pool_width, stride)
+CONFIGS = [
+    (32, 32, 32, 2, 2, 2),
+    (64, 16, 16, 2, 2, 2),
+    (32, 32, 32, 4, 4, 4),
+    (32, 33, 33, 3, 3, 2),
+    (64, 16, 16, 2, 2, 1),
+    (32, 31, 31, 3, 3, 1),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--naive', action='store_true',
+                        help='also time the (very slow) naive layers')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def time_pool(forward, backward, x, pool_param, repeats):
+    """ Best time of repeats forward + backward passes, and the results. """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out, cache = forward(x, pool_param)
+        dx = backward(np.ones_like(out), cache)
+        best = min(best, time.perf_counter() - start)
+    return best, out, dx
+
+
+def main():
+    args = parse_args()
+    np.random.seed(args.seed)
+
+    methods = [('reshape', max_pool_forward_reshape, max_pool_backward_reshape),
+               ('im2col', max_pool_forward_im2col, max_pool_backward_im2col),
+               ('strided', max_pool_forward_strided, max_pool_backward_strided)]
+    if args.naive:
+        methods.insert(0, ('naive', max_pool_forward_naive, max_pool_backward_naive))
+
+    print('%-24s %-8s' % ('input, pool / stride', 'dtype') +
+          ''.join('%10s' % name for name, _, _ in methods) + '  (ms)')
+    for C, H, W, pool_height, pool_width, stride in CONFIGS:
+        pool_param = {'pool_height': pool_height, 'pool_width': pool_width,
+                      'stride': stride}
+        for dtype in (np.float64, np.float32):
+            x = np.random.randn(args.batch_size, C, H, W).astype(dtype)
+            row = '%-24s %-8s' % ('%dx%dx%d, %dx%d / %d' % (C, H, W, pool_height,
+                                                            pool_width, stride),
+                                  np.dtype(dtype).name)
+            reference = None
+            for name, forward, backward in methods:
+                tiles = H % pool_height == 0 and W % pool_width == 0
+                if name == 'reshape' and not (pool_height == pool_width == stride and tiles):
+                    row += '%10s' % '-'
+                    continue
+                elapsed, out, dx = time_pool(forward, backward, x, pool_param, args.repeats)
+                if reference is None:
+                    reference = out
+                assert np.array_equal(out, reference), name
+                row += '%10.2f' % (1000 * elapsed)
+            print(row)
+
+
+if __name__ == '__main__':
+    main()
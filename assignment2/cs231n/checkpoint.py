@@ -0,0 +1,194 @@
+"""
+A checkpoint file stores a dictionary of named arrays (typically the params
+of a model) without pickle:
+
+  MAGIC (8 bytes) | header length (little-endian uint64) | JSON header |
+  padding | array data, every array starting at a multiple of ALIGNMENT
+
+The JSON header holds a free-form 'meta' dictionary and, for every array, its
+dtype, shape and byte offset in the file. Arrays are read by memory-mapping
+the file at their offset, so opening a checkpoint reads nothing but the
+header, and an array is only paged in when it is used.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'CS231NCK'
+ALIGNMENT = 64
+VERSION = 1
+
+
+def save_checkpoint(filename, arrays, meta=None):
+  """
+  Write a checkpoint. The file is written under a temporary name and then
+  renamed, so an existing checkpoint is never left half overwritten.
+
+  Inputs:
+  - filename: Path of the checkpoint file.
+  - arrays: Dictionary mapping string names to numpy arrays (of numeric or
+    boolean dtype).
+  - meta: Optional dictionary of JSON-serializable values stored in the
+    header (hyperparameters, epoch, ...).
+  """
+  entries = {}
+  offset = 0
+  arrays = dict((name, np.asarray(value, order='C')) for name, value in arrays.items())
+  for name, value in arrays.items():
+    if value.dtype.hasobject or value.dtype.kind not in 'biufc':
+      raise ValueError('Cannot store array "%s" of dtype %s' % (name, value.dtype))
+    entries[name] = {'dtype': value.dtype.str, 'shape': list(value.shape),
+                     'offset': offset}
+    offset += _align(value.nbytes)
+
+  header = json.dumps({'version': VERSION, 'meta': meta or {},
+                       'arrays': entries}).encode('utf-8')
+  data_start = _align(len(MAGIC) + 8 + len(header))
+
+  tmp_filename = filename + '.tmp'
+  with open(tmp_filename, 'wb') as f:
+    f.write(MAGIC)
+    f.write(struct.pack('<Q', len(header)))
+    f.write(header)
+    for name, value in arrays.items():
+      f.seek(data_start + entries[name]['offset'])
+      f.write(value.tobytes())
+    f.truncate(data_start + offset)
+  os.replace(tmp_filename, filename)
+
+
+def read_header(filename):
+  """
+  Read the header of a checkpoint without reading any array.
+
+  Returns:
+  - header: Dictionary with 'meta' and 'arrays' (name -> dtype, shape and
+    offset relative to 'data_start') entries and the 'data_start' offset.
+
+  Raises a ValueError if the file is not a checkpoint.
+  """
+  with open(filename, 'rb') as f:
+    if f.read(len(MAGIC)) != MAGIC:
+      raise ValueError('%s is not a checkpoint file' % filename)
+    length, = struct.unpack('<Q', f.read(8))
+    header = json.loads(f.read(length).decode('utf-8'))
+  if header.get('version') != VERSION:
+    raise ValueError('Unsupported checkpoint version %s' % header.get('version'))
+  header['data_start'] = _align(len(MAGIC) + 8 + length)
+  return header
+
+
+def is_checkpoint(filename):
+  """ Whether filename starts with the checkpoint magic bytes. """
+  try:
+    with open(filename, 'rb') as f:
+      return f.read(len(MAGIC)) == MAGIC
+  except (IOError, OSError):
+    return False
+
+
+class Checkpoint(object):
+  """
+  A read-only, dictionary-like view of a checkpoint file: the keys are the
+  array names and checkpoint[name] memory-maps that array (the first time it
+  is accessed). checkpoint.meta is the meta dictionary of the header.
+
+  With mode='c' the arrays are mapped copy-on-write: they can be modified in
+  place (e.g. batchnorm running averages, optimizer updates) without the
+  changes reaching the file.
+
+  Example:
+    checkpoint = Checkpoint('model.ckpt')
+    W1 = checkpoint['W1']          # np.memmap, nothing read yet
+    params = checkpoint.to_dict()  # name -> np.memmap for every array
+  """
+
+  def __init__(self, filename, mode='r'):
+    """
+    Inputs:
+    - filename: Path of the checkpoint file.
+    - mode: 'r' (read-only arrays) or 'c' (copy-on-write arrays).
+    """
+    if mode not in ('r', 'c'):
+      raise ValueError('Invalid mode "%s"' % mode)
+    self.filename = filename
+    self.mode = mode
+    header = read_header(filename)
+    self.meta = header['meta']
+    self._entries = header['arrays']
+    self._data_start = header['data_start']
+    self._arrays = {}
+
+    size = os.path.getsize(filename)
+    for name, entry in self._entries.items():
+      nbytes = np.dtype(entry['dtype']).itemsize * int(np.prod(entry['shape']))
+      if np.dtype(entry['dtype']).hasobject or \
+         self._data_start + entry['offset'] + nbytes > size:
+        raise ValueError('Corrupt entry "%s" in checkpoint %s' % (name, filename))
+
+  def keys(self):
+    return list(self._entries.keys())
+
+  def shapes(self):
+    """ Dictionary mapping every array name to its shape. """
+    return dict((name, tuple(entry['shape'])) for name, entry in self._entries.items())
+
+  def __contains__(self, name):
+    return name in self._entries
+
+  def __len__(self):
+    return len(self._entries)
+
+  def __iter__(self):
+    return iter(self._entries)
+
+  def __getitem__(self, name):
+    if name not in self._arrays:
+      entry = self._entries[name]
+      shape = tuple(entry['shape'])
+      if int(np.prod(shape)) == 0:
+        # np.memmap cannot map zero bytes
+        self._arrays[name] = np.zeros(shape, dtype=entry['dtype'])
+      else:
+        # (np.memmap maps 0-d arrays with shape (1,))
+        self._arrays[name] = np.memmap(self.filename, dtype=entry['dtype'], mode=self.mode,
+                                       offset=self._data_start + entry['offset'],
+                                       shape=shape or (1, )).reshape(shape)
+    return self._arrays[name]
+
+  def to_dict(self, prefix=''):
+    """
+    Dictionary of the (memory-mapped) arrays whose name starts with prefix,
+    keyed by the rest of their name.
+    """
+    return dict((name[len(prefix):], self[name]) for name in self._entries
+                if name.startswith(prefix))
+
+
+def list_checkpoints(directory):
+  """
+  The checkpoints of a directory, reading only their headers.
+
+  Returns:
+  A dictionary mapping the file names of the checkpoints in directory to
+  dictionaries with their 'meta' and the 'shapes' of their arrays. Other
+  files are skipped.
+  """
+  checkpoints = {}
+  for filename in sorted(os.listdir(directory)):
+    path = os.path.join(directory, filename)
+    if os.path.isfile(path) and is_checkpoint(path):
+      header = read_header(path)
+      checkpoints[filename] = {
+        'meta': header['meta'],
+        'shapes': dict((name, tuple(entry['shape']))
+                       for name, entry in header['arrays'].items()),
+      }
+  return checkpoints
+
+
+def _align(n):
+  return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
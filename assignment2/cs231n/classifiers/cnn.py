@@ -25,12 +25,14 @@ class ThreeLayerConvNet(object):
   
   The network operates on minibatches of data that have shape (N, C, H, W)
   consisting of N images, each with height H and width W and with C input
-  channels.
+  channels. With layout='NHWC' the conv and pool layers work on channels-last
+  images instead; the data is still given as (N, C, H, W) and is transposed
+  once at the input.
   """
   
   def __init__(self, input_dim=(3, 32, 32), num_filters=32, filter_size=7,
                hidden_dim=100, num_classes=10, weight_scale=1e-3, reg=0.0,
-               dtype=np.float32):
+               dtype=np.float32, layout='NCHW'):
     """
     Initialize a new network.
     
@@ -44,10 +46,12 @@ class ThreeLayerConvNet(object):
       of weights.
     - reg: Scalar giving L2 regularization strength
     - dtype: numpy datatype to use for computation.
+    - layout: Memory layout of the conv / pool layers, 'NCHW' or 'NHWC'.
     """
     self.params = {}
     self.reg = reg
     self.dtype = dtype
+    self.layout = get_layout({'layout': layout})
     self.D     = input_dim
     num_colors = self.D[0]
     height     = self.D[1]
@@ -91,7 +95,12 @@ class ThreeLayerConvNet(object):
     # (num_filter, height/2, width/2) -> hidden_dim
     # Weights have shape num_filter, height/2, width/2, hidden_dim
 
-    self.params['W2'] = np.random.normal(0,self.weight_scale, (num_filters, height//2, width//2, hidden_dim))
+    # (height/2, width/2, num_filter, hidden_dim) for channels-last layers
+    if self.layout == 'NCHW':
+      W2_shape = (num_filters, height//2, width//2, hidden_dim)
+    else:
+      W2_shape = (height//2, width//2, num_filters, hidden_dim)
+    self.params['W2'] = np.random.normal(0,self.weight_scale, W2_shape)
     self.params['b2'] = np.random.normal(0,self.weight_scale, hidden_dim)
 
     self.params['W3'] = np.random.normal(0,self.weight_scale, (hidden_dim,num_classes))
@@ -115,10 +124,13 @@ class ThreeLayerConvNet(object):
     
     # pass conv_param to the forward pass for the convolutional layer
     filter_size = W1.shape[2]
-    conv_param = {'stride': 1, 'pad': (filter_size - 1) // 2}
+    conv_param = {'stride': 1, 'pad': (filter_size - 1) // 2, 'layout': self.layout}
 
     # pass pool_param to the forward pass for the max-pooling layer
-    pool_param = {'pool_height': 2, 'pool_width': 2, 'stride': 2}
+    pool_param = {'pool_height': 2, 'pool_width': 2, 'stride': 2, 'layout': self.layout}
+
+    if self.layout == 'NHWC':
+      X = nchw_to_nhwc(X)
 
     scores = None
     ############################################################################
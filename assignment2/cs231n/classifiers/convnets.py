@@ -317,10 +317,13 @@ class ConvNet_dropout(object):
 class ConvNet_general(object):
     def __init__(self, input_dim=(3,32,32), num_filters=[32,32], filter_size=[7,7],
                  hidden_dim=100, num_classes=10, weight_scale=1e-3, reg=0.0, dropout=0,
-                 dtype=np.float32, seed=None):
+                 dtype=np.float32, seed=None, layout='NCHW'):
         self.params = {}
         self.reg = reg
         self.dtype = dtype
+        #memory layout of the conv layers, the data is given as (N, C, H, W)
+        #either way and transposed once at the input for 'NHWC'
+        self.layout = get_layout({'layout': layout})
         self.D     = input_dim
         num_colors = self.D[0]
         height     = self.D[1]
@@ -345,10 +348,10 @@ class ConvNet_general(object):
             size = self.filter_size[idx]
             if idx == 0:
                 self.params[('W',idx)] = np.random.normal(0,self.weight_scale, (number, num_colors, size, size))
-                self.conv_params[idx]  = {'stride': 1, 'pad': (size - 1) // 2}
+                self.conv_params[idx]  = {'stride': 1, 'pad': (size - 1) // 2, 'layout': self.layout}
             else:
                 self.params[('W',idx)] = np.random.normal(0,self.weight_scale, (number, num_filters[idx-1], size, size))
-                self.conv_params[idx]  = {'stride': 1, 'pad': (size - 1) // 2}
+                self.conv_params[idx]  = {'stride': 1, 'pad': (size - 1) // 2, 'layout': self.layout}
             self.params[('b',idx)] = np.zeros(shape=(number))
 
         self.params[('W', len(num_filters))] = np.random.normal(0, self.weight_scale, (num_filters[-1] * height * width, hidden_dim))
@@ -364,6 +367,8 @@ class ConvNet_general(object):
     def loss(self, X, y=None):
         X = X.astype(self.dtype)
         mode = 'test' if y is None else 'train'
+        if self.layout == 'NHWC':
+            X = nchw_to_nhwc(X)
 
         scores = X
         _cache_layer = {}
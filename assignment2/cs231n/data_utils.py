@@ -1,8 +1,11 @@
 import pickle
 import numpy as np
 import os
+import warnings
 from scipy.misc import imread
 
+from cs231n.checkpoint import Checkpoint, is_checkpoint, list_checkpoints
+
 def load_CIFAR_batch(filename):
   """ load single batch of cifar """
   with open(filename, 'rb') as f:
@@ -28,15 +31,190 @@ def load_CIFAR10(ROOT):
   Xte, Yte = load_CIFAR_batch(os.path.join(ROOT, 'test_batch'))
   return Xtr, Ytr, Xte, Yte
 
+def read_CIFAR_batch_uint8(filename):
+  """ load single batch of cifar as (N, 32, 32, 3) uint8 images """
+  with open(filename, 'rb') as f:
+    datadict = pickle.load(f, encoding='latin1')
+    X = np.asarray(datadict['data'], dtype=np.uint8)
+    X = X.reshape(-1, 3, 32, 32).transpose(0,2,3,1)
+    Y = np.array(datadict['labels'], dtype=np.int64)
+    return X, Y
+
+CIFAR10_NPY_FILES = ('X_train.npy', 'y_train.npy', 'X_test.npy', 'y_test.npy')
+
+def convert_CIFAR10(ROOT, out_dir=None):
+  """
+  One-time conversion of the pickled CIFAR-10 batches to raw .npy files:
+  X_train.npy / X_test.npy hold the (N, 32, 32, 3) uint8 images and
+  y_train.npy / y_test.npy the int64 labels. Each file is written under a
+  temporary name and renamed, so an interrupted conversion leaves no partial
+  file behind.
+
+  Inputs:
+  - ROOT: Directory of the pickled batches (cifar-10-batches-py).
+  - out_dir: Directory of the .npy files; defaults to ROOT/npy.
+
+  Returns:
+  - out_dir
+  """
+  if out_dir is None:
+    out_dir = os.path.join(ROOT, 'npy')
+  if not os.path.isdir(out_dir):
+    os.makedirs(out_dir)
+  xs, ys = zip(*[read_CIFAR_batch_uint8(os.path.join(ROOT, 'data_batch_%d' % (b, )))
+                 for b in range(1,6)])
+  Xte, Yte = read_CIFAR_batch_uint8(os.path.join(ROOT, 'test_batch'))
+  arrays = (np.concatenate(xs), np.concatenate(ys), Xte, Yte)
+  for name, array in zip(CIFAR10_NPY_FILES, arrays):
+    path = os.path.join(out_dir, name)
+    with open(path + '.tmp', 'wb') as f:
+      np.save(f, np.ascontiguousarray(array))
+    os.replace(path + '.tmp', path)
+  return out_dir
+
+
+class LazyArray(object):
+  """
+  A read-only view of an array (typically a np.memmap of uint8 images) that
+  converts to dtype only what is indexed: X[idx] returns a new dtype array
+  holding X.data[idx], so slicing a minibatch out of a memory-mapped dataset
+  reads and converts just that minibatch. Anything that needs the whole
+  array (np.asarray(X), np.mean(X, axis=0), ...) converts all of it.
+  """
+
+  def __init__(self, data, dtype=np.float32):
+    self.data = data
+    self.dtype = np.dtype(dtype)
+
+  @property
+  def shape(self):
+    return self.data.shape
+
+  @property
+  def ndim(self):
+    return self.data.ndim
+
+  @property
+  def size(self):
+    return self.data.size
+
+  def __len__(self):
+    return self.data.shape[0]
+
+  def __getitem__(self, idx):
+    return np.asarray(self.data[idx], dtype=self.dtype)
+
+  def __array__(self, dtype=None, copy=None):
+    return np.asarray(self.data, dtype=self.dtype if dtype is None else dtype)
+
+
+def load_CIFAR10_mmap(ROOT, dtype=np.float32, npy_dir=None):
+  """
+  Load CIFAR-10 from the raw .npy files written by convert_CIFAR10 (which
+  is run first if they do not exist yet). The images are memory-mapped
+  rather than read, so loading is near instant and only the pages that are
+  actually used become resident.
+
+  Inputs:
+  - ROOT: Directory of the pickled batches (cifar-10-batches-py).
+  - dtype: dtype the images are converted to when indexed; None returns the
+    uint8 memmaps themselves.
+  - npy_dir: Directory of the .npy files; defaults to ROOT/npy.
+
+  Returns: A tuple of
+  - X_train: (50000, 32, 32, 3) LazyArray (or uint8 np.memmap) of images
+  - y_train: (50000,) array of labels
+  - X_test: (10000, 32, 32, 3) LazyArray (or uint8 np.memmap) of images
+  - y_test: (10000,) array of labels
+  """
+  if npy_dir is None:
+    npy_dir = os.path.join(ROOT, 'npy')
+  if not all(os.path.exists(os.path.join(npy_dir, name)) for name in CIFAR10_NPY_FILES):
+    convert_CIFAR10(ROOT, npy_dir)
+  Xtr, Ytr, Xte, Yte = [np.load(os.path.join(npy_dir, name), mmap_mode='r')
+                        for name in CIFAR10_NPY_FILES]
+  Ytr, Yte = np.array(Ytr), np.array(Yte)
+  if dtype is not None:
+    Xtr, Xte = LazyArray(Xtr, dtype), LazyArray(Xte, dtype)
+  return Xtr, Ytr, Xte, Yte
+
 
-def get_CIFAR10_data(num_training=49000, num_validation=1000, num_test=1000):
+class NormalizedImages(LazyArray):
+  """
+  A LazyArray of (N, H, W, C) images (typically a uint8 np.memmap) that is
+  served mean-subtracted and transposed to (N, C, H, W): X[idx] converts the
+  indexed images to dtype, subtracts the mean image and returns them channels
+  first, so a Solver only ever holds one normalized minibatch in memory.
+  """
+
+  def __init__(self, data, mean_image, dtype=np.float32):
+    """
+    Inputs:
+    - data: Array of shape (N, H, W, C) of images.
+    - mean_image: Array of shape (H, W, C) subtracted from every image.
+    - dtype: dtype of the normalized images.
+    """
+    super(NormalizedImages, self).__init__(data, dtype)
+    self.mean_image = np.asarray(mean_image, dtype=self.dtype)
+
+  @property
+  def shape(self):
+    N, H, W, C = self.data.shape
+    return (N, C, H, W)
+
+  def __getitem__(self, idx):
+    if isinstance(idx, tuple):
+      # index the images first, then the (C, H, W) axes of the result
+      return self[idx[0]][(slice(None), ) + idx[1:]]
+    X = np.asarray(self.data[idx], dtype=self.dtype)
+    X -= self.mean_image
+    return np.ascontiguousarray(np.moveaxis(X, -1, -3))
+
+  def __array__(self, dtype=None, copy=None):
+    X = self[:]
+    return X if dtype is None else X.astype(dtype)
+
+
+def compute_mean_image(X, batch_size=1000):
+  """ Mean of the images X (N, H, W, C), accumulated batch_size at a time. """
+  total = np.zeros(X.shape[1:])
+  for i in range(0, X.shape[0], batch_size):
+    total += np.sum(X[i:i + batch_size], axis=0, dtype=np.float64)
+  return total / X.shape[0]
+
+
+def get_CIFAR10_data(num_training=49000, num_validation=1000, num_test=1000,
+                     streaming=False, dtype=np.float32):
     """
     Load the CIFAR-10 dataset from disk and perform preprocessing to prepare
     it for classifiers. These are the same steps as we used for the SVM, but
     condensed to a single function.
+
+    With streaming=True nothing is preprocessed up front: the images stay in
+    the memory-mapped uint8 store of load_CIFAR10_mmap, and 'X_train',
+    'X_val' and 'X_test' are NormalizedImages that subtract the mean image
+    and transpose to (N, 3, 32, 32) in dtype for each minibatch they are
+    indexed with. The returned dict is a drop-in for Solver.
     """
-    # Load the raw CIFAR-10 data
     cifar10_dir = 'cs231n/datasets/cifar-10-batches-py'
+    if streaming:
+        X_train, y_train, X_test, y_test = load_CIFAR10_mmap(cifar10_dir, dtype=None)
+        # slices of the memmaps are views: nothing is read yet
+        X_val = X_train[num_training:num_training + num_validation]
+        y_val = y_train[num_training:num_training + num_validation]
+        X_train = X_train[:num_training]
+        y_train = y_train[:num_training]
+        X_test = X_test[:num_test]
+        y_test = y_test[:num_test]
+
+        mean = compute_mean_image(X_train)
+        return {
+          'X_train': NormalizedImages(X_train, mean, dtype), 'y_train': y_train,
+          'X_val': NormalizedImages(X_val, mean, dtype), 'y_val': y_val,
+          'X_test': NormalizedImages(X_test, mean, dtype), 'y_test': y_test,
+        }
+
+    # Load the raw CIFAR-10 data
     X_train, y_train, X_test, y_test = load_CIFAR10(cifar10_dir)
         
     # Subsample the data
@@ -176,24 +354,42 @@ def load_tiny_imagenet(path, dtype=np.float32):
   return class_names, X_train, y_train, X_val, y_val, X_test, y_test
 
 
-def load_models(models_dir):
+def load_models(models_dir, allow_pickle=True):
   """
-  Load saved models from disk. This will attempt to unpickle all files in a
-  directory; any files that give errors on unpickling (such as README.txt) will
-  be skipped.
+  Load saved models from disk. Checkpoints (see cs231n/checkpoint.py) are
+  opened lazily: their model is a Checkpoint, a dictionary-like object that
+  memory-maps every parameter when it is first accessed. Use
+  list_checkpoints to list the models of a directory without opening them.
+
+  Pickled model files are unpickled as well unless allow_pickle=False, which
+  is safer for directories you do not trust since unpickling can run
+  arbitrary code; every file that is not a checkpoint is then skipped with a
+  warning. Any files that give errors on unpickling (such as README.txt) are
+  skipped.
 
   Inputs:
   - models_dir: String giving the path to a directory containing model files.
-    Each model file is a pickled dictionary with a 'model' field.
+    Each model file is a checkpoint or, with allow_pickle, a pickled
+    dictionary with a 'model' field.
+  - allow_pickle: Whether to also load pickled model files (the default, as
+    before checkpoints were added).
 
   Returns:
   A dictionary mapping model file names to models.
   """
   models = {}
   for model_file in os.listdir(models_dir):
-    with open(os.path.join(models_dir, model_file), 'rb') as f:
-      try:
-        models[model_file] = pickle.load(f)['model']
-      except pickle.UnpicklingError:
-        continue
+    path = os.path.join(models_dir, model_file)
+    if is_checkpoint(path):
+      models[model_file] = Checkpoint(path)
+    elif not os.path.isfile(path):
+      continue
+    elif not allow_pickle:
+      warnings.warn('Skipping %s: not a checkpoint, and allow_pickle is False' % path)
+    else:
+      with open(path, 'rb') as f:
+        try:
+          models[model_file] = pickle.load(f)['model']
+        except pickle.UnpicklingError:
+          continue
   return models
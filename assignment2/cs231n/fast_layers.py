@@ -1,13 +1,33 @@
+from collections import OrderedDict
+import time
+
 import numpy as np
 try:
   from cs231n.im2col_cython import col2im_cython, im2col_cython
   from cs231n.im2col_cython import col2im_6d_cython
+  HAS_CYTHON = True
 except ImportError:
+  HAS_CYTHON = False
   print('run the following from the cs231n directory and try again:')
   print('python setup.py build_ext --inplace')
   print('You may also need to restart your iPython kernel')
+  print('(until then the conv layers use the pure numpy implementations)')
+
+# An extension compiled with OpenMP (CS231N_OPENMP=1, see setup.py) provides
+# multithreaded kernels; extensions built before they existed do not.
+HAS_OPENMP = False
+if HAS_CYTHON:
+  try:
+    from cs231n.im2col_cython import HAS_OPENMP
+  except ImportError:
+    pass
+if HAS_OPENMP:
+  from cs231n.im2col_cython import im2col_cython_parallel as im2col_cython
+  from cs231n.im2col_cython import col2im_cython_parallel as col2im_cython
+  from cs231n.im2col_cython import col2im_6d_cython_parallel as col2im_6d_cython
 
 from cs231n.im2col import *
+from cs231n.layers import conv_forward_naive, conv_backward_naive, get_layout
 
 
 def conv_forward_im2col(x, w, b, conv_param):
@@ -48,10 +68,9 @@ def conv_forward_strides(x, w, b, conv_param):
   assert (W + 2 * pad - WW) % stride == 0, 'width does not work'
   assert (H + 2 * pad - HH) % stride == 0, 'height does not work'
 
-  # Pad the input
-  p = pad
-  x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
-  
+  # Pad the input (in a buffer of the workspace, x_cols is a copy)
+  x_padded = workspace.padded(x, pad)
+
   # Figure out output dimensions
   H += 2 * pad
   W += 2 * pad
@@ -96,9 +115,12 @@ def conv_backward_strides(dout, cache):
   dout_reshaped = dout.transpose(1, 0, 2, 3).reshape(F, -1)
   dw = dout_reshaped.dot(x_cols.T).reshape(w.shape)
 
-  dx_cols = w.reshape(F, -1).T.dot(dout_reshaped)
-  dx_cols.shape = (C, HH, WW, N, out_h, out_w)
-  dx = col2im_6d_cython(dx_cols, N, C, H, W, HH, WW, pad, stride)
+  dx_cols = _dx_cols(w.reshape(F, -1).T, dout_reshaped)
+  dx_cols = dx_cols.reshape(C, HH, WW, N, out_h, out_w)
+  if HAS_CYTHON:
+    dx = col2im_6d_cython(dx_cols, N, C, H, W, HH, WW, pad, stride)
+  else:
+    dx = col2im_6d(dx_cols, N, C, H, W, HH, WW, pad, stride, workspace=workspace)
 
   return dx, dw, db
 
@@ -117,7 +139,7 @@ def conv_backward_im2col(dout, cache):
   dout_reshaped = dout.transpose(1, 2, 3, 0).reshape(num_filters, -1)
   dw = dout_reshaped.dot(x_cols.T).reshape(w.shape)
 
-  dx_cols = w.reshape(num_filters, -1).T.dot(dout_reshaped)
+  dx_cols = _dx_cols(w.reshape(num_filters, -1).T, dout_reshaped)
   # dx = col2im_indices(dx_cols, x.shape, filter_height, filter_width, pad, stride)
   dx = col2im_cython(dx_cols, x.shape[0], x.shape[1], x.shape[2], x.shape[3],
                      filter_height, filter_width, pad, stride)
@@ -125,31 +147,537 @@ def conv_backward_im2col(dout, cache):
   return dx, dw, db
 
 
-conv_forward_fast = conv_forward_strides
-conv_backward_fast = conv_backward_strides
+def conv_forward_numpy(x, w, b, conv_param):
+  """
+  A pure numpy implementation of the forward pass for a convolutional layer:
+  the receptive fields are a strided view of the padded input, which
+  np.tensordot contracts with the filters. Needs no compiled extension.
 
+  Inputs and outputs are the same as conv_forward_naive, except that the
+  cache is (x, w, b, conv_param, x_padded).
+  """
+  N, C, H, W = x.shape
+  F, _, HH, WW = w.shape
+  stride, pad = conv_param['stride'], conv_param['pad']
 
-def max_pool_forward_fast(x, pool_param):
+  # Check dimensions
+  assert (W + 2 * pad - WW) % stride == 0, 'width does not work'
+  assert (H + 2 * pad - HH) % stride == 0, 'height does not work'
+
+  p = pad
+  x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+  windows = _conv_windows(x_padded, HH, WW, stride)
+
+  # (N, out_h, out_w, F)
+  out = np.tensordot(windows, w, axes=([1, 4, 5], [1, 2, 3]))
+  out += b
+  out = np.ascontiguousarray(out.transpose(0, 3, 1, 2))
+
+  cache = (x, w, b, conv_param, x_padded)
+  return out, cache
+
+
+def conv_backward_numpy(dout, cache):
   """
-  A fast implementation of the forward pass for a max pooling layer.
+  A pure numpy implementation of the backward pass for a convolutional layer.
 
-  This chooses between the reshape method and the im2col method. If the pooling
-  regions are square and tile the input image, then we can use the reshape
-  method which is very fast. Otherwise we fall back on the im2col method, which
-  is not much faster than the naive method.
+  Inputs:
+  - dout: Upstream derivatives.
+  - cache: A tuple of (x, w, b, conv_param, x_padded) as in conv_forward_numpy
+
+  Returns a tuple of:
+  - dx: Gradient with respect to x
+  - dw: Gradient with respect to w
+  - db: Gradient with respect to b
   """
+  x, w, b, conv_param, x_padded = cache
+  stride, pad = conv_param['stride'], conv_param['pad']
   N, C, H, W = x.shape
-  pool_height, pool_width = pool_param['pool_height'], pool_param['pool_width']
-  stride = pool_param['stride']
+  F, _, HH, WW = w.shape
+
+  db = np.sum(dout, axis=(0, 2, 3))
+
+  windows = _conv_windows(x_padded, HH, WW, stride)
+  dw = np.tensordot(dout, windows, axes=([0, 2, 3], [0, 2, 3]))
+
+  # (C, HH, WW, N, out_h, out_w), the layout of col2im_6d
+  dx_cols = np.tensordot(w, dout, axes=([0], [1]))
+  dx = col2im_6d(dx_cols, N, C, H, W, HH, WW, pad, stride)
+
+  return dx, dw, db
+
+
+def _conv_windows(x_padded, field_height, field_width, stride):
+  """
+  Read-only view of shape (N, C, out_h, out_w, field_height, field_width) of
+  the receptive fields of a padded input.
+  """
+  N, C, H, W = x_padded.shape
+  out_h = (H - field_height) // stride + 1
+  out_w = (W - field_width) // stride + 1
+  s = x_padded.strides
+  return np.lib.stride_tricks.as_strided(
+      x_padded, shape=(N, C, out_h, out_w, field_height, field_width),
+      strides=(s[0], s[1], stride * s[2], stride * s[3], s[2], s[3]),
+      writeable=False)
+
+
+# Winograd F(2x2, 3x3) transforms: a 2x2 output tile is
+# AT . [(G . g . G^T) * (BT . d . BT^T)] . AT^T for a 4x4 input tile d and a
+# 3x3 filter g, with 16 multiplications instead of 36.
+WINOGRAD_BT = np.array([[1, 0, -1, 0],
+                        [0, 1, 1, 0],
+                        [0, -1, 1, 0],
+                        [0, 1, 0, -1]], dtype=np.float64)
+WINOGRAD_G = np.array([[1, 0, 0],
+                       [0.5, 0.5, 0.5],
+                       [0.5, -0.5, 0.5],
+                       [0, 0, 1]], dtype=np.float64)
+WINOGRAD_AT = np.array([[1, 1, 1, 0],
+                        [0, 1, -1, -1]], dtype=np.float64)
+
+
+def conv_forward_winograd(x, w, b, conv_param):
+  """
+  The forward pass for a convolutional layer with 3x3 filters and stride 1,
+  using Winograd's minimal filtering algorithm F(2x2, 3x3).
+
+  The padded input is split into overlapping 4x4 tiles (one per 2x2 block of
+  the output); tiles and filters are mapped to the 4x4 Winograd domain, where
+  the convolution is 16 independent matrix products over channels, and the
+  products are mapped back to 2x2 output blocks. The tile transforms only
+  add and subtract strided slices of the input.
+
+  Inputs and outputs are the same as conv_forward_naive, except that the
+  cache is (x, w, b, conv_param, U, V): the transformed filters and tiles.
+  """
+  N, C, H, W = x.shape
+  F, _, HH, WW = w.shape
+  stride, pad = conv_param['stride'], conv_param['pad']
+  if not conv_backend_supported('winograd', w.shape, conv_param):
+    raise ValueError('Winograd convolution needs 3x3 filters and stride 1')
+
+  out_h, out_w, tiles_h, tiles_w = _winograd_dims(H, W, pad)
+  dtype = np.result_type(x, w)
+
+  # channel-major and zero-padded to a whole number of tiles, so that the
+  # transformed tiles come out as (C, N * tiles_h * tiles_w) matrices
+  x_padded = np.zeros((C, N, 2 * tiles_h + 2, 2 * tiles_w + 2), dtype=dtype)
+  x_padded[:, :, pad:pad + H, pad:pad + W] = x.transpose(1, 0, 2, 3)
+  tiles = [[x_padded[:, :, i:i + 2 * tiles_h:2, j:j + 2 * tiles_w:2]
+            for j in range(4)] for i in range(4)]
+
+  # (4, 4, F, C) and (4, 4, C, N * tiles_h * tiles_w)
+  U = np.einsum('ai,fcij,bj->abfc', WINOGRAD_G, w, WINOGRAD_G).astype(dtype)
+  V = np.array(_winograd_transform_2d(WINOGRAD_BT, tiles)).reshape(4, 4, C, -1)
+
+  M = np.matmul(U, V)
+  Y = _winograd_transform_2d(WINOGRAD_AT, [[M[a, b] for b in range(4)] for a in range(4)])
+
+  out = np.empty((N, F, 2 * tiles_h, 2 * tiles_w), dtype=dtype)
+  for i in range(2):
+    for j in range(2):
+      out[:, :, i::2, j::2] = Y[i][j].reshape(F, N, tiles_h, tiles_w).transpose(1, 0, 2, 3)
+  out = out[:, :, :out_h, :out_w] + b.reshape(1, -1, 1, 1)
+
+  cache = (x, w, b, conv_param, U, V)
+  return out, cache
+
+
+def conv_backward_winograd(dout, cache):
+  """
+  The backward pass for a convolutional layer computed by
+  conv_forward_winograd; every step of the forward pass is linear, so the
+  gradients go back through the transposed transforms.
+
+  Inputs:
+  - dout: Upstream derivatives.
+  - cache: A tuple of (x, w, b, conv_param, U, V) as in conv_forward_winograd
+
+  Returns a tuple of:
+  - dx: Gradient with respect to x
+  - dw: Gradient with respect to w
+  - db: Gradient with respect to b
+  """
+  x, w, b, conv_param, U, V = cache
+  pad = conv_param['pad']
+  N, C, H, W = x.shape
+  F = w.shape[0]
+  out_h, out_w, tiles_h, tiles_w = _winograd_dims(H, W, pad)
+  dtype = U.dtype
+
+  db = np.sum(dout, axis=(0, 2, 3))
+
+  # 2x2 blocks of dout as (F, N * tiles_h * tiles_w) matrices
+  dout_padded = np.zeros((F, N, 2 * tiles_h, 2 * tiles_w), dtype=dtype)
+  dout_padded[:, :, :out_h, :out_w] = dout.transpose(1, 0, 2, 3)
+  dY = [[dout_padded[:, :, i::2, j::2] for j in range(2)] for i in range(2)]
+  dM = np.array(_winograd_transform_2d(WINOGRAD_AT.T, dY)).reshape(4, 4, F, -1)
+
+  dU = np.matmul(dM, V.transpose(0, 1, 3, 2))
+  dw = np.einsum('ak,abfc,bl->fckl', WINOGRAD_G, dU, WINOGRAD_G).astype(dtype)
+
+  dV = np.matmul(U.transpose(0, 1, 3, 2), dM)
+  dtiles = _winograd_transform_2d(WINOGRAD_BT.T, [[dV[a, b] for b in range(4)]
+                                                  for a in range(4)])
+  dx_padded = np.zeros((C, N, 2 * tiles_h + 2, 2 * tiles_w + 2), dtype=dtype)
+  for i in range(4):
+    for j in range(4):
+      dx_padded[:, :, i:i + 2 * tiles_h:2, j:j + 2 * tiles_w:2] += \
+          dtiles[i][j].reshape(C, N, tiles_h, tiles_w)
+  dx = np.ascontiguousarray(dx_padded[:, :, pad:pad + H, pad:pad + W].transpose(1, 0, 2, 3))
+
+  return dx, dw, db
+
+
+def _winograd_dims(H, W, pad):
+  out_h = H + 2 * pad - 2
+  out_w = W + 2 * pad - 2
+  return out_h, out_w, (out_h + 1) // 2, (out_w + 1) // 2
+
+
+def _winograd_transform_2d(mat, blocks):
+  """
+  mat . blocks . mat^T for a square grid (nested list) of equally shaped
+  arrays; returns the grid [a][b] of sum_ij mat[a, i] * mat[b, j] * blocks[i][j].
+  """
+  size = len(blocks)
+  # along the first index, then along the second
+  cols = [_winograd_transform(mat, [blocks[i][j] for i in range(size)])
+          for j in range(size)]
+  return [_winograd_transform(mat, [cols[j][a] for j in range(size)])
+          for a in range(mat.shape[0])]
+
+
+def _winograd_transform(mat, arrays):
+  """
+  [sum_i mat[a, i] * arrays[i] for every row a of mat], skipping the zeros of
+  mat and multiplying only by coefficients other than +-1.
+  """
+  out = []
+  for row in mat.tolist():
+    acc = None
+    for coef, array in zip(row, arrays):
+      if coef == 0:
+        continue
+      if acc is None:
+        acc = coef * array
+      elif coef == 1:
+        acc += array
+      elif coef == -1:
+        acc -= array
+      else:
+        acc += coef * array
+    out.append(acc)
+  return out
+
+
+def conv_forward_fft(x, w, b, conv_param):
+  """
+  The forward pass for a convolutional layer with stride 1 computed with the
+  FFT: the cost does not grow with the filter size, so this pays off for
+  large filters.
+
+  Each input and filter channel is transformed once (np.fft.rfft2 at the
+  padded input size); the correlation is then a product over channels at
+  every frequency.
+
+  Inputs and outputs are the same as conv_forward_naive, except that the
+  cache is (x, w, b, conv_param, x_hat, w_hat): the transformed input and
+  filters.
+  """
+  N, C, H, W = x.shape
+  F, _, HH, WW = w.shape
+  stride, pad = conv_param['stride'], conv_param['pad']
+  if not conv_backend_supported('fft', w.shape, conv_param):
+    raise ValueError('FFT convolution needs stride 1')
+
+  size = (H + 2 * pad, W + 2 * pad)
+  out_h, out_w = size[0] - HH + 1, size[1] - WW + 1
+  p = pad
+  x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+
+  x_hat = np.fft.rfft2(x_padded, s=size)
+  w_hat = np.fft.rfft2(w, s=size)
+  # (h, w, N, C) x (h, w, C, F): a correlation multiplies by the conjugate
+  out_hat = np.matmul(x_hat.transpose(2, 3, 0, 1), w_hat.conj().transpose(2, 3, 1, 0))
+  out = np.fft.irfft2(out_hat.transpose(2, 3, 0, 1), s=size)[:, :, :out_h, :out_w]
+  out = out.astype(np.result_type(x, w), copy=False) + b.reshape(1, -1, 1, 1)
+
+  cache = (x, w, b, conv_param, x_hat, w_hat)
+  return out, cache
+
+
+def conv_backward_fft(dout, cache):
+  """
+  The backward pass for a convolutional layer computed by conv_forward_fft.
+
+  Inputs:
+  - dout: Upstream derivatives.
+  - cache: A tuple of (x, w, b, conv_param, x_hat, w_hat) as in
+    conv_forward_fft
+
+  Returns a tuple of:
+  - dx: Gradient with respect to x
+  - dw: Gradient with respect to w
+  - db: Gradient with respect to b
+  """
+  x, w, b, conv_param, x_hat, w_hat = cache
+  pad = conv_param['pad']
+  N, C, H, W = x.shape
+  F, _, HH, WW = w.shape
+  size = (H + 2 * pad, W + 2 * pad)
+  dtype = np.result_type(x, w)
+
+  db = np.sum(dout, axis=(0, 2, 3))
 
-  same_size = pool_height == pool_width == stride
-  tiles = H % pool_height == 0 and W % pool_width == 0
-  if same_size and tiles:
-    out, reshape_cache = max_pool_forward_reshape(x, pool_param)
-    cache = ('reshape', reshape_cache)
+  dout_hat = np.fft.rfft2(dout, s=size).transpose(2, 3, 0, 1)
+
+  # dw correlates the input with dout: (h, w, F, N) x (h, w, N, C)
+  dw_hat = np.matmul(dout_hat.conj().transpose(0, 1, 3, 2), x_hat.transpose(2, 3, 0, 1))
+  dw = np.fft.irfft2(dw_hat.transpose(2, 3, 0, 1), s=size)[:, :, :HH, :WW]
+
+  # dx convolves dout with the filters: (h, w, N, F) x (h, w, F, C)
+  dx_hat = np.matmul(dout_hat, w_hat.transpose(2, 3, 0, 1))
+  dx = np.fft.irfft2(dx_hat.transpose(2, 3, 0, 1), s=size)[:, :, pad:pad + H, pad:pad + W]
+
+  return dx.astype(dtype, copy=False), dw.astype(dtype, copy=False), db
+
+
+def conv_forward_nhwc(x, w, b, conv_param):
+  """
+  The forward pass for a convolutional layer on channels-last images.
+
+  With the channels innermost, the receptive fields of a strided view of the
+  padded input reshape straight into the rows of an im2col matrix, and the
+  rows of its product with the filters already are the output in NHWC order,
+  so no transposes of the data are needed.
+
+  Inputs:
+  - x: Input data of shape (N, H, W, C)
+  - w: Filter weights of shape (F, C, HH, WW), as for the NCHW layers
+  - b: Biases, of shape (F,)
+  - conv_param: As for conv_forward_naive
+
+  Returns a tuple of:
+  - out: Output data, of shape (N, H', W', F)
+  - cache: (x, w, b, conv_param, x_cols)
+  """
+  N, H, W, C = x.shape
+  F, _, HH, WW = w.shape
+  stride, pad = conv_param['stride'], conv_param['pad']
+
+  # Check dimensions
+  assert (W + 2 * pad - WW) % stride == 0, 'width does not work'
+  assert (H + 2 * pad - HH) % stride == 0, 'height does not work'
+
+  out_h = (H + 2 * pad - HH) // stride + 1
+  out_w = (W + 2 * pad - WW) // stride + 1
+  p = pad
+  x_padded = np.pad(x, ((0, 0), (p, p), (p, p), (0, 0)), mode='constant')
+  s = x_padded.strides
+  windows = np.lib.stride_tricks.as_strided(
+      x_padded, shape=(N, out_h, out_w, HH, WW, C),
+      strides=(s[0], stride * s[1], stride * s[2], s[1], s[2], s[3]),
+      writeable=False)
+  x_cols = windows.reshape(N * out_h * out_w, HH * WW * C)
+
+  w_cols = w.transpose(2, 3, 1, 0).reshape(HH * WW * C, F)
+  out = x_cols.dot(w_cols) + b
+  out = out.reshape(N, out_h, out_w, F)
+
+  cache = (x, w, b, conv_param, x_cols)
+  return out, cache
+
+
+def conv_backward_nhwc(dout, cache):
+  """
+  The backward pass for a convolutional layer on channels-last images.
+
+  Inputs:
+  - dout: Upstream derivatives, of shape (N, H', W', F)
+  - cache: A tuple of (x, w, b, conv_param, x_cols) as in conv_forward_nhwc
+
+  Returns a tuple of:
+  - dx: Gradient with respect to x, of shape (N, H, W, C)
+  - dw: Gradient with respect to w, of shape (F, C, HH, WW)
+  - db: Gradient with respect to b
+  """
+  x, w, b, conv_param, x_cols = cache
+  stride, pad = conv_param['stride'], conv_param['pad']
+  N, H, W, C = x.shape
+  F, _, HH, WW = w.shape
+  _, out_h, out_w, _ = dout.shape
+
+  dout_cols = dout.reshape(-1, F)
+  db = np.sum(dout_cols, axis=0)
+
+  dw = x_cols.T.dot(dout_cols).reshape(HH, WW, C, F)
+  dw = np.ascontiguousarray(dw.transpose(3, 2, 0, 1))
+
+  w_cols = w.transpose(2, 3, 1, 0).reshape(HH * WW * C, F)
+  dx_cols = dout_cols.dot(w_cols.T).reshape(N, out_h, out_w, HH, WW, C)
+  dx_padded = np.zeros((N, H + 2 * pad, W + 2 * pad, C), dtype=dx_cols.dtype)
+  for ii in range(HH):
+    for jj in range(WW):
+      dx_padded[:, ii:ii + stride * out_h:stride,
+                jj:jj + stride * out_w:stride, :] += dx_cols[:, :, :, ii, jj, :]
+  dx = dx_padded[:, pad:pad + H, pad:pad + W, :]
+
+  return dx, dw, db
+
+
+def conv_backend_supported(name, w_shape, conv_param):
+  """
+  Whether the conv backend name (a key of CONV_BACKENDS) can compute a layer
+  with filters of shape w_shape and conv_param.
+  """
+  stride = conv_param['stride']
+  if name == 'winograd':
+    return tuple(w_shape[2:]) == (3, 3) and stride == 1
+  if name == 'fft':
+    return stride == 1
+  return name in CONV_BACKENDS
+
+
+# The conv backends conv_forward_auto chooses from: name -> (forward, backward)
+CONV_BACKENDS = OrderedDict()
+if HAS_CYTHON:
+  CONV_BACKENDS['im2col'] = (conv_forward_im2col, conv_backward_im2col)
+CONV_BACKENDS['strides'] = (conv_forward_strides, conv_backward_strides)
+CONV_BACKENDS['numpy'] = (conv_forward_numpy, conv_backward_numpy)
+CONV_BACKENDS['winograd'] = (conv_forward_winograd, conv_backward_winograd)
+CONV_BACKENDS['fft'] = (conv_forward_fft, conv_backward_fft)
+CONV_BACKENDS['naive'] = (conv_forward_naive, conv_backward_naive)
+
+# The naive backend is only timed for outputs of at most this many numbers;
+# on anything larger its Python loops cannot win and timing them is slow.
+NAIVE_MAX_OUTPUTS = 512
+
+# Every candidate is timed this many times (keeping the best time), so that
+# the first run of a backend paying for page faults does not decide
+AUTOTUNE_REPEATS = 2
+
+# (x shape without the batch size, x dtype, w shape, stride, pad, whether the
+# naive backend is a candidate) -> name of the fastest backend. The batch size
+# only enters through the last item, so that a layer is tuned once for all
+# the batch sizes it sees (e.g. the last, smaller batch of check_accuracy).
+_conv_backend_cache = {}
+
+
+def conv_forward_auto(x, w, b, conv_param):
+  """
+  The forward pass for a convolutional layer through the fastest of
+  CONV_BACKENDS for these shapes.
+
+  The first call for a layer geometry (input shape apart from the batch size,
+  filter shape, stride and pad) runs the forward and backward pass of every
+  backend that supports it (see conv_backend_supported) on the inputs and
+  remembers the fastest; later calls go straight to it, whatever their batch
+  size (except that batches small enough to time the naive backend on are
+  tuned separately, see NAIVE_MAX_OUTPUTS).
+
+  Channels-last layers (conv_param['layout'] of 'NHWC', see get_layout) all
+  go to conv_forward_nhwc.
+
+  Inputs and outputs are the same as conv_forward_naive, except that the
+  cache is (name of the backend, cache of that backend).
+  """
+  if get_layout(conv_param) == 'NHWC':
+    out, real_cache = conv_forward_nhwc(x, w, b, conv_param)
+    return out, ('nhwc', real_cache)
+  key = _conv_key(x.shape, x.dtype, w.shape, conv_param)
+  method = _conv_backend_cache.get(key)
+  if method is None:
+    method, out, real_cache = _tune_conv(x, w, b, conv_param)
+    _conv_backend_cache[key] = method
   else:
-    out, im2col_cache = max_pool_forward_im2col(x, pool_param)
-    cache = ('im2col', im2col_cache)
+    out, real_cache = CONV_BACKENDS[method][0](x, w, b, conv_param)
+  return out, (method, real_cache)
+
+
+def conv_backward_auto(dout, cache):
+  """
+  The backward pass for a convolutional layer, through the backend that
+  computed the forward pass in conv_forward_auto.
+  """
+  method, real_cache = cache
+  if method == 'nhwc':
+    return conv_backward_nhwc(dout, real_cache)
+  if method not in CONV_BACKENDS:
+    raise ValueError('Unrecognized method "%s"' % method)
+  return CONV_BACKENDS[method][1](dout, real_cache)
+
+
+def conv_backend(x_shape, w_shape, conv_param, dtype=np.float64):
+  """
+  Name of the backend conv_forward_auto has chosen for these shapes, or None
+  if it has not seen them yet.
+  """
+  return _conv_backend_cache.get(_conv_key(x_shape, dtype, w_shape, conv_param))
+
+
+def clear_conv_backend_cache():
+  """ Forget the backends chosen by conv_forward_auto. """
+  _conv_backend_cache.clear()
+
+
+def _conv_key(x_shape, dtype, w_shape, conv_param):
+  return (tuple(x_shape[1:]), np.dtype(dtype).str, tuple(w_shape),
+          conv_param['stride'], conv_param['pad'],
+          _naive_candidate(x_shape, w_shape, conv_param))
+
+
+def _naive_candidate(x_shape, w_shape, conv_param):
+  N, C, H, W = x_shape
+  F, _, HH, WW = w_shape
+  stride, pad = conv_param['stride'], conv_param['pad']
+  out_size = N * F * ((H + 2 * pad - HH) // stride + 1) * ((W + 2 * pad - WW) // stride + 1)
+  return out_size <= NAIVE_MAX_OUTPUTS
+
+
+def _tune_conv(x, w, b, conv_param):
+  naive_candidate = _naive_candidate(x.shape, w.shape, conv_param)
+  best = None
+  for name, (forward, backward) in CONV_BACKENDS.items():
+    if name == 'naive' and not naive_candidate:
+      continue
+    if not conv_backend_supported(name, w.shape, conv_param):
+      continue
+    elapsed = float('inf')
+    for _ in range(AUTOTUNE_REPEATS):
+      start = time.perf_counter()
+      out, cache = forward(x, w, b, conv_param)
+      backward(np.ones_like(out), cache)
+      elapsed = min(elapsed, time.perf_counter() - start)
+    if best is None or elapsed < best[0]:
+      best = (elapsed, name, out, cache)
+  return best[1:]
+
+
+def _dx_cols(w_t, dout_reshaped):
+  """ w_t.dot(dout_reshaped), in a buffer of the workspace. """
+  dx_cols = workspace.buffer('dx_cols', (w_t.shape[0], dout_reshaped.shape[1]),
+                             np.result_type(w_t, dout_reshaped))
+  return np.dot(w_t, dout_reshaped, out=dx_cols)
+
+
+conv_forward_fast = conv_forward_auto
+conv_backward_fast = conv_backward_auto
+
+
+def max_pool_forward_fast(x, pool_param):
+  """
+  A fast implementation of the forward pass for a max pooling layer.
+
+  This uses the strided method, which handles any window and stride
+  (overlapping windows included) and is faster than the reshape method even
+  for square pooling regions that tile the input (see
+  benchmarks/max_pool.py); it also keeps a much smaller cache. It supports
+  both layouts (pool_param['layout'], see get_layout).
+  """
+  out, strided_cache = max_pool_forward_strided(x, pool_param)
+  cache = ('strided', strided_cache)
   return out, cache
 
 
@@ -157,12 +685,14 @@ def max_pool_backward_fast(dout, cache):
   """
   A fast implementation of the backward pass for a max pooling layer.
 
-  This switches between the reshape method an the im2col method depending on
+  This switches between the reshape, strided and im2col methods depending on
   which method was used to generate the cache.
   """
   method, real_cache = cache
   if method == 'reshape':
     return max_pool_backward_reshape(dout, real_cache)
+  elif method == 'strided':
+    return max_pool_backward_strided(dout, real_cache)
   elif method == 'im2col':
     return max_pool_backward_im2col(dout, real_cache)
   else:
@@ -221,6 +751,100 @@ def max_pool_backward_reshape(dout, cache):
   return dx
 
 
+def max_pool_forward_strided(x, pool_param):
+  """
+  A pure numpy implementation of the forward pass for max pooling with any
+  window and stride, overlapping windows included.
+
+  The running maximum is taken over one strided slice of x per position in
+  the pooling window, so nothing larger than the output is allocated. The
+  cache holds the position of the maximum in every window as a compact
+  offset (int8 for windows of up to 128 elements) rather than x itself.
+
+  Inputs and outputs are the same as max_pool_forward_naive (with x of shape
+  (N, H, W, C) if pool_param['layout'] is 'NHWC'), except that the cache is
+  (x shape, argmax offsets, pool_param).
+  """
+  layout = get_layout(pool_param)
+  if layout == 'NCHW':
+    N, C, H, W = x.shape
+  else:
+    N, H, W, C = x.shape
+  pool_height, pool_width = pool_param['pool_height'], pool_param['pool_width']
+  stride = pool_param['stride']
+
+  out_height = (H - pool_height) // stride + 1
+  out_width = (W - pool_width) // stride + 1
+  offset_dtype = np.int8 if pool_height * pool_width <= 128 else np.int32
+
+  out = np.array(_spatial_slice(x, layout, slice(0, stride * out_height, stride),
+                                slice(0, stride * out_width, stride)))
+  argmax = np.zeros(out.shape, dtype=offset_dtype)
+  for ii in range(pool_height):
+    for jj in range(pool_width):
+      if ii == jj == 0:
+        continue
+      window = _spatial_slice(x, layout, slice(ii, ii + stride * out_height, stride),
+                              slice(jj, jj + stride * out_width, stride))
+      # strictly greater: ties keep the first maximum, as np.argmax does
+      mask = window > out
+      np.copyto(out, window, where=mask)
+      np.copyto(argmax, ii * pool_width + jj, where=mask)
+
+  cache = (x.shape, argmax, pool_param)
+  return out, cache
+
+
+def max_pool_backward_strided(dout, cache):
+  """
+  A pure numpy implementation of the backward pass for max pooling.
+
+  Every upstream derivative is routed to the maximum of its window with a
+  single np.bincount, which also sums the derivatives of overlapping windows
+  that share a maximum.
+
+  Inputs:
+  - dout: Upstream derivatives
+  - cache: A tuple of (x shape, argmax offsets, pool_param) as in
+    max_pool_forward_strided.
+
+  Returns:
+  - dx: Gradient with respect to x
+  """
+  x_shape, argmax, pool_param = cache
+  pool_width, stride = pool_param['pool_width'], pool_param['stride']
+
+  # flat index in x of the top-left corner of every window, and the distance
+  # between neighbouring rows / columns of x
+  if get_layout(pool_param) == 'NCHW':
+    N, C, H, W = x_shape
+    _, _, out_height, out_width = argmax.shape
+    corner = (np.arange(N * C).reshape(-1, 1, 1) * (H * W) +
+              np.arange(out_height).reshape(-1, 1) * (stride * W) +
+              np.arange(out_width) * stride)
+    row_step, col_step = W, 1
+  else:
+    N, H, W, C = x_shape
+    _, out_height, out_width, _ = argmax.shape
+    corner = (np.arange(N).reshape(-1, 1, 1, 1) * (H * W * C) +
+              np.arange(out_height).reshape(-1, 1, 1) * (stride * W * C) +
+              np.arange(out_width).reshape(-1, 1) * (stride * C) +
+              np.arange(C))
+    row_step, col_step = W * C, C
+  argmax = argmax.reshape(corner.shape).astype(np.intp)
+  index = corner + argmax // pool_width * row_step + argmax % pool_width * col_step
+
+  dx = np.bincount(index.ravel(), weights=dout.ravel(), minlength=N * C * H * W)
+  return dx.reshape(x_shape).astype(dout.dtype, copy=False)
+
+
+def _spatial_slice(x, layout, rows, cols):
+  """ x[:, :, rows, cols] for NCHW images, x[:, rows, cols, :] for NHWC. """
+  if layout == 'NCHW':
+    return x[:, :, rows, cols]
+  return x[:, rows, cols, :]
+
+
 def max_pool_forward_im2col(x, pool_param):
   """
   An implementation of the forward pass for max pooling based on im2col.
@@ -239,7 +863,8 @@ def max_pool_forward_im2col(x, pool_param):
   out_width = (W - pool_width) // stride + 1
 
   x_split = x.reshape(N * C, 1, H, W)
-  x_cols = im2col(x_split, pool_height, pool_width, padding=0, stride=stride)
+  x_cols = im2col_indices(x_split, pool_height, pool_width, padding=0,
+                          stride=stride, workspace=workspace)
   x_cols_argmax = np.argmax(x_cols, axis=0)
   x_cols_max = x_cols[x_cols_argmax, np.arange(x_cols.shape[1])]
   out = x_cols_max.reshape(out_height, out_width, N, C).transpose(2, 3, 0, 1)
@@ -264,7 +889,7 @@ def max_pool_backward_im2col(dout, cache):
   dx_cols = np.zeros_like(x_cols)
   dx_cols[x_cols_argmax, np.arange(dx_cols.shape[1])] = dout_reshaped
   dx = col2im_indices(dx_cols, (N * C, 1, H, W), pool_height, pool_width,
-              padding=0, stride=stride)
+              padding=0, stride=stride, workspace=workspace)
   dx = dx.reshape(x.shape)
 
   return dx
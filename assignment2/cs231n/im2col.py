@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import numpy as np
 
 
@@ -6,8 +8,8 @@ def get_im2col_indices(x_shape, field_height, field_width, padding=1, stride=1):
   N, C, H, W = x_shape
   assert (H + 2 * padding - field_height) % stride == 0
   assert (W + 2 * padding - field_height) % stride == 0
-  out_height = (H + 2 * padding - field_height) / stride + 1
-  out_width = (W + 2 * padding - field_width) / stride + 1
+  out_height = (H + 2 * padding - field_height) // stride + 1
+  out_width = (W + 2 * padding - field_width) // stride + 1
 
   i0 = np.repeat(np.arange(field_height), field_width)
   i0 = np.tile(i0, C)
@@ -22,14 +24,22 @@ def get_im2col_indices(x_shape, field_height, field_width, padding=1, stride=1):
   return (k, i, j)
 
 
-def im2col_indices(x, field_height, field_width, padding=1, stride=1):
-  """ An implementation of im2col based on some fancy indexing """
+def im2col_indices(x, field_height, field_width, padding=1, stride=1,
+                   workspace=None):
+  """
+  An implementation of im2col based on some fancy indexing. With a Workspace
+  the index tensors and the padded input are reused across calls.
+  """
   # Zero-pad the input
-  p = padding
-  x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
-
-  k, i, j = get_im2col_indices(x.shape, field_height, field_width, padding,
-                               stride)
+  if workspace is None:
+    p = padding
+    x_padded = np.pad(x, ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+    k, i, j = get_im2col_indices(x.shape, field_height, field_width, padding,
+                                 stride)
+  else:
+    x_padded = workspace.padded(x, padding)
+    k, i, j = workspace.indices(x.shape, field_height, field_width, padding,
+                                stride)
 
   cols = x_padded[:, k, i, j]
   C = x.shape[1]
@@ -38,18 +48,178 @@ def im2col_indices(x, field_height, field_width, padding=1, stride=1):
 
 
 def col2im_indices(cols, x_shape, field_height=3, field_width=3, padding=1,
-                   stride=1):
-  """ An implementation of col2im based on fancy indexing and np.add.at """
+                   stride=1, workspace=None):
+  """
+  An implementation of col2im based on fancy indexing and np.add.at. With a
+  Workspace the index tensors and the padded accumulator are reused across
+  calls.
+  """
   N, C, H, W = x_shape
   H_padded, W_padded = H + 2 * padding, W + 2 * padding
-  x_padded = np.zeros((N, C, H_padded, W_padded), dtype=cols.dtype)
-  k, i, j = get_im2col_indices(x_shape, field_height, field_width, padding,
-                               stride)
+  if workspace is None:
+    x_padded = np.zeros((N, C, H_padded, W_padded), dtype=cols.dtype)
+    k, i, j = get_im2col_indices(x_shape, field_height, field_width, padding,
+                                 stride)
+  else:
+    x_padded = workspace.zeros('col2im', (N, C, H_padded, W_padded), cols.dtype)
+    k, i, j = workspace.indices(x_shape, field_height, field_width, padding,
+                                stride)
   cols_reshaped = cols.reshape(C * field_height * field_width, -1, N)
   cols_reshaped = cols_reshaped.transpose(2, 0, 1)
   np.add.at(x_padded, (slice(None), k, i, j), cols_reshaped)
-  if padding == 0:
+  return _unpad(x_padded, padding, workspace)
+
+
+def col2im_6d(cols, N, C, H, W, field_height, field_width, padding, stride,
+              workspace=None):
+  """
+  A numpy version of col2im_6d_cython: sums columns of shape
+  (C, field_height, field_width, N, out_height, out_width) back into an array
+  of shape (N, C, H, W), adding one strided slice per position in the field.
+  With a Workspace the padded accumulator is reused across calls.
+  """
+  out_height = (H + 2 * padding - field_height) // stride + 1
+  out_width = (W + 2 * padding - field_width) // stride + 1
+  shape = (N, C, H + 2 * padding, W + 2 * padding)
+  if workspace is None:
+    x_padded = np.zeros(shape, dtype=cols.dtype)
+  else:
+    x_padded = workspace.zeros('col2im', shape, cols.dtype)
+  cols = cols.transpose(3, 0, 1, 2, 4, 5)
+  for ii in range(field_height):
+    for jj in range(field_width):
+      x_padded[:, :, ii:ii + stride * out_height:stride,
+               jj:jj + stride * out_width:stride] += cols[:, :, ii, jj]
+  return _unpad(x_padded, padding, workspace)
+
+
+def _unpad(x_padded, padding, workspace):
+  if padding > 0:
+    x_padded = x_padded[:, :, padding:-padding, padding:-padding]
+  if workspace is not None:
+    # the workspace buffer is reused by the next call
+    x_padded = x_padded.copy()
+  return x_padded
+
+
+class Workspace(object):
+  """
+  Buffers and im2col index tensors kept across the forward and backward
+  passes of the conv and pool layers, keyed by their shape, so that a
+  training loop (where every iteration sees the same shapes) stops
+  reallocating them.
+
+  Only scratch memory lives in a workspace: a buffer it hands out is valid
+  until the next request for the same key, so nothing that outlives a layer
+  call (outputs, caches) is ever stored in one. Buffers are evicted least
+  recently used first once their total size exceeds max_bytes.
+
+  The counters allocations / reuses / evictions (see stats) show how much
+  allocation the workspace saves.
+
+  Example:
+    workspace = Workspace()
+    cols = im2col_indices(x, 3, 3, padding=1, stride=1, workspace=workspace)
+    print(workspace.stats())
+  """
+
+  def __init__(self, max_bytes=2**28):
+    """
+    Inputs:
+    - max_bytes: Size cap of the buffers kept. A single buffer larger than
+      this is handed out but not kept.
+    """
+    self.max_bytes = max_bytes
+    self.allocations = 0
+    self.reuses = 0
+    self.evictions = 0
+    self._buffers = OrderedDict()
+    self._nbytes = 0
+
+  def buffer(self, name, shape, dtype):
+    """
+    An uninitialized array of the given shape and dtype, reused by every
+    request with the same name, shape and dtype.
+    """
+    return self._get((name, tuple(shape), np.dtype(dtype).str),
+                     lambda: np.empty(shape, dtype=dtype))
+
+  def zeros(self, name, shape, dtype):
+    """ Like buffer, but filled with zeros. """
+    buf = self.buffer(name, shape, dtype)
+    buf.fill(0)
+    return buf
+
+  def padded(self, x, padding):
+    """
+    x of shape (N, C, H, W) zero-padded by padding pixels on both sides of
+    its last two dimensions (as np.pad), in a reused buffer: the border is
+    zeroed once, when the buffer is created, and only the inside is copied.
+    """
+    N, C, H, W = x.shape
+    p = padding
+    shape = (N, C, H + 2 * p, W + 2 * p)
+    x_padded = self._get(('padded', x.shape, x.dtype.str, p),
+                         lambda: np.zeros(shape, dtype=x.dtype))
+    x_padded[:, :, p:p + H, p:p + W] = x
     return x_padded
-  return x_padded[:, :, padding:-padding, padding:-padding]
+
+  def indices(self, x_shape, field_height, field_width, padding=1, stride=1):
+    """
+    get_im2col_indices(x_shape, ...), computed once per shape. The index
+    tensors do not depend on the batch size and are read-only.
+    """
+    def compute():
+      indices = get_im2col_indices(x_shape, field_height, field_width,
+                                   padding, stride)
+      for index in indices:
+        index.flags.writeable = False
+      return indices
+    return self._get(('indices', tuple(x_shape[1:]), field_height, field_width,
+                      padding, stride), compute)
+
+  def stats(self):
+    """
+    Dictionary with the number of allocations, reuses and evictions so far
+    and the number and total size in bytes of the entries kept.
+    """
+    return {'allocations': self.allocations, 'reuses': self.reuses,
+            'evictions': self.evictions, 'entries': len(self._buffers),
+            'nbytes': self._nbytes}
+
+  def clear(self):
+    """ Drop every buffer (the counters are kept). """
+    self._buffers.clear()
+    self._nbytes = 0
+
+  def _get(self, key, create):
+    if key in self._buffers:
+      self._buffers.move_to_end(key)
+      self.reuses += 1
+      return self._buffers[key]
+
+    value = create()
+    self.allocations += 1
+    nbytes = _nbytes(value)
+    if nbytes > self.max_bytes:
+      return value
+    self._buffers[key] = value
+    self._nbytes += nbytes
+    while self._nbytes > self.max_bytes:
+      _, evicted = self._buffers.popitem(last=False)
+      self._nbytes -= _nbytes(evicted)
+      self.evictions += 1
+    return value
+
+
+def _nbytes(value):
+  if isinstance(value, tuple):
+    return sum(v.nbytes for v in value)
+  return value.nbytes
+
+
+# The workspace of the layers in fast_layers.py
+workspace = Workspace()
+
 
 pass
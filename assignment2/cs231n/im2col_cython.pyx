@@ -1,6 +1,21 @@
 import numpy as np
 cimport numpy as np
 cimport cython
+from cython.parallel cimport prange
+
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #define CS231N_HAVE_OPENMP 1
+    #else
+    #define CS231N_HAVE_OPENMP 0
+    #endif
+    """
+    int CS231N_HAVE_OPENMP
+
+# Whether the extension was compiled with OpenMP (see setup.py); without it
+# the *_parallel kernels run on one thread.
+HAS_OPENMP = bool(CS231N_HAVE_OPENMP)
 
 # DTYPE = np.float64
 # ctypedef np.float64_t DTYPE_t
@@ -16,8 +31,8 @@ def im2col_cython(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
     cdef int H = x.shape[2]
     cdef int W = x.shape[3]
     
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
 
     cdef int p = padding
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.pad(x,
@@ -47,7 +62,7 @@ cdef int im2col_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
             for xx in range(WW):
                 for ii in range(field_height):
                     for jj in range(field_width):
-                        row = c * field_width * field_height + ii * field_height + jj
+                        row = c * field_width * field_height + ii * field_width + jj
                         for i in range(N):
                             col = yy * WW * N + xx * N + i
                             cols[row, col] = x_padded[i, c, stride * yy + ii, stride * xx + jj]
@@ -57,8 +72,8 @@ cdef int im2col_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
 def col2im_cython(np.ndarray[DTYPE_t, ndim=2] cols, int N, int C, int H, int W,
                   int field_height, int field_width, int padding, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int HH = (H + 2 * padding - field_height) / stride + 1
-    cdef int WW = (W + 2 * padding - field_width) / stride + 1
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * padding, W + 2 * padding),
                                         dtype=cols.dtype)
 
@@ -81,7 +96,7 @@ cdef int col2im_cython_inner(np.ndarray[DTYPE_t, ndim=2] cols,
     for c in range(C):
         for ii in range(field_height):
             for jj in range(field_width):
-                row = c * field_width * field_height + ii * field_height + jj
+                row = c * field_width * field_height + ii * field_width + jj
                 for yy in range(HH):
                     for xx in range(WW):
                         for i in range(N):
@@ -109,8 +124,8 @@ cdef col2im_6d_cython_inner(np.ndarray[DTYPE_t, ndim=6] cols,
 def col2im_6d_cython(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int W,
         int HH, int WW, int pad, int stride):
     cdef np.ndarray x = np.empty((N, C, H, W), dtype=cols.dtype)
-    cdef int out_h = (H + 2 * pad - HH) / stride + 1
-    cdef int out_w = (W + 2 * pad - WW) / stride + 1
+    cdef int out_h = (H + 2 * pad - HH) // stride + 1
+    cdef int out_w = (W + 2 * pad - WW) // stride + 1
     cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad),
                                                   dtype=cols.dtype)
 
@@ -118,4 +133,128 @@ def col2im_6d_cython(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int
 
     if pad > 0:
         return x_padded[:, :, pad:-pad, pad:-pad]
-    return x_padded 
+    return x_padded
+
+
+# Parallel versions of the kernels above. The loops are split over
+# (image, channel) pairs across OpenMP threads (set OMP_NUM_THREADS to choose
+# how many), with the GIL released. Every pair writes its own part of the
+# output, so the threads need no synchronization.
+
+def im2col_cython_parallel(np.ndarray[DTYPE_t, ndim=4] x, int field_height,
+                           int field_width, int padding, int stride):
+    cdef int N = x.shape[0]
+    cdef int C = x.shape[1]
+    cdef int H = x.shape[2]
+    cdef int W = x.shape[3]
+
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
+
+    cdef int p = padding
+    cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.pad(x,
+            ((0, 0), (0, 0), (p, p), (p, p)), mode='constant')
+
+    cdef np.ndarray[DTYPE_t, ndim=2] cols = np.empty(
+            (C * field_height * field_width, N * HH * WW),
+            dtype=x.dtype)
+
+    cdef DTYPE_t[:, ::1] cols_view = cols
+    cdef DTYPE_t[:, :, :, ::1] x_padded_view = x_padded
+    im2col_parallel_inner(cols_view, x_padded_view, N, C, HH, WW,
+                          field_height, field_width, stride)
+    return cols
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void im2col_parallel_inner(DTYPE_t[:, ::1] cols,
+                                DTYPE_t[:, :, :, ::1] x_padded,
+                                int N, int C, int HH, int WW,
+                                int field_height, int field_width, int stride) noexcept nogil:
+    cdef int ic, i, c, ii, jj, row, yy, xx
+
+    # image-major, so that neighbouring threads fill different rows of cols
+    for ic in prange(N * C, schedule='static'):
+        i = ic // C
+        c = ic % C
+        for ii in range(field_height):
+            for jj in range(field_width):
+                row = c * field_width * field_height + ii * field_width + jj
+                for yy in range(HH):
+                    for xx in range(WW):
+                        cols[row, yy * WW * N + xx * N + i] = \
+                            x_padded[i, c, stride * yy + ii, stride * xx + jj]
+
+
+def col2im_cython_parallel(np.ndarray[DTYPE_t, ndim=2] cols, int N, int C, int H, int W,
+                           int field_height, int field_width, int padding, int stride):
+    cdef int HH = (H + 2 * padding - field_height) // stride + 1
+    cdef int WW = (W + 2 * padding - field_width) // stride + 1
+    cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * padding, W + 2 * padding),
+                                        dtype=cols.dtype)
+
+    cdef DTYPE_t[:, :] cols_view = cols
+    cdef DTYPE_t[:, :, :, ::1] x_padded_view = x_padded
+    col2im_parallel_inner(cols_view, x_padded_view, N, C, HH, WW,
+                          field_height, field_width, stride)
+    if padding > 0:
+        return x_padded[:, :, padding:-padding, padding:-padding]
+    return x_padded
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void col2im_parallel_inner(DTYPE_t[:, :] cols,
+                                DTYPE_t[:, :, :, ::1] x_padded,
+                                int N, int C, int HH, int WW,
+                                int field_height, int field_width, int stride) noexcept nogil:
+    cdef int ic, i, c, ii, jj, row, yy, xx
+
+    for ic in prange(N * C, schedule='static'):
+        i = ic // C
+        c = ic % C
+        for ii in range(field_height):
+            for jj in range(field_width):
+                row = c * field_width * field_height + ii * field_width + jj
+                for yy in range(HH):
+                    for xx in range(WW):
+                        x_padded[i, c, stride * yy + ii, stride * xx + jj] += \
+                            cols[row, yy * WW * N + xx * N + i]
+
+
+def col2im_6d_cython_parallel(np.ndarray[DTYPE_t, ndim=6] cols, int N, int C, int H, int W,
+        int HH, int WW, int pad, int stride):
+    cdef int out_h = (H + 2 * pad - HH) // stride + 1
+    cdef int out_w = (W + 2 * pad - WW) // stride + 1
+    cdef np.ndarray[DTYPE_t, ndim=4] x_padded = np.zeros((N, C, H + 2 * pad, W + 2 * pad),
+                                                  dtype=cols.dtype)
+
+    cdef DTYPE_t[:, :, :, :, :, :] cols_view = cols
+    cdef DTYPE_t[:, :, :, ::1] x_padded_view = x_padded
+    col2im_6d_parallel_inner(cols_view, x_padded_view, N, C, HH, WW, out_h, out_w, stride)
+
+    if pad > 0:
+        return x_padded[:, :, pad:-pad, pad:-pad]
+    return x_padded
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void col2im_6d_parallel_inner(DTYPE_t[:, :, :, :, :, :] cols,
+                                   DTYPE_t[:, :, :, ::1] x_padded,
+                                   int N, int C, int HH, int WW,
+                                   int out_h, int out_w, int stride) noexcept nogil:
+    cdef int nc, n, c, hh, ww, h, w
+
+    for nc in prange(N * C, schedule='static'):
+        n = nc // C
+        c = nc % C
+        for hh in range(HH):
+            for ww in range(WW):
+                for h in range(out_h):
+                    for w in range(out_w):
+                        x_padded[n, c, stride * h + hh, stride * w + ww] += cols[c, hh, ww, n, h, w]
@@ -91,7 +91,8 @@ def conv_relu_forward(x, w, b, conv_param):
   A convenience layer that performs a convolution followed by a ReLU.
 
   Inputs:
-  - x: Input to the convolutional layer
+  - x: Input to the convolutional layer, of shape (N, H, W, C) if
+    conv_param['layout'] is 'NHWC'
   - w, b, conv_param: Weights and parameters for the convolutional layer
   
   Returns a tuple of:
@@ -119,9 +120,11 @@ def conv_relu_pool_forward(x, w, b, conv_param, pool_param):
   Convenience layer that performs a convolution, a ReLU, and a pool.
 
   Inputs:
-  - x: Input to the convolutional layer
+  - x: Input to the convolutional layer, of shape (N, H, W, C) if
+    conv_param['layout'] is 'NHWC'
   - w, b, conv_param: Weights and parameters for the convolutional layer
-  - pool_param: Parameters for the pooling layer
+  - pool_param: Parameters for the pooling layer, with the same 'layout' as
+    conv_param
 
   Returns a tuple of:
   - out: Output from the pooling layer
@@ -699,12 +699,34 @@ def max_pool_backward_naive(dout, cache):
   return dx
 
 
+def get_layout(param):
+  """
+  The memory layout of the images a conv / pool / spatial batchnorm layer
+  works on, from the 'layout' key of its conv_param / pool_param / bn_param:
+  'NCHW' (the default, channels first) or 'NHWC' (channels last).
+  """
+  layout = param.get('layout', 'NCHW')
+  if layout not in ('NCHW', 'NHWC'):
+    raise ValueError('Invalid layout "%s"' % layout)
+  return layout
+
+
+def nchw_to_nhwc(x):
+  """ Contiguous copy of images of shape (N, C, H, W) as (N, H, W, C). """
+  return np.ascontiguousarray(x.transpose(0, 2, 3, 1))
+
+
+def nhwc_to_nchw(x):
+  """ Contiguous copy of images of shape (N, H, W, C) as (N, C, H, W). """
+  return np.ascontiguousarray(x.transpose(0, 3, 1, 2))
+
+
 def spatial_batchnorm_forward(x, gamma, beta, bn_param):
   """
   Computes the forward pass for spatial batch normalization.
   
   Inputs:
-  - x: Input data of shape (N, C, H, W)
+  - x: Input data of shape (N, C, H, W), or (N, H, W, C) with the NHWC layout
   - gamma: Scale parameter, of shape (C,)
   - beta: Shift parameter, of shape (C,)
   - bn_param: Dictionary with the following keys:
@@ -716,9 +738,10 @@ def spatial_batchnorm_forward(x, gamma, beta, bn_param):
       default of momentum=0.9 should work well in most situations.
     - running_mean: Array of shape (D,) giving running mean of features
     - running_var Array of shape (D,) giving running variance of features
+    - layout: 'NCHW' (default) or 'NHWC', see get_layout
     
   Returns a tuple of:
-  - out: Output data, of shape (N, C, H, W)
+  - out: Output data, of the shape of x
   - cache: Values needed for the backward pass
   """
   out, cache = None, None
@@ -730,7 +753,13 @@ def spatial_batchnorm_forward(x, gamma, beta, bn_param):
   # version of batch normalization defined above. Your implementation should  #
   # be very short; ours is less than five lines.                              #
   #############################################################################
-  N, C, H, W = x.shape
+  # statistics over every axis but the channels
+  if get_layout(bn_param) == 'NCHW':
+    N, C, H, W = x.shape
+    axes, shape = (0,2,3), (1,C,1,1)
+  else:
+    N, H, W, C = x.shape
+    axes, shape = (0,1,2), (1,1,1,C)
   mode = bn_param['mode']
   eps  = bn_param.get('eps', 1e-5)
   momentum = bn_param.get('momentum', 0.9)
@@ -739,24 +768,24 @@ def spatial_batchnorm_forward(x, gamma, beta, bn_param):
   running_var  = bn_param.get('running_var', np.ones(C, dtype=x.dtype))
 
   x_hat = np.zeros_like(x)
-  mu  = np.zeros((1,C,1,1))
-  var = np.zeros((1,C,1,1))
-  gamma = gamma.reshape(1,C,1,1)
-  beta  = beta.reshape(1,C,1,1)
+  mu  = np.zeros(shape)
+  var = np.zeros(shape)
+  gamma = gamma.reshape(shape)
+  beta  = beta.reshape(shape)
 
   if mode == 'train':
-    mu  = np.mean(x, axis=(0,2,3)).reshape(1, C, 1, 1)
-    var = np.var(x, axis=(0,2,3)).reshape(1, C, 1, 1)
+    mu  = np.mean(x, axis=axes).reshape(shape)
+    var = np.var(x, axis=axes).reshape(shape)
     x_hat = (x - mu) / np.sqrt(var + eps)
     out = gamma * x_hat + beta
     running_mean = momentum * running_mean + (1. - momentum) * mu.reshape(-1)
     running_var  = momentum * running_var  + (1. - momentum) * var.reshape(-1)
 
   elif mode == 'test':
-    mu  = running_mean.reshape(1, C, 1, 1)
-    var = running_var.reshape(1, C, 1, 1)
+    mu  = running_mean.reshape(shape)
+    var = running_var.reshape(shape)
     x_hat = (x - mu) / np.sqrt(var + eps)
-    out = gamma.reshape(1, C, 1, 1) * x_hat + beta.reshape(1, C, 1, 1)
+    out = gamma * x_hat + beta
   else:
     raise ValueError('Invalid mode, %s' % mode)
 
@@ -774,29 +803,35 @@ def spatial_batchnorm_backward(dout, cache):
   Computes the backward pass for spatial batch normalization.
   
   Inputs:
-  - dout: Upstream derivatives, of shape (N, C, H, W)
+  - dout: Upstream derivatives, of shape (N, C, H, W) or (N, H, W, C) with
+    the NHWC layout
   - cache: Values from the forward pass
   
   Returns a tuple of:
-  - dx: Gradient with respect to inputs, of shape (N, C, H, W)
+  - dx: Gradient with respect to inputs, of the shape of dout
   - dgamma: Gradient with respect to scale parameter, of shape (C,)
   - dbeta: Gradient with respect to shift parameter, of shape (C,)
   """
   dx, dgamma, dbeta = None, None, None
   mean, var, x_hat, gamma, beta, bn_param  = cache
 
-  N, C, H, W = dout.shape
+  if get_layout(bn_param) == 'NCHW':
+    N, C, H, W = dout.shape
+    axes, shape = (0,2,3), (1,C,1,1)
+  else:
+    N, H, W, C = dout.shape
+    axes, shape = (0,1,2), (1,1,1,C)
   dx     = np.zeros((dout.shape))
   dgamma = np.zeros_like(gamma)
   dbeta  = np.zeros_like(beta)
 
-  dgamma = np.sum(dout * x_hat, axis=(0,2,3))
-  dbeta  = np.sum(dout, axis=(0,2,3))
+  dgamma = np.sum(dout * x_hat, axis=axes)
+  dbeta  = np.sum(dout, axis=axes)
 
-  sigma  = np.sqrt(var).reshape(1,C,1,1)
-  dx_hat = gamma.reshape(1,C,1,1) * dout
-  dvar   = -0.5 * np.mean(dx_hat * x_hat, axis=(0,2,3)).reshape(1,C,1,1) / var
-  dmean  = -1. *  np.mean(dx_hat, axis=(0,2,3)).reshape(1,C,1,1) / sigma
+  sigma  = np.sqrt(var).reshape(shape)
+  dx_hat = gamma.reshape(shape) * dout
+  dvar   = -0.5 * np.mean(dx_hat * x_hat, axis=axes).reshape(shape) / var
+  dmean  = -1. *  np.mean(dx_hat, axis=axes).reshape(shape) / sigma
 
   dx = dx_hat / sigma + dvar * 2 * x_hat * sigma + dmean
 
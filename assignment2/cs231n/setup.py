@@ -1,8 +1,53 @@
+"""
+Build the im2col_cython extension from this directory with
+
+  python setup.py build_ext --inplace
+
+Set CS231N_OPENMP=1 to compile it with OpenMP, so that the *_parallel kernels
+run on several threads (as many as OMP_NUM_THREADS):
+
+  CS231N_OPENMP=1 python setup.py build_ext --inplace
+
+If the compiler cannot build with OpenMP (e.g. Apple clang without libomp),
+the extension is built without it and the parallel kernels run on one thread.
+"""
+
+import os
+
 from distutils.core import setup
+from distutils.command.build_ext import build_ext
+from distutils.errors import CompileError, LinkError
 from distutils.extension import Extension
 from Cython.Build import cythonize
 import numpy
 
+USE_OPENMP = os.environ.get('CS231N_OPENMP', '0') not in ('', '0')
+
+
+class BuildExt(build_ext):
+  """ Adds the OpenMP flags if asked to, and builds without them if they fail. """
+
+  def build_extensions(self):
+    if USE_OPENMP:
+      flag = '/openmp' if self.compiler.compiler_type == 'msvc' else '-fopenmp'
+      for ext in self.extensions:
+        ext.extra_compile_args.append(flag)
+        if self.compiler.compiler_type != 'msvc':
+          ext.extra_link_args.append(flag)
+      try:
+        build_ext.build_extensions(self)
+        return
+      except (CompileError, LinkError):
+        print('Building with OpenMP failed, building without it')
+        for ext in self.extensions:
+          ext.extra_compile_args.remove(flag)
+          if flag in ext.extra_link_args:
+            ext.extra_link_args.remove(flag)
+        # objects compiled with the flag must not be linked without it
+        self.force = True
+    build_ext.build_extensions(self)
+
+
 extensions = [
   Extension('im2col_cython', ['im2col_cython.pyx'],
             include_dirs = [numpy.get_include()]
@@ -11,4 +56,5 @@ extensions = [
 
 setup(
     ext_modules = cythonize(extensions),
+    cmdclass = {'build_ext': BuildExt},
 )
@@ -1,6 +1,7 @@
 import numpy as np
 
 from cs231n import optim
+from cs231n.checkpoint import Checkpoint, save_checkpoint
 
 
 class Solver(object):
@@ -99,6 +100,10 @@ class Solver(object):
       iterations.
     - verbose: Boolean; if set to false then no output will be printed during
       training.
+    - checkpoint_name: If not None, train() saves a checkpoint (see
+      save_checkpoint) to checkpoint_name + '_iter_<iteration>.ckpt' every
+      checkpoint_every iterations of the run.
+    - checkpoint_every: Iterations between checkpoints; default is one epoch.
     """
     self.model = model
     self.X_train = data['X_train']
@@ -115,6 +120,8 @@ class Solver(object):
 
     self.print_every = kwargs.pop('print_every', 10)
     self.verbose = kwargs.pop('verbose', True)
+    self.checkpoint_name = kwargs.pop('checkpoint_name', None)
+    self.checkpoint_every = kwargs.pop('checkpoint_every', None)
     self.current_location = 0
 
     # Throw an error if there are extra keyword arguments
@@ -145,6 +152,10 @@ class Solver(object):
     self.val_acc_history = []
     self.epoch_losses = {}
     self.current_location = 0
+    self.order = np.arange(self.X_train.shape[0])
+    # iterations done by the run of train() in progress (0 between runs);
+    # saved in checkpoints, so that a restored run continues from there
+    self._run_iteration = 0
 
     # Make a deep copy of the optim_config for each parameter
     self.optim_configs = {}
@@ -206,8 +217,12 @@ class Solver(object):
 
   def _step_shuffled(self):
     num_train = self.X_train.shape[0]
-    X_batch = self.X_train[self.current_location:self.current_location + self.batch_size]
-    y_batch = self.y_train[self.current_location:self.current_location + self.batch_size]
+    # the data is visited in the order of a permutation of its indices, which
+    # works for arrays and for datasets that load minibatches on demand
+    # (e.g. get_CIFAR10_data(streaming=True)) alike
+    batch_mask = self.order[self.current_location:self.current_location + self.batch_size]
+    X_batch = self.X_train[batch_mask]
+    y_batch = self.y_train[batch_mask]
     self.current_location = self.current_location + self.batch_size
 
     # Compute loss and gradient
@@ -218,13 +233,8 @@ class Solver(object):
       self.current_location = 0
       if self.verbose:
         print("Shuffling Training Data (end of epoch task);")
-      #shuffle the dataset
-      rng_state = np.random.get_state()
-      X_train = np.random.permutation(self.X_train)
-      np.random.set_state(rng_state)
-      y_train = np.random.permutation(self.y_train)
-      #shuffle is wrong (all entries;)
-      #permute does it along the first index
+      #shuffle the dataset (the order in which it is visited)
+      self.order = np.random.permutation(num_train)
 
     #epoch_losses are the found losses per epoch
     current_epoch = self.epoch_losses.get(self.epoch, [])
@@ -239,6 +249,67 @@ class Solver(object):
       self.model.params[p] = next_w
       self.optim_configs[p] = next_config
 
+  def save_checkpoint(self, filename):
+    """
+    Save the state of the optimization (model parameters, best parameters,
+    optimizer state, position in the epoch and histories) as a checkpoint
+    (see cs231n/checkpoint.py), so that training can be resumed with
+    load_checkpoint.
+    """
+    arrays = {'order': self.order}
+    for p, w in self.model.params.items():
+      arrays['params/%s' % p] = w
+    for p, w in self.best_params.items():
+      arrays['best_params/%s' % p] = w
+    optim_configs = {}
+    for p, config in self.optim_configs.items():
+      optim_configs[p] = {}
+      for k, v in config.items():
+        if isinstance(v, np.ndarray):
+          arrays['optim/%s/%s' % (p, k)] = v
+        else:
+          optim_configs[p][k] = _to_json(v)
+    meta = {
+      'epoch': self.epoch,
+      'run_iteration': self._run_iteration,
+      'current_location': self.current_location,
+      'best_val_acc': _to_json(self.best_val_acc),
+      'loss_history': [_to_json(v) for v in self.loss_history],
+      'train_acc_history': [_to_json(v) for v in self.train_acc_history],
+      'val_acc_history': [_to_json(v) for v in self.val_acc_history],
+      'epoch_losses': dict((str(e), [_to_json(v) for v in losses])
+                           for e, losses in self.epoch_losses.items()),
+      'optim_configs': optim_configs,
+    }
+    save_checkpoint(filename, arrays, meta)
+
+  def load_checkpoint(self, filename):
+    """
+    Restore the state saved by save_checkpoint. For a checkpoint saved in the
+    middle of train() (see checkpoint_name), the next call of train() finishes
+    that run; otherwise it trains for num_epochs, as usual. The arrays are
+    memory-mapped copy-on-write, so nothing is read from disk until it is
+    used.
+    """
+    checkpoint = Checkpoint(filename, mode='c')
+    meta = checkpoint.meta
+    self.model.params.update(checkpoint.to_dict('params/'))
+    self.best_params = checkpoint.to_dict('best_params/')
+    self.order = checkpoint['order']
+    self.epoch = meta['epoch']
+    self.current_location = meta['current_location']
+    self.best_val_acc = meta['best_val_acc']
+    self.loss_history = list(meta['loss_history'])
+    self.train_acc_history = list(meta['train_acc_history'])
+    self.val_acc_history = list(meta['val_acc_history'])
+    self.epoch_losses = dict((int(e), list(losses))
+                             for e, losses in meta['epoch_losses'].items())
+    self.optim_configs = {}
+    for p, config in meta['optim_configs'].items():
+      self.optim_configs[p] = dict(config)
+      self.optim_configs[p].update(checkpoint.to_dict('optim/%s/' % p))
+    self._run_iteration = meta.get('run_iteration', 0)
+
   def check_accuracy(self, X, y, num_samples=None, batch_size=100):
     """
     Check accuracy of the model on the provided data.
@@ -287,8 +358,10 @@ class Solver(object):
     num_train = self.X_train.shape[0]
     iterations_per_epoch = max(num_train // self.batch_size, 1)
     num_iterations = self.num_epochs * iterations_per_epoch
+    checkpoint_every = self.checkpoint_every or iterations_per_epoch
 
-    for t in range(num_iterations):
+    # continue where a restored checkpoint (see load_checkpoint) stopped
+    for t in range(self._run_iteration, num_iterations):
       #self._step()
       self._step_shuffled()
 
@@ -327,6 +400,17 @@ class Solver(object):
           for k, v in self.model.params.items():
             self.best_params[k] = v.copy()
 
+      # Back to 0 at the end of the run, so that its last checkpoint starts a
+      # new run when restored.
+      self._run_iteration = (t + 1) % num_iterations
+      if self.checkpoint_name is not None and (t + 1) % checkpoint_every == 0:
+        self.save_checkpoint('%s_iter_%d.ckpt' % (self.checkpoint_name, t + 1))
+
+    self._run_iteration = 0
     # At the end of training swap the best params into the model
     self.model.params = self.best_params
 
+
+def _to_json(v):
+  """ Python scalar for a numpy scalar (JSON cannot store numpy types). """
+  return v.item() if isinstance(v, np.generic) else v
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 2 root):
+python -m py.test tests/test_checkpoint.py -vv -s -q
+python -m py.test tests/test_checkpoint.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_checkpoint.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import os
+import pickle
+
+import pytest
+import numpy as np
+
+from cs231n.checkpoint import (Checkpoint, save_checkpoint, read_header,
+                               list_checkpoints, is_checkpoint, ALIGNMENT)
+from cs231n.data_utils import load_models
+from cs231n.classifiers.fc_net import TwoLayerNet
+from cs231n.solver import Solver
+
+
+def test_assert():
+    assert 1
+
+@pytest.fixture(scope='function')
+def arrays():
+    return {
+        'W1': np.random.randn(7, 5),
+        'b1': np.zeros(5, dtype=np.float32),
+        'W2': np.asfortranarray(np.random.randn(5, 3)),
+        'steps': np.array(12),
+        'mask': np.random.rand(3, 4) > 0.5,
+        'empty': np.zeros((0, 4)),
+    }
+
+def test_checkpoint_roundtrip(arrays, tmp_path):
+    filename = str(tmp_path / 'model.ckpt')
+    save_checkpoint(filename, arrays, meta={'reg': 0.1, 'hidden_dims': [5]})
+    assert is_checkpoint(filename)
+
+    checkpoint = Checkpoint(filename)
+    assert checkpoint.meta == {'reg': 0.1, 'hidden_dims': [5]}
+    assert sorted(checkpoint.keys()) == sorted(arrays.keys())
+    for name, value in arrays.items():
+        assert checkpoint[name].dtype == value.dtype
+        assert np.array_equal(checkpoint[name], value)
+    assert isinstance(checkpoint['W1'], np.memmap)
+    assert checkpoint.shapes()['W1'] == (7, 5)
+
+    header = read_header(filename)
+    for entry in header['arrays'].values():
+        assert (header['data_start'] + entry['offset']) % ALIGNMENT == 0
+
+def test_checkpoint_read_only(arrays, tmp_path):
+    filename = str(tmp_path / 'model.ckpt')
+    save_checkpoint(filename, arrays)
+    with pytest.raises(ValueError):
+        Checkpoint(filename)['W1'][0, 0] = 1.0
+
+    #copy-on-write: the change is not written back
+    W1 = Checkpoint(filename, mode='c')['W1']
+    W1 += 1
+    assert np.array_equal(Checkpoint(filename)['W1'], arrays['W1'])
+
+def test_checkpoint_invalid(tmp_path):
+    with pytest.raises(ValueError):
+        save_checkpoint(str(tmp_path / 'a.ckpt'), {'x': np.array([{}, None])})
+    with open(str(tmp_path / 'b.ckpt'), 'wb') as f:
+        f.write(b'not a checkpoint')
+    with pytest.raises(ValueError):
+        Checkpoint(str(tmp_path / 'b.ckpt'))
+
+    #a truncated file is detected when it is opened
+    save_checkpoint(str(tmp_path / 'c.ckpt'), {'x': np.ones(100)})
+    with open(str(tmp_path / 'c.ckpt'), 'r+b') as f:
+        f.truncate(os.path.getsize(str(tmp_path / "c.ckpt")) - 100)
+    with pytest.raises(ValueError):
+        Checkpoint(str(tmp_path / 'c.ckpt'))
+
+def test_list_checkpoints_and_load_models(arrays, tmp_path):
+    save_checkpoint(str(tmp_path / 'a.ckpt'), arrays, meta={'epoch': 3})
+    save_checkpoint(str(tmp_path / 'b.ckpt'), {'W': np.ones(3)})
+    with open(str(tmp_path / 'README.txt'), 'w') as f:
+        f.write('models')
+    with open(str(tmp_path / 'old.p'), 'wb') as f:
+        pickle.dump({'model': {'W': np.ones(2)}}, f)
+
+    listing = list_checkpoints(str(tmp_path))
+    assert sorted(listing) == ['a.ckpt', 'b.ckpt']
+    assert listing['a.ckpt']['meta'] == {'epoch': 3}
+    assert listing['a.ckpt']['shapes']['W1'] == (7, 5)
+
+    models = load_models(str(tmp_path))
+    assert sorted(models) == ['a.ckpt', 'b.ckpt', 'old.p']
+    assert np.array_equal(models['a.ckpt']['W1'], arrays['W1'])
+    assert np.array_equal(models['old.p']['W'], np.ones(2))
+
+    #every skipped file is reported
+    with pytest.warns(UserWarning) as record:
+        models = load_models(str(tmp_path), allow_pickle=False)
+    assert sorted(models) == ['a.ckpt', 'b.ckpt']
+    assert sorted(os.path.basename(str(w.message).split(':')[0])
+                  for w in record) == ['README.txt', 'old.p']
+
+def make_solver(**kwargs):
+    np.random.seed(6)
+    data = {'X_train': np.random.randn(20, 6), 'y_train': np.random.randint(3, size=20),
+            'X_val': np.random.randn(10, 6), 'y_val': np.random.randint(3, size=10)}
+    model = TwoLayerNet(input_dim=6, hidden_dim=5, num_classes=3, weight_scale=1e-1)
+    return Solver(model, data, batch_size=10, num_epochs=2, verbose=False,
+                  update_rule='adam', optim_config={'learning_rate': 1e-2}, **kwargs)
+
+def test_solver_train_again():
+    #a second train() call trains for num_epochs more
+    solver = make_solver()
+    solver.train()
+    assert len(solver.loss_history) == 4
+    solver.train()
+    assert len(solver.loss_history) == 8
+
+def test_solver_resume(tmp_path):
+    #a 2 epoch run of 2 iterations each, with a checkpoint after every epoch
+    checkpoint_name = str(tmp_path / 'solver')
+    reference = make_solver(checkpoint_name=checkpoint_name)
+    reference.train()
+    assert sorted(os.listdir(str(tmp_path))) == ['solver_iter_2.ckpt', 'solver_iter_4.ckpt']
+
+    #restored from the middle of the run, a new solver finishes the run exactly
+    #as the uninterrupted one did (the next epoch's order is in the checkpoint)
+    resumed = make_solver()
+    resumed.load_checkpoint(checkpoint_name + '_iter_2.ckpt')
+    assert resumed.epoch == 1 and len(resumed.loss_history) == 2
+    assert isinstance(resumed.optim_configs['W1']['m'], np.memmap)
+    resumed.train()
+    assert len(resumed.loss_history) == 4 and resumed.epoch == 2
+    assert resumed.loss_history == reference.loss_history
+    assert resumed.val_acc_history == reference.val_acc_history
+    for k in reference.model.params:
+        assert np.array_equal(resumed.model.params[k], reference.model.params[k])
+
+    #a checkpoint of a finished run starts a new run, as train() does again
+    finished = make_solver()
+    finished.load_checkpoint(checkpoint_name + '_iter_4.ckpt')
+    assert len(finished.loss_history) == 4
+    finished.train()
+    assert len(finished.loss_history) == 8
+    finished.save_checkpoint(str(tmp_path / 'finished.ckpt'))
+    finished = make_solver()
+    finished.load_checkpoint(str(tmp_path / 'finished.ckpt'))
+    finished.train()
+    assert len(finished.loss_history) == 12
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 2 root):
+python -m py.test tests/test_data_utils.py -vv -s -q
+python -m py.test tests/test_data_utils.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_data_utils.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import pytest
+import numpy as np
+
+from cs231n.data_utils         import get_CIFAR10_data, NormalizedImages, compute_mean_image
+from cs231n.classifiers.fc_net import TwoLayerNet
+from cs231n.solver             import Solver
+
+
+def test_assert():
+    assert 1
+
+@pytest.fixture(scope='module')
+def images():
+    return np.random.RandomState(0).randint(0, 256, size=(50, 8, 8, 3)).astype(np.uint8)
+
+def test_normalized_images(images):
+    mean = compute_mean_image(images, batch_size=7)
+    assert np.allclose(mean, np.mean(images.astype(np.float64), axis=0))
+
+    X = NormalizedImages(images, mean)
+    X_ref = (images - mean).transpose(0, 3, 1, 2)
+    assert X.shape == (50, 3, 8, 8) and len(X) == 50
+    assert np.allclose(np.asarray(X), X_ref, atol=1e-4)
+
+    idx = np.array([4, 0, 31, 4])
+    batch = X[idx]
+    assert batch.dtype == np.float32 and batch.flags['C_CONTIGUOUS']
+    assert np.allclose(batch, X_ref[idx], atol=1e-4)
+    assert np.allclose(X[10:20], X_ref[10:20], atol=1e-4)
+    assert np.allclose(X[3], X_ref[3], atol=1e-4)
+    assert np.allclose(X[2:5, 1], X_ref[2:5, 1], atol=1e-4)
+
+def test_get_CIFAR10_data_streaming():
+    kwargs = dict(num_training=2000, num_validation=100, num_test=100)
+    data = get_CIFAR10_data(**kwargs)
+    stream = get_CIFAR10_data(streaming=True, **kwargs)
+    for name in ['X_train', 'X_val', 'X_test']:
+        assert stream[name].shape == data[name].shape
+        idx = np.random.choice(data[name].shape[0], 50)
+        assert np.allclose(stream[name][idx], data[name][idx], atol=1e-3)
+    for name in ['y_train', 'y_val', 'y_test']:
+        assert np.array_equal(stream[name], data[name])
+
+def test_solver_shuffled_epochs(images):
+    #a dataset that records the indices of every minibatch it serves
+    class RecordingImages(NormalizedImages):
+        def __getitem__(self, idx):
+            self.served.append(np.arange(self.shape[0])[idx])
+            return super(RecordingImages, self).__getitem__(idx)
+    X = RecordingImages(images, compute_mean_image(images))
+    X.served = []
+    data = {'X_train': X, 'y_train': np.arange(50) % 10,
+            'X_val': NormalizedImages(images[:10], X.mean_image), 'y_val': np.arange(10)}
+    model = TwoLayerNet(input_dim=3 * 8 * 8, hidden_dim=10, num_classes=10)
+    solver = Solver(model, data, num_epochs=2, batch_size=10, verbose=False)
+    solver._reset()
+    for t in range(10):
+        solver._step_shuffled()
+
+    batches = [b for b in X.served if b.shape == (10,)]
+    first, second = np.concatenate(batches[:5]), np.concatenate(batches[5:10])
+    #every epoch visits every image once, and the second one in a new order
+    assert np.array_equal(np.sort(first), np.arange(50))
+    assert np.array_equal(np.sort(second), np.arange(50))
+    assert not np.array_equal(first, second)
+
+def test_solver_streaming(images):
+    X = NormalizedImages(images, compute_mean_image(images))
+    data = {'X_train': X, 'y_train': np.arange(50) % 10,
+            'X_val': X, 'y_val': np.arange(50) % 10}
+    model = TwoLayerNet(input_dim=3 * 8 * 8, hidden_dim=20, num_classes=10, weight_scale=1e-3)
+    solver = Solver(model, data, num_epochs=3, batch_size=10, verbose=False,
+                    optim_config={'learning_rate': 1e-3})
+    solver.train()
+    assert len(solver.loss_history) == 15
+    assert np.all(np.isfinite(solver.loss_history))
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 2 root):
+python -m py.test tests/test_fast_layers.py -vv -s -q
+python -m py.test tests/test_fast_layers.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_fast_layers.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import pytest
+import numpy as np
+
+from cs231n.fast_layers import CONV_BACKENDS, conv_forward_auto, conv_backward_auto
+from cs231n.fast_layers import conv_backend, clear_conv_backend_cache, conv_backend_supported
+from cs231n.fast_layers import conv_forward_winograd, conv_backward_winograd
+from cs231n.fast_layers import conv_forward_fft, conv_backward_fft
+from cs231n.fast_layers import conv_forward_numpy, conv_backward_numpy
+from cs231n.fast_layers import max_pool_forward_fast, max_pool_backward_fast
+from cs231n.fast_layers import max_pool_forward_strided, max_pool_backward_strided
+from cs231n.fast_layers import max_pool_forward_im2col, max_pool_backward_im2col
+from cs231n.gradient_check import eval_numerical_gradient_array
+from cs231n.layers import conv_forward_naive, conv_backward_naive
+from cs231n.layers import max_pool_forward_naive, max_pool_backward_naive
+from cs231n.layer_utils import conv_relu_forward, conv_relu_backward
+
+
+def rel_error(x,y):
+    """ returns relative error """
+    return np.max(np.abs(x - y) / (np.maximum(1e-8, np.abs(x) + np.abs(y))))
+
+def test_assert():
+    assert 1
+
+CONV_SHAPES = [
+    #x shape,       w shape,       stride, pad
+    ((2, 3, 8, 8),  (4, 3, 3, 3),  1, 1),
+    ((2, 3, 9, 9),  (4, 3, 3, 3),  2, 0),
+    ((3, 2, 7, 11), (5, 2, 3, 5),  2, 1),
+    ((1, 4, 6, 6),  (2, 4, 1, 1),  1, 0),
+    ((2, 3, 7, 9),  (4, 3, 3, 3),  1, 0),
+    ((2, 2, 9, 10), (3, 2, 5, 5),  1, 2),
+]
+
+@pytest.mark.parametrize("backend", [name for name in CONV_BACKENDS if name != 'naive'])
+@pytest.mark.parametrize("x_shape,w_shape,stride,pad", CONV_SHAPES)
+def test_conv_backends(backend, x_shape, w_shape, stride, pad):
+    np.random.seed(0)
+    x = np.random.randn(*x_shape)
+    w = np.random.randn(*w_shape)
+    b = np.random.randn(w_shape[0])
+    conv_param = {'stride': stride, 'pad': pad}
+    if not conv_backend_supported(backend, w_shape, conv_param):
+        pytest.skip('%s does not support this layer' % backend)
+    forward, backward = CONV_BACKENDS[backend]
+
+    out, cache = forward(x, w, b, conv_param)
+    out_naive, cache_naive = conv_forward_naive(x, w, b, conv_param)
+    assert out.shape == out_naive.shape
+    assert rel_error(out, out_naive) < 1e-9
+
+    dout = np.random.randn(*out.shape)
+    dx, dw, db = backward(dout, cache)
+    dx_naive, dw_naive, db_naive = conv_backward_naive(dout, cache_naive)
+    assert rel_error(dx, dx_naive) < 1e-9
+    assert rel_error(dw, dw_naive) < 1e-9
+    assert rel_error(db, db_naive) < 1e-9
+
+def test_conv_numpy_gradient():
+    np.random.seed(1)
+    x = np.random.randn(2, 3, 7, 7)
+    w = np.random.randn(3, 3, 3, 3)
+    b = np.random.randn(3)
+    conv_param = {'stride': 2, 'pad': 1}
+    dout = np.random.randn(2, 3, 4, 4)
+
+    dx_num = eval_numerical_gradient_array(lambda x: conv_forward_numpy(x, w, b, conv_param)[0], x, dout)
+    dw_num = eval_numerical_gradient_array(lambda w: conv_forward_numpy(x, w, b, conv_param)[0], w, dout)
+    db_num = eval_numerical_gradient_array(lambda b: conv_forward_numpy(x, w, b, conv_param)[0], b, dout)
+
+    out, cache = conv_forward_numpy(x, w, b, conv_param)
+    dx, dw, db = conv_backward_numpy(dout, cache)
+    assert rel_error(dx, dx_num) < 1e-8
+    assert rel_error(dw, dw_num) < 1e-8
+    assert rel_error(db, db_num) < 1e-8
+
+@pytest.mark.parametrize("forward,backward,w_shape,pad", [
+    (conv_forward_winograd, conv_backward_winograd, (3, 3, 3, 3), 1),
+    (conv_forward_winograd, conv_backward_winograd, (3, 3, 3, 3), 0),
+    (conv_forward_fft, conv_backward_fft, (3, 3, 3, 3), 1),
+    (conv_forward_fft, conv_backward_fft, (2, 3, 4, 5), 2),
+])
+def test_conv_winograd_fft_gradient(forward, backward, w_shape, pad):
+    np.random.seed(8)
+    x = np.random.randn(2, 3, 7, 8)
+    w = np.random.randn(*w_shape)
+    b = np.random.randn(w_shape[0])
+    conv_param = {'stride': 1, 'pad': pad}
+    out, cache = forward(x, w, b, conv_param)
+    dout = np.random.randn(*out.shape)
+
+    dx_num = eval_numerical_gradient_array(lambda x: forward(x, w, b, conv_param)[0], x, dout)
+    dw_num = eval_numerical_gradient_array(lambda w: forward(x, w, b, conv_param)[0], w, dout)
+    db_num = eval_numerical_gradient_array(lambda b: forward(x, w, b, conv_param)[0], b, dout)
+
+    dx, dw, db = backward(dout, cache)
+    assert rel_error(dx, dx_num) < 1e-7
+    assert rel_error(dw, dw_num) < 1e-7
+    assert rel_error(db, db_num) < 1e-7
+
+@pytest.mark.parametrize("forward", [conv_forward_winograd, conv_forward_fft])
+def test_conv_winograd_fft_float32(forward):
+    np.random.seed(9)
+    x = np.random.randn(2, 3, 8, 8).astype(np.float32)
+    w = np.random.randn(4, 3, 3, 3).astype(np.float32)
+    b = np.random.randn(4).astype(np.float32)
+    conv_param = {'stride': 1, 'pad': 1}
+    out, _ = forward(x, w, b, conv_param)
+    out_naive, _ = conv_forward_naive(x, w, b, conv_param)
+    assert out.dtype == np.float32
+    assert rel_error(out, out_naive) < 1e-4
+
+def test_conv_backend_supported():
+    assert conv_backend_supported('winograd', (8, 3, 3, 3), {'stride': 1, 'pad': 1})
+    assert not conv_backend_supported('winograd', (8, 3, 5, 5), {'stride': 1, 'pad': 2})
+    assert not conv_backend_supported('winograd', (8, 3, 3, 3), {'stride': 2, 'pad': 1})
+    assert conv_backend_supported('fft', (8, 3, 7, 7), {'stride': 1, 'pad': 3})
+    assert not conv_backend_supported('fft', (8, 3, 7, 7), {'stride': 2, 'pad': 3})
+    assert conv_backend_supported('numpy', (8, 3, 7, 7), {'stride': 2, 'pad': 3})
+    with pytest.raises(ValueError):
+        conv_forward_winograd(np.zeros((1, 3, 8, 8)), np.zeros((2, 3, 5, 5)), np.zeros(2),
+                              {'stride': 1, 'pad': 2})
+
+def test_conv_auto_caches_choice():
+    clear_conv_backend_cache()
+    np.random.seed(2)
+    x = np.random.randn(4, 3, 16, 16)
+    w = np.random.randn(8, 3, 3, 3)
+    b = np.random.randn(8)
+    conv_param = {'stride': 1, 'pad': 1}
+    assert conv_backend(x.shape, w.shape, conv_param) is None
+
+    out, cache = conv_forward_auto(x, w, b, conv_param)
+    method = conv_backend(x.shape, w.shape, conv_param)
+    #too large an output to time the naive loops
+    assert method in CONV_BACKENDS and method != 'naive'
+    assert cache[0] == method
+    assert conv_backend(x.shape, w.shape, conv_param, dtype=np.float32) is None
+
+    out_naive, cache_naive = conv_forward_naive(x, w, b, conv_param)
+    assert rel_error(out, out_naive) < 1e-9
+
+    #the second call reuses the choice, and the backward pass follows it
+    out, cache = conv_forward_auto(x, w, b, conv_param)
+    assert cache[0] == method
+    dout = np.random.randn(*out.shape)
+    dx, dw, db = conv_backward_auto(dout, cache)
+    dx_naive, dw_naive, db_naive = conv_backward_naive(dout, cache_naive)
+    assert rel_error(dx, dx_naive) < 1e-9
+    assert rel_error(dw, dw_naive) < 1e-9
+    assert rel_error(db, db_naive) < 1e-9
+
+    clear_conv_backend_cache()
+    assert conv_backend(x.shape, w.shape, conv_param) is None
+
+def test_conv_auto_ignores_batch_size(monkeypatch):
+    from cs231n import fast_layers
+    clear_conv_backend_cache()
+    np.random.seed(3)
+    w = np.random.randn(8, 3, 3, 3)
+    b = np.random.randn(8)
+    conv_param = {'stride': 1, 'pad': 1}
+    conv_forward_auto(np.random.randn(10, 3, 16, 16), w, b, conv_param)
+    method = conv_backend((10, 3, 16, 16), w.shape, conv_param)
+
+    #other batch sizes of the layer are not tuned again
+    def fail(*args):
+        raise AssertionError('tuned the layer again')
+    monkeypatch.setattr(fast_layers, '_tune_conv', fail)
+    for N in (1, 7, 25):
+        x = np.random.randn(N, 3, 16, 16)
+        out, cache = conv_forward_auto(x, w, b, conv_param)
+        assert cache[0] == method
+        assert rel_error(out, conv_forward_naive(x, w, b, conv_param)[0]) < 1e-9
+    assert conv_backend((25, 3, 16, 16), w.shape, conv_param) == method
+    monkeypatch.undo()
+
+    #batches small enough for the naive loops are tuned separately
+    assert conv_backend((1, 3, 2, 2), (2, 3, 1, 1), conv_param) is None
+    conv_forward_auto(np.random.randn(1, 3, 2, 2), np.random.randn(2, 3, 1, 1), np.zeros(2), conv_param)
+    assert conv_backend((1, 3, 2, 2), (2, 3, 1, 1), conv_param) is not None
+    assert conv_backend((100, 3, 2, 2), (2, 3, 1, 1), conv_param) is None
+    clear_conv_backend_cache()
+
+def test_conv_auto_bad_cache():
+    with pytest.raises(ValueError):
+        conv_backward_auto(np.zeros((1, 1, 1, 1)), ('unknown', None))
+
+def test_conv_relu_without_cython():
+    #the sandwich layers go through the dispatcher
+    np.random.seed(3)
+    x = np.random.randn(2, 3, 8, 8)
+    w = np.random.randn(4, 3, 3, 3)
+    b = np.random.randn(4)
+    conv_param = {'stride': 1, 'pad': 1}
+    out, cache = conv_relu_forward(x, w, b, conv_param)
+    out_naive, _ = conv_forward_naive(x, w, b, conv_param)
+    assert rel_error(out, np.maximum(out_naive, 0)) < 1e-9
+    dx, dw, db = conv_relu_backward(np.random.randn(*out.shape), cache)
+    assert dx.shape == x.shape and dw.shape == w.shape and db.shape == b.shape
+
+POOL_PARAMS = [
+    #x shape,        pool_height, pool_width, stride
+    ((2, 3, 8, 8),   2, 2, 2),
+    ((2, 3, 9, 9),   3, 3, 2),
+    ((2, 3, 8, 8),   2, 2, 1),
+    ((3, 2, 7, 10),  2, 3, 1),
+    ((2, 2, 11, 11), 3, 3, 3),
+]
+
+@pytest.mark.parametrize("x_shape,pool_height,pool_width,stride", POOL_PARAMS)
+def test_max_pool_strided(x_shape, pool_height, pool_width, stride):
+    np.random.seed(4)
+    x = np.random.randn(*x_shape)
+    pool_param = {'pool_height': pool_height, 'pool_width': pool_width, 'stride': stride}
+
+    out, cache = max_pool_forward_strided(x, pool_param)
+    out_naive, cache_naive = max_pool_forward_naive(x, pool_param)
+    assert out.shape == out_naive.shape
+    assert np.array_equal(out, out_naive)
+    #the cache holds int8 offsets, not the input
+    assert cache[1].dtype == np.int8
+
+    dout = np.random.randn(*out.shape)
+    dx = max_pool_backward_strided(dout, cache)
+    dx_naive = max_pool_backward_naive(dout, cache_naive)
+    assert dx.shape == x.shape
+    assert rel_error(dx, dx_naive) < 1e-12
+
+    out, cache = max_pool_forward_fast(x, pool_param)
+    assert np.array_equal(out, out_naive)
+    assert rel_error(max_pool_backward_fast(dout, cache), dx_naive) < 1e-12
+
+def test_max_pool_strided_gradient():
+    np.random.seed(5)
+    x = np.random.randn(2, 3, 9, 9)
+    pool_param = {'pool_height': 3, 'pool_width': 3, 'stride': 2}
+    dout = np.random.randn(2, 3, 4, 4)
+
+    dx_num = eval_numerical_gradient_array(lambda x: max_pool_forward_strided(x, pool_param)[0], x, dout)
+    out, cache = max_pool_forward_strided(x, pool_param)
+    dx = max_pool_backward_strided(dout, cache)
+    assert rel_error(dx, dx_num) < 1e-8
+
+def test_max_pool_strided_large_window():
+    np.random.seed(6)
+    x = np.random.randn(1, 2, 16, 16).astype(np.float32)
+    pool_param = {'pool_height': 12, 'pool_width': 12, 'stride': 4}
+    out, cache = max_pool_forward_strided(x, pool_param)
+    assert out.dtype == np.float32
+    assert cache[1].dtype == np.int32
+    out_naive, cache_naive = max_pool_forward_naive(x, pool_param)
+    assert np.array_equal(out, out_naive)
+    dout = np.random.randn(*out.shape).astype(np.float32)
+    dx = max_pool_backward_strided(dout, cache)
+    assert dx.dtype == np.float32
+    assert rel_error(dx, max_pool_backward_naive(dout, cache_naive)) < 1e-6
+
+def test_max_pool_im2col():
+    np.random.seed(7)
+    x = np.random.randn(2, 3, 9, 9)
+    pool_param = {'pool_height': 3, 'pool_width': 3, 'stride': 2}
+    out, cache = max_pool_forward_im2col(x, pool_param)
+    out_naive, cache_naive = max_pool_forward_naive(x, pool_param)
+    assert np.array_equal(out, out_naive)
+    dout = np.random.randn(*out.shape)
+    dx = max_pool_backward_im2col(dout, cache)
+    assert rel_error(dx, max_pool_backward_naive(dout, cache_naive)) < 1e-12
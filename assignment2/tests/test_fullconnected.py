@@ -14,6 +14,8 @@ python -m pytest tests -v --cov-report html
 Open index.html contained within htmlcov
 '''
 
+import multiprocessing
+
 import pytest
 import numpy as np
 import random
@@ -31,6 +33,10 @@ from cs231n.solver import Solver
 
 batch_id = random.choice(list(range(1,6)))
 
+#processes the numerical gradients of the larger weights and inputs are
+#computed with (small ones are checked serially, see MIN_COORDINATES_PER_WORKER)
+GRAD_CHECK_WORKERS = multiprocessing.cpu_count()
+
 IMAGE_SIZE   = 32
 NUM_CHANNELS = 3
 
@@ -209,8 +215,8 @@ def test_affine_backward():
     b = np.random.randn(5)
     dout = np.random.randn(10, 5)
 
-    dx_num = eval_numerical_gradient_array(lambda x: affine_forward(x, w, b)[0], x, dout)
-    dw_num = eval_numerical_gradient_array(lambda w: affine_forward(x, w, b)[0], w, dout)
+    dx_num = eval_numerical_gradient_array(lambda x: affine_forward(x, w, b)[0], x, dout, num_workers=GRAD_CHECK_WORKERS)
+    dw_num = eval_numerical_gradient_array(lambda w: affine_forward(x, w, b)[0], w, dout, num_workers=GRAD_CHECK_WORKERS)
     db_num = eval_numerical_gradient_array(lambda b: affine_forward(x, w, b)[0], b, dout)
 
     _, cache = affine_forward(x, w, b)
@@ -262,8 +268,8 @@ def test_sandwich_layers(samples = random.randrange(1,10)):
         out, cache = affine_relu_forward(x, w, b)
         dx, dw, db = affine_relu_backward(dout, cache)
 
-        dx_num = eval_numerical_gradient_array(lambda x: affine_relu_forward(x, w, b)[0], x, dout)
-        dw_num = eval_numerical_gradient_array(lambda w: affine_relu_forward(x, w, b)[0], w, dout)
+        dx_num = eval_numerical_gradient_array(lambda x: affine_relu_forward(x, w, b)[0], x, dout, num_workers=GRAD_CHECK_WORKERS)
+        dw_num = eval_numerical_gradient_array(lambda w: affine_relu_forward(x, w, b)[0], w, dout, num_workers=GRAD_CHECK_WORKERS)
         db_num = eval_numerical_gradient_array(lambda b: affine_relu_forward(x, w, b)[0], b, dout)
 
         assert rel_error(dx_num, dx) < 5e-7
@@ -281,7 +287,7 @@ def test_softmax(num_classes, samples=random.randrange(1,10)):
     x = 0.001 * np.random.randn(num_inputs, num_classes)
     y = np.random.randint(num_classes, size=num_inputs)
 
-    dx_num = eval_numerical_gradient(lambda x: softmax_loss(x, y)[0], x, verbose=False)
+    dx_num = eval_numerical_gradient(lambda x: softmax_loss(x, y)[0], x, verbose=False, num_workers=GRAD_CHECK_WORKERS)
     loss, dx = softmax_loss(x, y)
     assert dx_num.shape == dx.shape
     assert loss < - np.log( 0.8 / num_classes) and loss > - np.log( 1.2 / num_classes)
@@ -293,7 +299,7 @@ def test_svm(num_classes, samples=random.randrange(1,10)):
     x = 0.001 * np.random.randn(num_inputs, num_classes)
     y = np.random.randint(num_classes, size=num_inputs)
 
-    dx_num = eval_numerical_gradient(lambda x: svm_loss(x, y)[0], x, verbose=False)
+    dx_num = eval_numerical_gradient(lambda x: svm_loss(x, y)[0], x, verbose=False, num_workers=GRAD_CHECK_WORKERS)
     loss, dx = svm_loss(x, y)
     assert dx_num.shape == dx.shape
     assert loss > num_classes * ( 1 - 1.2 / num_classes)
@@ -352,7 +358,8 @@ def test_twolayerNN():
 
         for name in sorted(grads):
             f = lambda _: model.loss(X, y)[0]
-            grad_num = eval_numerical_gradient(f, model.params[name], verbose=False)
+            num_workers = GRAD_CHECK_WORKERS if name.startswith('W') else 1
+            grad_num = eval_numerical_gradient(f, model.params[name], verbose=False, num_workers=num_workers)
             print('%s relative error: %.2e' % (name, rel_error(grad_num, grads[name])))
             assert rel_error(grad_num,grads[name]) < 1e-6
             assert grad_num.shape == grads[name].shape
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 2 root):
+python -m py.test tests/test_gradient_check.py -vv -s -q
+python -m py.test tests/test_gradient_check.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_gradient_check.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import pytest
+import numpy as np
+
+from cs231n.gradient_check import grad_check_directional, grad_check_sparse_bound
+from cs231n.gradient_check import eval_numerical_gradient_array
+from cs231n.layers         import conv_forward_naive, conv_backward_naive
+from cs231n.layers         import affine_forward, affine_backward
+
+
+def rel_error(x,y):
+    """ returns relative error """
+    return np.max(np.abs(x - y) / (np.maximum(1e-8, np.abs(x) + np.abs(y))))
+
+def test_assert():
+    assert 1
+
+@pytest.fixture(scope='module')
+def conv_case():
+    #a full conv layer: 6144 inputs, 1152 weights
+    np.random.seed(0)
+    x = np.random.randn(4, 6, 16, 16)
+    w = np.random.randn(8, 6, 3, 3)
+    b = np.random.randn(8)
+    conv_param = {'stride': 1, 'pad': 1}
+    out, cache = conv_forward_naive(x, w, b, conv_param)
+    dout = np.random.randn(*out.shape)
+    dx, dw, db = conv_backward_naive(dout, cache)
+    return x, w, b, conv_param, dout, dx, dw, db
+
+def test_directional_conv_backward(conv_case):
+    x, w, b, conv_param, dout, dx, dw, db = conv_case
+    fx = lambda x: conv_forward_naive(x, w, b, conv_param)[0]
+    fw = lambda w: conv_forward_naive(x, w, b, conv_param)[0]
+    fb = lambda b: conv_forward_naive(x, w, b, conv_param)[0]
+    for f, v, grad in [(fx, x, dx), (fw, w, dw), (fb, b, db)]:
+        numerical, analytic = grad_check_directional(f, v, grad, df=dout,
+                                                     num_directions=4, seed=1)
+        assert rel_error(numerical, analytic) < 1e-7
+
+def test_directional_detects_wrong_entry(conv_case):
+    x, w, b, conv_param, dout, dx, dw, db = conv_case
+    dw_wrong = dw.copy()
+    dw_wrong[3, 2, 1, 1] += 1.0
+    fw = lambda w: conv_forward_naive(x, w, b, conv_param)[0]
+    numerical, analytic = grad_check_directional(fw, w, dw_wrong, df=dout,
+                                                 num_directions=2, seed=1)
+    assert rel_error(numerical, analytic) > 1e-6
+
+def test_directional_restores_x():
+    x = np.random.randn(5, 7)
+    x0 = x.copy()
+    grad_check_directional(lambda x: np.sum(x ** 2), x, 2 * x, num_directions=3)
+    assert np.array_equal(x, x0)
+
+def test_directional_matches_array_check():
+    np.random.seed(2)
+    x = np.random.randn(10, 6)
+    w = np.random.randn(6, 5)
+    b = np.random.randn(5)
+    dout = np.random.randn(10, 5)
+    _, cache = affine_forward(x, w, b)
+    dx, dw, db = affine_backward(dout, cache)
+    dx_num = eval_numerical_gradient_array(lambda x: affine_forward(x, w, b)[0], x, dout)
+    assert rel_error(dx_num, dx) < 1e-8
+    numerical, analytic = grad_check_directional(lambda x: affine_forward(x, w, b)[0],
+                                                 x, dx, df=dout, num_directions=5)
+    assert rel_error(numerical, analytic) < 1e-8
+
+def test_sparse_bound():
+    np.random.seed(3)
+    x = np.random.randn(2, 3, 6, 6)
+    w = np.random.randn(4, 3, 3, 3)
+    b = np.random.randn(4)
+    conv_param = {'stride': 1, 'pad': 1}
+    out, cache = conv_forward_naive(x, w, b, conv_param)
+    dout = np.random.randn(*out.shape)
+    dx, dw, db = conv_backward_naive(dout, cache)
+    fw = lambda w: conv_forward_naive(x, w, b, conv_param)[0]
+    max_error, bound = grad_check_sparse_bound(fw, w, dw, df=dout, num_checks=60, seed=0)
+    assert max_error < 1e-6
+    #no failure in 60 checks: fewer than 1 - 0.05 ** (1 / 60) of the weights are wrong
+    assert bound == pytest.approx(1 - 0.05 ** (1 / 60.))
+
+    #a gradient with half of its entries wrong
+    dw_wrong = dw.copy()
+    dw_wrong.flat[::2] *= 2
+    max_error, bound = grad_check_sparse_bound(fw, w, dw_wrong, df=dout, num_checks=60, seed=0)
+    assert max_error > 0.1 and bound > 0.5
+
+def test_sparse_bound_exhaustive():
+    x = np.random.randn(3, 4)
+    grad = 2 * x
+    grad[0, 0] += 1
+    max_error, bound = grad_check_sparse_bound(lambda x: np.sum(x ** 2), x, grad, num_checks=100)
+    assert bound == pytest.approx(1 / 12.)
+
+def test_parallel_numerical_gradient(monkeypatch):
+    from cs231n import gradient_check
+    from cs231n.gradient_check import eval_numerical_gradient
+    #split even these small checks over the workers
+    monkeypatch.setattr(gradient_check, 'MIN_COORDINATES_PER_WORKER', 1)
+    np.random.seed(4)
+    x = np.random.randn(6, 5)
+    w = np.random.randn(5, 4)
+    b = np.random.randn(4)
+    dout = np.random.randn(6, 4)
+    f = lambda w: affine_forward(x, w, b)[0]
+    assert np.array_equal(eval_numerical_gradient_array(f, w, dout, num_workers=3),
+                          eval_numerical_gradient_array(f, w, dout))
+
+    #f ignores its argument and reads the parameters through a closure, as
+    #in the model gradient checks
+    params = {'w': w}
+    f = lambda _: np.sum(affine_forward(x, params['w'], b)[0] ** 2)
+    grad = eval_numerical_gradient(f, params['w'], verbose=False, num_workers=2)
+    assert np.array_equal(grad, eval_numerical_gradient(f, params['w'], verbose=False))
+    assert np.array_equal(params['w'], w)
+
+def test_small_numerical_gradient_is_serial(monkeypatch):
+    from cs231n import gradient_check
+    def fail(*args):
+        raise AssertionError('forked workers for a small gradient check')
+    monkeypatch.setattr(gradient_check, '_eval_numerical_gradient_parallel', fail)
+    np.random.seed(5)
+    b = np.random.randn(5)
+    dout = np.random.randn(3, 5)
+    f = lambda b: affine_forward(np.ones((3, 2)), np.ones((2, 5)), b)[0]
+    grad = eval_numerical_gradient_array(f, b, dout, num_workers=16)
+    assert rel_error(grad, dout.sum(axis=0)) < 1e-8
+    assert gradient_check._grad_workers(16, 1200) == 2
+    assert gradient_check._grad_workers(None, 0) == 1
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 2 root):
+python -m py.test tests/test_im2col.py -vv -s -q
+python -m py.test tests/test_im2col.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_im2col.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import pytest
+import numpy as np
+
+from cs231n.im2col import Workspace, get_im2col_indices, im2col_indices
+from cs231n.im2col import col2im_indices, col2im_6d
+from cs231n.fast_layers import conv_forward_strides, conv_backward_strides
+from cs231n.fast_layers import workspace as layer_workspace
+
+
+def test_assert():
+    assert 1
+
+def test_workspace_indices():
+    workspace = Workspace()
+    k, i, j = workspace.indices((2, 3, 8, 8), 3, 3, 1, 1)
+    k_ref, i_ref, j_ref = get_im2col_indices((2, 3, 8, 8), 3, 3, 1, 1)
+    assert np.array_equal(k, k_ref) and np.array_equal(i, i_ref) and np.array_equal(j, j_ref)
+    assert not i.flags.writeable
+
+    #the batch size does not matter
+    assert workspace.indices((5, 3, 8, 8), 3, 3, 1, 1)[1] is i
+    assert workspace.indices((5, 3, 8, 8), 2, 2, 0, 2)[1] is not i
+    assert workspace.stats()['allocations'] == 2
+    assert workspace.stats()['reuses'] == 1
+
+def test_workspace_padded():
+    workspace = Workspace()
+    for seed in range(3):
+        x = np.random.RandomState(seed).randn(2, 3, 5, 6)
+        for pad in (0, 1, 2):
+            x_padded = workspace.padded(x, pad)
+            assert np.array_equal(x_padded, np.pad(x, ((0, 0), (0, 0), (pad, pad), (pad, pad)),
+                                                   mode='constant'))
+    assert workspace.stats()['allocations'] == 3
+    assert workspace.stats()['reuses'] == 6
+
+@pytest.mark.parametrize("x_shape,field,pad,stride", [((2, 3, 8, 8), 3, 1, 1),
+                                                      ((3, 2, 9, 9), 3, 0, 2),
+                                                      ((1, 4, 6, 6), 2, 2, 2)])
+def test_workspace_im2col(x_shape, field, pad, stride):
+    workspace = Workspace()
+    np.random.seed(0)
+    x = np.random.randn(*x_shape)
+    N, C, H, W = x_shape
+    cols_ref = im2col_indices(x, field, field, pad, stride)
+    dx_ref = col2im_indices(cols_ref, x_shape, field, field, pad, stride)
+    out_h = (H + 2 * pad - field) // stride + 1
+    out_w = (W + 2 * pad - field) // stride + 1
+    cols_6d = np.random.randn(C, field, field, N, out_h, out_w)
+    dx_6d_ref = col2im_6d(cols_6d, N, C, H, W, field, field, pad, stride)
+
+    for _ in range(2):
+        cols = im2col_indices(x, field, field, pad, stride, workspace=workspace)
+        dx = col2im_indices(cols, x_shape, field, field, pad, stride, workspace=workspace)
+        dx_6d = col2im_6d(cols_6d, N, C, H, W, field, field, pad, stride, workspace=workspace)
+        assert np.array_equal(cols, cols_ref)
+        assert np.array_equal(dx, dx_ref)
+        assert np.array_equal(dx_6d, dx_6d_ref)
+
+    #the results are not workspace buffers
+    dx_first = dx.copy()
+    col2im_indices(2 * cols, x_shape, field, field, pad, stride, workspace=workspace)
+    assert np.array_equal(dx, dx_first)
+
+def test_workspace_eviction():
+    workspace = Workspace(max_bytes=1000)
+    a = workspace.buffer('a', (50,), np.float64)
+    assert workspace.buffer('a', (50,), np.float64) is a
+    #a second 400 byte buffer fits, a third evicts the least recently used
+    b = workspace.buffer('b', (50,), np.float64)
+    workspace.buffer('a', (50,), np.float64)
+    workspace.buffer('c', (50,), np.float64)
+    stats = workspace.stats()
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2 and stats['nbytes'] == 800
+    assert workspace.buffer('a', (50,), np.float64) is a
+    assert workspace.buffer('b', (50,), np.float64) is not b
+
+    #too large to keep
+    big = workspace.buffer('big', (200,), np.float64)
+    assert workspace.buffer('big', (200,), np.float64) is not big
+    assert workspace.stats()['nbytes'] <= 1000
+
+    workspace.clear()
+    assert workspace.stats()['entries'] == 0 and workspace.stats()['nbytes'] == 0
+
+def test_conv_strides_reuses_workspace():
+    np.random.seed(1)
+    x = np.random.randn(4, 3, 10, 10)
+    w = np.random.randn(5, 3, 3, 3)
+    b = np.random.randn(5)
+    conv_param = {'stride': 1, 'pad': 1}
+    dout = np.random.randn(4, 5, 10, 10)
+
+    out, cache = conv_forward_strides(x, w, b, conv_param)
+    grads = conv_backward_strides(dout, cache)
+    allocations = layer_workspace.stats()['allocations']
+    for _ in range(3):
+        out2, cache = conv_forward_strides(x, w, b, conv_param)
+        grads2 = conv_backward_strides(dout, cache)
+        assert np.array_equal(out, out2)
+        for grad, grad2 in zip(grads, grads2):
+            assert np.array_equal(grad, grad2)
+    #every buffer of the training loop comes from the workspace
+    assert layer_workspace.stats()['allocations'] == allocations
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("x_shape,field,pad,stride", [((2, 3, 8, 8), 3, 1, 1),
+                                                      ((3, 2, 9, 9), 3, 0, 2),
+                                                      ((5, 4, 7, 7), 5, 2, 1)])
+def test_cython_parallel_kernels(dtype, x_shape, field, pad, stride):
+    im2col_cython = pytest.importorskip('cs231n.im2col_cython')
+    np.random.seed(2)
+    x = np.random.randn(*x_shape).astype(dtype)
+    N, C, H, W = x_shape
+    out_h = (H + 2 * pad - field) // stride + 1
+    out_w = (W + 2 * pad - field) // stride + 1
+
+    cols = im2col_cython.im2col_cython_parallel(x, field, field, pad, stride)
+    assert np.array_equal(cols, im2col_cython.im2col_cython(x, field, field, pad, stride))
+
+    dx = im2col_cython.col2im_cython_parallel(cols, N, C, H, W, field, field, pad, stride)
+    dx_ref = im2col_cython.col2im_cython(cols, N, C, H, W, field, field, pad, stride)
+    assert np.array_equal(dx, dx_ref)
+
+    #a non-contiguous view of the columns
+    cols_6d = np.random.randn(N, C, field, field, out_h, out_w).astype(dtype)
+    cols_6d = cols_6d.transpose(1, 2, 3, 0, 4, 5)
+    dx = im2col_cython.col2im_6d_cython_parallel(cols_6d, N, C, H, W, field, field, pad, stride)
+    dx_ref = im2col_cython.col2im_6d_cython(cols_6d, N, C, H, W, field, field, pad, stride)
+    assert np.array_equal(dx, dx_ref)
+    assert np.array_equal(dx, col2im_6d(cols_6d, N, C, H, W, field, field, pad, stride))
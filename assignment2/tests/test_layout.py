@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 2 root):
+python -m py.test tests/test_layout.py -vv -s -q
+python -m py.test tests/test_layout.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_layout.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import pytest
+import numpy as np
+
+from cs231n.fast_layers import conv_forward_auto, conv_backward_auto
+from cs231n.fast_layers import max_pool_forward_fast, max_pool_backward_fast
+from cs231n.layers import conv_forward_naive, conv_backward_naive
+from cs231n.layers import max_pool_forward_naive, max_pool_backward_naive
+from cs231n.layers import spatial_batchnorm_forward, spatial_batchnorm_backward
+from cs231n.layers import get_layout, nchw_to_nhwc, nhwc_to_nchw
+from cs231n.layer_utils import conv_relu_pool_forward, conv_relu_pool_backward
+from cs231n.classifiers.cnn import ThreeLayerConvNet
+from cs231n.classifiers.convnets import ConvNet_general
+
+
+def rel_error(x,y):
+    """ returns relative error """
+    return np.max(np.abs(x - y) / (np.maximum(1e-8, np.abs(x) + np.abs(y))))
+
+def test_assert():
+    assert 1
+
+def test_get_layout():
+    assert get_layout({}) == 'NCHW'
+    assert get_layout({'layout': 'NHWC'}) == 'NHWC'
+    with pytest.raises(ValueError):
+        get_layout({'layout': 'CHWN'})
+    with pytest.raises(ValueError):
+        ThreeLayerConvNet(layout='nhwc')
+
+def test_layout_round_trip():
+    x = np.random.randn(2, 3, 4, 5)
+    x_nhwc = nchw_to_nhwc(x)
+    assert x_nhwc.shape == (2, 4, 5, 3) and x_nhwc.flags.c_contiguous
+    assert np.array_equal(nhwc_to_nchw(x_nhwc), x)
+
+@pytest.mark.parametrize("x_shape,w_shape,stride,pad", [((2, 3, 8, 8), (4, 3, 3, 3), 1, 1),
+                                                        ((2, 3, 9, 9), (4, 3, 3, 3), 2, 0),
+                                                        ((3, 2, 7, 6), (5, 2, 3, 2), 1, 2),
+                                                        ((2, 4, 8, 8), (3, 4, 5, 5), 1, 2)])
+def test_conv_nhwc(x_shape, w_shape, stride, pad):
+    np.random.seed(0)
+    x = np.random.randn(*x_shape)
+    w = np.random.randn(*w_shape)
+    b = np.random.randn(w_shape[0])
+    out_ref, cache_ref = conv_forward_naive(x, w, b, {'stride': stride, 'pad': pad})
+    dout = np.random.randn(*out_ref.shape)
+    dx_ref, dw_ref, db_ref = conv_backward_naive(dout, cache_ref)
+
+    conv_param = {'stride': stride, 'pad': pad, 'layout': 'NHWC'}
+    out, cache = conv_forward_auto(nchw_to_nhwc(x), w, b, conv_param)
+    assert cache[0] == 'nhwc'
+    dx, dw, db = conv_backward_auto(nchw_to_nhwc(dout), cache)
+    assert rel_error(nhwc_to_nchw(out), out_ref) < 1e-9
+    assert rel_error(nhwc_to_nchw(dx), dx_ref) < 1e-9
+    assert rel_error(dw, dw_ref) < 1e-9
+    assert rel_error(db, db_ref) < 1e-9
+
+@pytest.mark.parametrize("pool_param", [{'pool_height': 2, 'pool_width': 2, 'stride': 2},
+                                        {'pool_height': 3, 'pool_width': 3, 'stride': 2},
+                                        {'pool_height': 3, 'pool_width': 2, 'stride': 1}])
+def test_max_pool_nhwc(pool_param):
+    np.random.seed(1)
+    x = np.random.randn(3, 4, 9, 9)
+    out_ref, cache_ref = max_pool_forward_naive(x, pool_param)
+    dout = np.random.randn(*out_ref.shape)
+    dx_ref = max_pool_backward_naive(dout, cache_ref)
+
+    pool_param = dict(pool_param, layout='NHWC')
+    out, cache = max_pool_forward_fast(nchw_to_nhwc(x), pool_param)
+    dx = max_pool_backward_fast(nchw_to_nhwc(dout), cache)
+    assert np.array_equal(nhwc_to_nchw(out), out_ref)
+    assert rel_error(nhwc_to_nchw(dx), dx_ref) < 1e-12
+
+def test_spatial_batchnorm_nhwc():
+    np.random.seed(2)
+    x = 4 * np.random.randn(5, 3, 4, 6) + 2
+    gamma, beta = np.random.randn(3), np.random.randn(3)
+    dout = np.random.randn(*x.shape)
+    bn_param = {'mode': 'train'}
+    bn_param_nhwc = {'mode': 'train', 'layout': 'NHWC'}
+
+    out_ref, cache_ref = spatial_batchnorm_forward(x, gamma, beta, bn_param)
+    dx_ref, dgamma_ref, dbeta_ref = spatial_batchnorm_backward(dout, cache_ref)
+    out, cache = spatial_batchnorm_forward(nchw_to_nhwc(x), gamma, beta, bn_param_nhwc)
+    dx, dgamma, dbeta = spatial_batchnorm_backward(nchw_to_nhwc(dout), cache)
+    assert rel_error(nhwc_to_nchw(out), out_ref) < 1e-9
+    assert rel_error(nhwc_to_nchw(dx), dx_ref) < 1e-9
+    assert rel_error(dgamma, dgamma_ref) < 1e-9
+    assert rel_error(dbeta, dbeta_ref) < 1e-9
+
+    #the running averages are per channel in both layouts
+    assert rel_error(bn_param_nhwc['running_mean'], bn_param['running_mean']) < 1e-9
+    assert rel_error(bn_param_nhwc['running_var'], bn_param['running_var']) < 1e-9
+    bn_param['mode'] = bn_param_nhwc['mode'] = 'test'
+    out_ref, _ = spatial_batchnorm_forward(x, gamma, beta, bn_param)
+    out, _ = spatial_batchnorm_forward(nchw_to_nhwc(x), gamma, beta, bn_param_nhwc)
+    assert rel_error(nhwc_to_nchw(out), out_ref) < 1e-9
+
+def test_conv_relu_pool_nhwc():
+    np.random.seed(3)
+    x = np.random.randn(2, 3, 8, 8)
+    w = np.random.randn(4, 3, 3, 3)
+    b = np.random.randn(4)
+    pool_param = {'pool_height': 2, 'pool_width': 2, 'stride': 2}
+    out_ref, cache_ref = conv_relu_pool_forward(x, w, b, {'stride': 1, 'pad': 1}, pool_param)
+    dout = np.random.randn(*out_ref.shape)
+    dx_ref, dw_ref, db_ref = conv_relu_pool_backward(dout, cache_ref)
+
+    out, cache = conv_relu_pool_forward(nchw_to_nhwc(x), w, b,
+                                        {'stride': 1, 'pad': 1, 'layout': 'NHWC'},
+                                        dict(pool_param, layout='NHWC'))
+    dx, dw, db = conv_relu_pool_backward(nchw_to_nhwc(dout), cache)
+    assert rel_error(nhwc_to_nchw(out), out_ref) < 1e-9
+    assert rel_error(nhwc_to_nchw(dx), dx_ref) < 1e-9
+    assert rel_error(dw, dw_ref) < 1e-9
+    assert rel_error(db, db_ref) < 1e-9
+
+def test_three_layer_convnet_nhwc():
+    np.random.seed(4)
+    X = np.random.randn(3, 3, 8, 8)
+    y = np.random.randint(10, size=3)
+    model = ThreeLayerConvNet(input_dim=(3, 8, 8), num_filters=4, filter_size=3,
+                              hidden_dim=7, weight_scale=1e-1, reg=0.1, dtype=np.float64)
+    model_nhwc = ThreeLayerConvNet(input_dim=(3, 8, 8), num_filters=4, filter_size=3,
+                                   hidden_dim=7, reg=0.1, dtype=np.float64, layout='NHWC')
+    assert model_nhwc.params['W2'].shape == (4, 4, 4, 7)
+    #the same network, with the hidden layer weights in channels-last order
+    model_nhwc.params.update(model.params)
+    model_nhwc.params['W2'] = model.params['W2'].transpose(1, 2, 0, 3)
+
+    loss, grads = model.loss(X, y)
+    loss_nhwc, grads_nhwc = model_nhwc.loss(X, y)
+    assert rel_error(loss_nhwc, loss) < 1e-12
+    assert rel_error(grads_nhwc['W2'], grads['W2'].transpose(1, 2, 0, 3)) < 1e-9
+    for name in ('W1', 'b1', 'b2', 'W3', 'b3'):
+        assert rel_error(grads_nhwc[name], grads[name]) < 1e-9
+    assert rel_error(model_nhwc.loss(X), model.loss(X)) < 1e-9
+
+def test_convnet_general_nhwc():
+    np.random.seed(5)
+    X = np.random.randn(2, 3, 6, 6)
+    y = np.random.randint(10, size=2)
+    model = ConvNet_general(input_dim=(3, 6, 6), num_filters=[4, 5], filter_size=[3, 3],
+                            hidden_dim=7, weight_scale=1e-1, dtype=np.float64)
+    model_nhwc = ConvNet_general(input_dim=(3, 6, 6), num_filters=[4, 5], filter_size=[3, 3],
+                                 hidden_dim=7, dtype=np.float64, layout='NHWC')
+    model_nhwc.params.update(model.params)
+    #rows of the first affine layer in channels-last order
+    W = model.params[('W', 2)]
+    model_nhwc.params[('W', 2)] = W.reshape(5, 6, 6, 7).transpose(1, 2, 0, 3).reshape(W.shape)
+
+    loss, grads = model.loss(X, y)
+    loss_nhwc, grads_nhwc = model_nhwc.loss(X, y)
+    assert rel_error(loss_nhwc, loss) < 1e-12
+    for layer in (0, 1):
+        assert rel_error(grads_nhwc[('W', layer)], grads[('W', layer)]) < 1e-9
@@ -1,13 +1,15 @@
 import numpy as np
 import h5py
 
+from cs231n.checkpoint import Checkpoint, save_checkpoint
 from cs231n.layers import *
 from cs231n.fast_layers import *
 from cs231n.layer_utils import *
 
 
 class PretrainedCNN(object):
-  def __init__(self, dtype=np.float32, num_classes=100, input_size=64, h5_file=None):
+  def __init__(self, dtype=np.float32, num_classes=100, input_size=64, h5_file=None,
+               checkpoint=None):
     self.dtype = dtype
     self.conv_params = []
     self.input_size = input_size
@@ -42,7 +44,7 @@ class PretrainedCNN(object):
       self.params['beta%d' % (i + 1)] = np.zeros(next_dim)
       self.bn_params.append({'mode': 'train'})
       prev_dim = next_dim
-      if self.conv_params[i]['stride'] == 2: cur_size /= 2
+      if self.conv_params[i]['stride'] == 2: cur_size //= 2
     
     # Add a fully-connected layers
     fan_in = cur_size * cur_size * self.num_filters[-1]
@@ -59,6 +61,8 @@ class PretrainedCNN(object):
 
     if h5_file is not None:
       self.load_weights(h5_file)
+    if checkpoint is not None:
+      self.load_checkpoint(checkpoint)
 
   
   def load_weights(self, h5_file, verbose=False):
@@ -102,6 +106,46 @@ class PretrainedCNN(object):
       self.params[k] = v.astype(self.dtype)
 
   
+  def save_checkpoint(self, filename):
+    """
+    Save the weights and the batchnorm running averages as a checkpoint (see
+    cs231n/checkpoint.py), under the same names as in the HDF5 file.
+
+    Inputs:
+    - filename: Path of the checkpoint file.
+    """
+    arrays = dict(self.params)
+    for i, bn_param in enumerate(self.bn_params):
+      for k in ['running_mean', 'running_var']:
+        if k in bn_param:
+          arrays['%s%d' % (k, i + 1)] = bn_param[k]
+    meta = {'model': 'PretrainedCNN', 'num_classes': self.num_classes,
+            'input_size': self.input_size, 'dtype': np.dtype(self.dtype).name}
+    save_checkpoint(filename, arrays, meta)
+
+
+  def load_checkpoint(self, filename):
+    """
+    Load weights saved by save_checkpoint. The arrays are memory-mapped
+    copy-on-write rather than read, so loading is immediate and every weight
+    is only read from disk when it is first used.
+
+    Inputs:
+    - filename: Path of the checkpoint file.
+    """
+    checkpoint = Checkpoint(filename, mode='c')
+    for k in checkpoint:
+      v = checkpoint[k]
+      if k in self.params:
+        if v.shape != self.params[k].shape:
+          raise ValueError('shapes for %s do not match' % k)
+        self.params[k] = v.astype(self.dtype, copy=False)
+      elif k.startswith('running_mean'):
+        self.bn_params[int(k[12:]) - 1]['running_mean'] = v
+      elif k.startswith('running_var'):
+        self.bn_params[int(k[11:]) - 1]['running_var'] = v
+
+
   def forward(self, X, start=None, end=None, mode='test'):
     """
     Run part of the model forward, starting and ending at an arbitrary layer,
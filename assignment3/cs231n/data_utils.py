@@ -1,8 +1,13 @@
+import json
+import multiprocessing
 import pickle as pickle
 import numpy as np
 import os
+import warnings
 from scipy.misc import imread
 
+from cs231n.checkpoint import Checkpoint, is_checkpoint, list_checkpoints
+
 def load_CIFAR_batch(filename):
   """ load single batch of cifar """
   with open(filename, 'rb') as f:
@@ -71,28 +76,22 @@ def get_CIFAR10_data(num_training=49000, num_validation=1000, num_test=1000,
     }
     
 
-def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
-  """
-  Load TinyImageNet. Each of TinyImageNet-100-A, TinyImageNet-100-B, and
-  TinyImageNet-200 have the same directory structure, so this can be used
-  to load any of them.
+def _read_tiny_imagenet_image(img_file):
+  """ Decode one TinyImageNet image as a (3, 64, 64) uint8 array. """
+  img = imread(img_file)
+  if img.ndim == 2:
+    ## grayscale file
+    img = np.repeat(img[:, :, np.newaxis], 3, axis=2)
+  return np.asarray(img, dtype=np.uint8).transpose(2, 0, 1)
 
-  Inputs:
-  - path: String giving path to the directory to load.
-  - dtype: numpy datatype used to load the data.
-  - subtract_mean: Whether to subtract the mean training image.
 
-  Returns: A dictionary with the following entries:
-  - class_names: A list where class_names[i] is a list of strings giving the
-    WordNet names for class i in the loaded dataset.
-  - X_train: (N_tr, 3, 64, 64) array of training images
-  - y_train: (N_tr,) array of training labels
-  - X_val: (N_val, 3, 64, 64) array of validation images
-  - y_val: (N_val,) array of validation labels
-  - X_test: (N_test, 3, 64, 64) array of testing images.
-  - y_test: (N_test,) array of test labels; if test labels are not available
-    (such as in student code) then y_test will be None.
-  - mean_image: (3, 64, 64) array giving mean training image
+def _tiny_imagenet_index(path):
+  """
+  Parse the TinyImageNet annotation files (no image is read).
+
+  Returns: A dictionary with the wnids, the class_names and, for each split,
+  the list of image files and the array of labels (None for unlabeled test
+  images).
   """
   # First load wnids
   with open(os.path.join(path, 'wnids.txt'), 'r') as f:
@@ -108,64 +107,31 @@ def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
       wnid_to_words[wnid] = [w.strip() for w in words.split(',')]
   class_names = [wnid_to_words[wnid] for wnid in wnids]
 
-  # Next load training data.
-  X_train = []
+  # Training images, grouped by class. To figure out the filenames we need to
+  # open the boxes file
+  train_files = []
   y_train = []
-  for i, wnid in enumerate(wnids):
-    if (i + 1) % 20 == 0:
-      print('loading training data for synset %d / %d' % (i + 1, len(wnids)))
-    # To figure out the filenames we need to open the boxes file
+  for wnid in wnids:
     boxes_file = os.path.join(path, 'train', wnid, '%s_boxes.txt' % wnid)
     with open(boxes_file, 'r') as f:
       filenames = [x.split('\t')[0] for x in f]
-    num_images = len(filenames)
-    
-    X_train_block = np.zeros((num_images, 3, 64, 64), dtype=dtype)
-    y_train_block = wnid_to_label[wnid] * np.ones(num_images, dtype=np.int64)
-    for j, img_file in enumerate(filenames):
-      img_file = os.path.join(path, 'train', wnid, 'images', img_file)
-      img = imread(img_file)
-      if img.ndim == 2:
-        ## grayscale file
-        img.shape = (64, 64, 1)
-      X_train_block[j] = img.transpose(2, 0, 1)
-    X_train.append(X_train_block)
-    y_train.append(y_train_block)
-      
-  # We need to concatenate all training data
-  X_train = np.concatenate(X_train, axis=0)
-  y_train = np.concatenate(y_train, axis=0)
-  
-  # Next load validation data
+    train_files += [os.path.join(path, 'train', wnid, 'images', img_file)
+                    for img_file in filenames]
+    y_train += [wnid_to_label[wnid]] * len(filenames)
+
+  # Validation images
+  val_files = []
+  y_val = []
   with open(os.path.join(path, 'val', 'val_annotations.txt'), 'r') as f:
-    img_files = []
-    val_wnids = []
     for line in f:
       img_file, wnid = line.split('\t')[:2]
-      img_files.append(img_file)
-      val_wnids.append(wnid)
-    num_val = len(img_files)
-    y_val = np.array([wnid_to_label[wnid] for wnid in val_wnids])
-    X_val = np.zeros((num_val, 3, 64, 64), dtype=dtype)
-    for i, img_file in enumerate(img_files):
-      img_file = os.path.join(path, 'val', 'images', img_file)
-      img = imread(img_file)
-      if img.ndim == 2:
-        img.shape = (64, 64, 1)
-      X_val[i] = img.transpose(2, 0, 1)
-
-  # Next load test images
+      val_files.append(os.path.join(path, 'val', 'images', img_file))
+      y_val.append(wnid_to_label[wnid])
+
   # Students won't have test labels, so we need to iterate over files in the
   # images directory.
-  img_files = os.listdir(os.path.join(path, 'test', 'images'))
-  X_test = np.zeros((len(img_files), 3, 64, 64), dtype=dtype)
-  for i, img_file in enumerate(img_files):
-    img_file = os.path.join(path, 'test', 'images', img_file)
-    img = imread(img_file)
-    if img.ndim == 2:
-      img.shape = (64, 64, 1)
-    X_test[i] = img.transpose(2, 0, 1)
-
+  img_files = sorted(os.listdir(os.path.join(path, 'test', 'images')))
+  test_files = [os.path.join(path, 'test', 'images', img_file) for img_file in img_files]
   y_test = None
   y_test_file = os.path.join(path, 'test', 'test_annotations.txt')
   if os.path.isfile(y_test_file):
@@ -175,45 +141,215 @@ def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True):
         line = line.split('\t')
         img_file_to_wnid[line[0]] = line[1]
     y_test = [wnid_to_label[img_file_to_wnid[img_file]] for img_file in img_files]
-    y_test = np.array(y_test)
-  
-  mean_image = X_train.mean(axis=0)
-  if subtract_mean:
-    X_train -= mean_image[None]
-    X_val -= mean_image[None]
-    X_test -= mean_image[None]
 
   return {
-    'class_names': class_names,
-    'X_train': X_train,
-    'y_train': y_train,
-    'X_val': X_val,
-    'y_val': y_val,
-    'X_test': X_test,
-    'y_test': y_test,
-    'class_names': class_names,
-    'mean_image': mean_image,
+    'wnids': wnids, 'class_names': class_names,
+    'train': (train_files, np.array(y_train, dtype=np.int64)),
+    'val': (val_files, np.array(y_val, dtype=np.int64)),
+    'test': (test_files, None if y_test is None else np.array(y_test, dtype=np.int64)),
+  }
+
+
+def pack_tiny_imagenet(path, packed_dir=None, num_workers=None, verbose=True):
+  """
+  Decode every TinyImageNet image once, with a pool of worker processes, into
+  packed uint8 arrays that load_tiny_imagenet then memory-maps:
+
+  - X_<split>.npy: (N, 3, 64, 64) uint8 images of the train, val and test
+    splits; the training images are grouped by class.
+  - y_<split>.npy: (N,) int64 labels, i.e. indices into wnids (no y_test.npy
+    without test labels).
+  - meta.json: the wnids and the class_names.
+
+  The images are decoded straight into the memory-mapped output, and
+  meta.json is written last, so a packed directory is complete if and only
+  if it holds meta.json.
+
+  Inputs:
+  - path: String giving path to the directory to load.
+  - packed_dir: Output directory; defaults to path/packed.
+  - num_workers: Number of decoding processes; defaults to the number of CPUs.
+  - verbose: Whether to print progress.
+
+  Returns:
+  - packed_dir
+  """
+  if packed_dir is None:
+    packed_dir = os.path.join(path, 'packed')
+  if not os.path.isdir(packed_dir):
+    os.makedirs(packed_dir)
+  index = _tiny_imagenet_index(path)
+
+  if num_workers is None:
+    num_workers = multiprocessing.cpu_count()
+  pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+  try:
+    for split in ['train', 'val', 'test']:
+      img_files, y = index[split]
+      X = np.lib.format.open_memmap(os.path.join(packed_dir, 'X_%s.npy' % split),
+                                    mode='w+', dtype=np.uint8,
+                                    shape=(len(img_files), 3, 64, 64))
+      if pool is not None:
+        images = pool.imap(_read_tiny_imagenet_image, img_files, chunksize=64)
+      else:
+        images = map(_read_tiny_imagenet_image, img_files)
+      for i, img in enumerate(images):
+        X[i] = img
+        if verbose and (i + 1) % 10000 == 0:
+          print('decoded %d / %d %s images' % (i + 1, len(img_files), split))
+      X.flush()
+      del X
+      if y is not None:
+        np.save(os.path.join(packed_dir, 'y_%s.npy' % split), y)
+  finally:
+    if pool is not None:
+      pool.close()
+      pool.join()
+
+  with open(os.path.join(packed_dir, 'meta.json'), 'w') as f:
+    json.dump({'wnids': index['wnids'], 'class_names': index['class_names']}, f)
+  return packed_dir
+
+
+def _class_labels(classes, wnids):
+  """ Labels of the classes (wnids or integer labels) among wnids. """
+  wnid_to_label = {wnid: i for i, wnid in enumerate(wnids)}
+  labels = []
+  for c in classes:
+    label = wnid_to_label.get(c, c)
+    if (not isinstance(label, (int, np.integer)) or isinstance(label, bool) or
+        not 0 <= label < len(wnids)):
+      raise ValueError('Unknown class %r' % (c, ))
+    if label in labels:
+      raise ValueError('Duplicate class %r' % (c, ))
+    labels.append(label)
+  if not labels:
+    raise ValueError('No classes to load')
+  return np.array(labels, dtype=np.int64)
+
+
+def load_tiny_imagenet(path, dtype=np.float32, subtract_mean=True, classes=None,
+                       packed_dir=None, num_workers=None):
+  """
+  Load TinyImageNet. Each of TinyImageNet-100-A, TinyImageNet-100-B, and
+  TinyImageNet-200 have the same directory structure, so this can be used
+  to load any of them.
+
+  The first call decodes the JPEGs into a packed uint8 cache (see
+  pack_tiny_imagenet); every call memory-maps that cache, so only the images
+  of the selected classes are read.
+
+  Inputs:
+  - path: String giving path to the directory to load.
+  - dtype: numpy datatype used to load the data. With None the images are
+    returned as uint8 (memory-mapped when all classes are loaded) and the
+    mean is not subtracted.
+  - subtract_mean: Whether to subtract the mean training image.
+  - classes: Optional list of wnids (or integer labels) to load; labels are
+    then renumbered 0 .. len(classes) - 1 in the given order. Test images
+    without labels are all kept. Unknown or repeated classes raise a
+    ValueError.
+  - packed_dir: Directory of the packed cache; defaults to path/packed.
+  - num_workers: Number of processes decoding the images on the first call.
+
+  Returns: A dictionary with the following entries:
+  - class_names: A list where class_names[i] is a list of strings giving the
+    WordNet names for class i in the loaded dataset.
+  - wnids: A list where wnids[i] is the WordNet id of class i.
+  - X_train: (N_tr, 3, 64, 64) array of training images
+  - y_train: (N_tr,) array of training labels
+  - X_val: (N_val, 3, 64, 64) array of validation images
+  - y_val: (N_val,) array of validation labels
+  - X_test: (N_test, 3, 64, 64) array of testing images.
+  - y_test: (N_test,) array of test labels; if test labels are not available
+    (such as in student code) then y_test will be None.
+  - mean_image: (3, 64, 64) array giving mean training image
+  """
+  if packed_dir is None:
+    packed_dir = os.path.join(path, 'packed')
+  if not os.path.isfile(os.path.join(packed_dir, 'meta.json')):
+    pack_tiny_imagenet(path, packed_dir, num_workers=num_workers)
+  with open(os.path.join(packed_dir, 'meta.json'), 'r') as f:
+    meta = json.load(f)
+  wnids, class_names = meta['wnids'], meta['class_names']
+
+  if classes is None:
+    labels = np.arange(len(wnids))
+  else:
+    labels = _class_labels(classes, wnids)
+  relabel = -np.ones(len(wnids), dtype=np.int64)
+  relabel[labels] = np.arange(len(labels))
+
+  data = {
+    'class_names': [class_names[i] for i in labels],
+    'wnids': [wnids[i] for i in labels],
   }
+  for split in ['train', 'val', 'test']:
+    X = np.load(os.path.join(packed_dir, 'X_%s.npy' % split), mmap_mode='r')
+    y_file = os.path.join(packed_dir, 'y_%s.npy' % split)
+    y = np.load(y_file) if os.path.isfile(y_file) else None
+    if y is not None and classes is not None:
+      # sorted row indices, so the memmap is read front to back
+      rows = np.flatnonzero(relabel[y] >= 0)
+      X, y = X[rows], relabel[y[rows]]
+    if dtype is not None:
+      X = X.astype(dtype)
+    data['X_%s' % split] = X
+    data['y_%s' % split] = y
 
+  # the mean of the uint8 images, accumulated in chunks
+  X_train = data['X_train']
+  mean_image = np.zeros((3, 64, 64))
+  for i in range(0, X_train.shape[0], 1000):
+    mean_image += np.sum(X_train[i:i + 1000], axis=0, dtype=np.float64)
+  mean_image /= max(X_train.shape[0], 1)
+  if dtype is not None:
+    mean_image = mean_image.astype(dtype)
+    if subtract_mean:
+      data['X_train'] -= mean_image[None]
+      data['X_val'] -= mean_image[None]
+      data['X_test'] -= mean_image[None]
+  data['mean_image'] = mean_image
+
+  return data
 
-def load_models(models_dir):
+
+def load_models(models_dir, allow_pickle=True):
   """
-  Load saved models from disk. This will attempt to unpickle all files in a
-  directory; any files that give errors on unpickling (such as README.txt) will
-  be skipped.
+  Load saved models from disk. Checkpoints (see cs231n/checkpoint.py) are
+  opened lazily: their model is a Checkpoint, a dictionary-like object that
+  memory-maps every parameter when it is first accessed. Use
+  list_checkpoints to list the models of a directory without opening them.
+
+  Pickled model files are unpickled as well unless allow_pickle=False, which
+  is safer for directories you do not trust since unpickling can run
+  arbitrary code; every file that is not a checkpoint is then skipped with a
+  warning. Any files that give errors on unpickling (such as README.txt) are
+  skipped.
 
   Inputs:
   - models_dir: String giving the path to a directory containing model files.
-    Each model file is a pickled dictionary with a 'model' field.
+    Each model file is a checkpoint or, with allow_pickle, a pickled
+    dictionary with a 'model' field.
+  - allow_pickle: Whether to also load pickled model files (the default, as
+    before checkpoints were added).
 
   Returns:
   A dictionary mapping model file names to models.
   """
   models = {}
   for model_file in os.listdir(models_dir):
-    with open(os.path.join(models_dir, model_file), 'rb') as f:
-      try:
-        models[model_file] = pickle.load(f)['model']
-      except pickle.UnpicklingError:
-        continue
+    path = os.path.join(models_dir, model_file)
+    if is_checkpoint(path):
+      models[model_file] = Checkpoint(path)
+    elif not os.path.isfile(path):
+      continue
+    elif not allow_pickle:
+      warnings.warn('Skipping %s: not a checkpoint, and allow_pickle is False' % path)
+    else:
+      with open(path, 'rb') as f:
+        try:
+          models[model_file] = pickle.load(f)['model']
+        except pickle.UnpicklingError:
+          continue
   return models
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+'''
+HOW TO RUN THIS CODE (if tests are within the assignment 3 root):
+python -m py.test tests/test_data_utils.py -vv -s -q
+python -m py.test tests/test_data_utils.py -vv -s -q --cov
+
+py.test.exe --cov=cs231n/ tests/test_data_utils.py --cov-report html
+
+(if the tests are within the subfolder tests)
+PYTHONPATH=${PWD} py.test.exe tests/ -v --cov-report html
+python -m pytest tests -v --cov-report html
+
+Open index.html contained within htmlcov
+'''
+
+import os
+
+import pytest
+import numpy as np
+from PIL import Image
+
+from cs231n.data_utils import pack_tiny_imagenet, load_tiny_imagenet
+
+
+WNIDS = ['n01', 'n02', 'n03']
+NUM_TRAIN = {'n01': 3, 'n02': 2, 'n03': 4}
+VAL = [('val_0.png', 'n03'), ('val_1.png', 'n01'), ('val_2.png', 'n03'), ('val_3.png', 'n02')]
+NUM_TEST = 2
+
+
+def test_assert():
+    assert 1
+
+def write_image(filename, seed, gray=False):
+    rng = np.random.RandomState(seed)
+    img = rng.randint(0, 256, size=(64, 64) if gray else (64, 64, 3)).astype(np.uint8)
+    Image.fromarray(img).save(filename)
+    if gray:
+        img = np.repeat(img[:, :, None], 3, axis=2)
+    return img.transpose(2, 0, 1)
+
+@pytest.fixture(scope='module')
+def tiny_imagenet(tmp_path_factory):
+    """ A TinyImageNet directory of 3 classes, and the images of every split. """
+    path = tmp_path_factory.mktemp('tiny-imagenet')
+    with open(str(path / 'wnids.txt'), 'w') as f:
+        f.write('\n'.join(WNIDS) + '\n')
+    with open(str(path / 'words.txt'), 'w') as f:
+        for wnid in WNIDS + ['n99']:
+            f.write('%s\tname of %s, other name\n' % (wnid, wnid))
+
+    images = {'train': [], 'val': [], 'test': []}
+    seed = 0
+    for wnid in WNIDS:
+        os.makedirs(str(path / 'train' / wnid / 'images'))
+        with open(str(path / 'train' / wnid / ('%s_boxes.txt' % wnid)), 'w') as f:
+            for i in range(NUM_TRAIN[wnid]):
+                img_file = '%s_%d.png' % (wnid, i)
+                f.write('%s\t0\t0\t63\t63\n' % img_file)
+                seed += 1
+                images['train'].append(write_image(str(path / 'train' / wnid / 'images' / img_file),
+                                                   seed, gray=(i == 1)))
+    os.makedirs(str(path / 'val' / 'images'))
+    with open(str(path / 'val' / 'val_annotations.txt'), 'w') as f:
+        for img_file, wnid in VAL:
+            f.write('%s\t%s\t0\t0\t63\t63\n' % (img_file, wnid))
+            seed += 1
+            images['val'].append(write_image(str(path / 'val' / 'images' / img_file), seed))
+    os.makedirs(str(path / 'test' / 'images'))
+    for i in range(NUM_TEST):
+        seed += 1
+        images['test'].append(write_image(str(path / 'test' / 'images' / ('test_%d.png' % i)), seed))
+    return str(path), dict((split, np.array(imgs)) for split, imgs in images.items())
+
+def test_pack_load_tiny_imagenet(tiny_imagenet, tmp_path):
+    path, images = tiny_imagenet
+    packed_dir = pack_tiny_imagenet(path, str(tmp_path / 'packed'), num_workers=1, verbose=False)
+    assert os.path.isfile(os.path.join(packed_dir, 'meta.json'))
+
+    data = load_tiny_imagenet(path, dtype=None, packed_dir=packed_dir)
+    assert data['wnids'] == WNIDS
+    assert data['class_names'][1] == ['name of n02', 'other name']
+    for split in ('train', 'val', 'test'):
+        assert data['X_%s' % split].dtype == np.uint8
+        assert np.array_equal(data['X_%s' % split], images[split])
+    assert np.array_equal(data['y_train'], [0, 0, 0, 1, 1, 2, 2, 2, 2])
+    assert np.array_equal(data['y_val'], [2, 0, 2, 1])
+    assert data['y_test'] is None
+    assert np.allclose(data['mean_image'], images['train'].mean(axis=0))
+
+    data = load_tiny_imagenet(path, packed_dir=packed_dir)
+    assert data['X_train'].dtype == np.float32
+    assert np.allclose(data['X_val'], images['val'] - images['train'].mean(axis=0), atol=1e-4)
+
+def test_load_tiny_imagenet_classes(tiny_imagenet, tmp_path):
+    path, images = tiny_imagenet
+    packed_dir = str(tmp_path / 'packed')
+    #packs on the first call
+    data = load_tiny_imagenet(path, dtype=None, classes=['n03', 'n01'],
+                              packed_dir=packed_dir, num_workers=1)
+    assert data['wnids'] == ['n03', 'n01']
+    assert np.array_equal(data['y_train'], [1, 1, 1, 0, 0, 0, 0])
+    assert np.array_equal(data['X_train'], images['train'][[0, 1, 2, 5, 6, 7, 8]])
+    assert np.array_equal(data['y_val'], [0, 1, 0])
+    assert np.array_equal(data['X_val'], images['val'][[0, 1, 2]])
+    assert data['X_test'].shape == (NUM_TEST, 3, 64, 64)
+
+    #integer labels select the same classes
+    data = load_tiny_imagenet(path, dtype=None, classes=[2, 0], packed_dir=packed_dir)
+    assert data['wnids'] == ['n03', 'n01']
+
+    for classes in (['n01', 'n01'], ['n01', 0], ['n04'], [3], [], ['n99']):
+        with pytest.raises(ValueError):
+            load_tiny_imagenet(path, classes=classes, packed_dir=packed_dir)